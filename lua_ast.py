@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Nodos del árbol sintáctico de Lua 5.1/Luau
+Cada nodo guarda sus campos y el rango de tokens [inicio, fin) del que
+procede, para poder reutilizar el texto original sin volver a generarlo.
+Los campos son __slots__: un árbol grande ocupa una quinta parte menos
+"""
+
+from typing import Iterator, Optional, Tuple
+
+
+class _NodeType(type):
+    """Da a cada clase de nodo __slots__ con sus 'fields': sin __dict__ por nodo"""
+
+    def __new__(mcs, name, bases, namespace):
+        namespace.setdefault('__slots__', tuple(namespace.get('fields', ())))
+        return super().__new__(mcs, name, bases, namespace)
+
+
+class Node(metaclass=_NodeType):
+    """Nodo base: los campos se declaran en 'fields' y se comparan por valor"""
+    __slots__ = ('span',)
+    fields: Tuple[str, ...] = ()
+
+    def __init__(self, *values, span: Optional[Tuple[int, int]] = None):
+        if len(values) != len(self.fields):
+            raise TypeError(f"{type(self).__name__} espera {len(self.fields)} campos")
+        for name, value in zip(self.fields, values):
+            setattr(self, name, value)
+        self.span = span
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.fields)
+
+    def __ne__(self, other) -> bool:
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        values = ', '.join(repr(getattr(self, name)) for name in self.fields)
+        return f"{type(self).__name__}({values})"
+
+    def children(self) -> Iterator['Node']:
+        """Recorre los nodos hijos directos, incluidos los de listas y pares"""
+        for name in self.fields:
+            yield from _nodes_in(getattr(self, name))
+
+
+def _nodes_in(value) -> Iterator[Node]:
+    if isinstance(value, Node):
+        yield value
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _nodes_in(item)
+
+
+def walk(node: Node) -> Iterator[Node]:
+    """Recorre el árbol en preorden sin recursión"""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        yield current
+        stack.extend(reversed(list(current.children())))
+
+
+# Bloques y sentencias
+
+class Chunk(Node):
+    fields = ('body',)
+
+
+class Block(Node):
+    fields = ('body',)
+
+
+class Local(Node):
+    fields = ('names', 'values')
+
+
+class Assign(Node):
+    fields = ('targets', 'values')
+
+
+class CompoundAssign(Node):
+    fields = ('op', 'target', 'value')
+
+
+class CallStatement(Node):
+    fields = ('call',)
+
+
+class Do(Node):
+    fields = ('body',)
+
+
+class While(Node):
+    fields = ('test', 'body')
+
+
+class Repeat(Node):
+    fields = ('body', 'test')
+
+
+class If(Node):
+    """if/elseif encadenados: tests[i] protege a blocks[i]"""
+    fields = ('tests', 'blocks', 'orelse')
+
+
+class NumericFor(Node):
+    fields = ('var', 'start', 'stop', 'step', 'body')
+
+
+class GenericFor(Node):
+    fields = ('names', 'values', 'body')
+
+
+class FunctionStatement(Node):
+    """function a.b.c:m() ... end: names = ['a', 'b', 'c'], method = 'm'"""
+    fields = ('names', 'method', 'func')
+
+
+class LocalFunction(Node):
+    fields = ('name', 'func')
+
+
+class Return(Node):
+    fields = ('values',)
+
+
+class Break(Node):
+    fields = ()
+
+
+class Continue(Node):
+    fields = ()
+
+
+class Goto(Node):
+    fields = ('label',)
+
+
+class Label(Node):
+    fields = ('name',)
+
+
+# Expresiones
+
+class Nil(Node):
+    fields = ()
+
+
+class Boolean(Node):
+    fields = ('value',)
+
+
+class Number(Node):
+    """El texto original se conserva para no alterar el formato del literal"""
+    fields = ('text',)
+
+
+class String(Node):
+    """Literal tal como aparece en el código, con comillas y escapes"""
+    fields = ('raw',)
+
+
+class Vararg(Node):
+    fields = ()
+
+
+class Function(Node):
+    fields = ('params', 'is_vararg', 'body')
+
+
+class Field(Node):
+    """Entrada de tabla: kind es 'list' ({v}), 'name' ({k=v}) o 'expr' ({[k]=v})"""
+    fields = ('kind', 'key', 'value')
+
+
+class Table(Node):
+    fields = ('items',)
+
+
+class BinaryOp(Node):
+    fields = ('op', 'left', 'right')
+
+
+class UnaryOp(Node):
+    fields = ('op', 'operand')
+
+
+class Name(Node):
+    fields = ('id',)
+
+
+class Member(Node):
+    """Acceso con punto: value.name"""
+    fields = ('value', 'name')
+
+
+class Index(Node):
+    """Acceso con corchetes: value[key]"""
+    fields = ('value', 'key')
+
+
+class Call(Node):
+    fields = ('func', 'args')
+
+
+class Invoke(Node):
+    """Llamada a método: value:method(args)"""
+    fields = ('value', 'method', 'args')
+
+
+class Paren(Node):
+    fields = ('expr',)
+
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Modo por lotes para los desobfuscadores
+Reparte los archivos de un directorio o patrón glob entre procesos,
+escribe la salida y el reporte de cada archivo en un directorio propio
+y muestra el progreso agregado (archivos/s y MB/s) a medida que terminan.
+Un archivo que falla se informa sin detener el resto.
+"""
+
+import contextlib
+import glob
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+BATCH_REPORT = "batch_report.txt"
+
+
+class FileResult(NamedTuple):
+    input_file: str
+    output_file: str
+    report_file: str
+    ok: bool
+    error: Optional[str]
+    size: int
+    seconds: float
+
+
+# worker(entrada, salida, reporte) -> (ok, mensaje de error)
+Worker = Callable[[str, str, str], Tuple[bool, Optional[str]]]
+
+
+def expand_inputs(pattern: str) -> List[str]:
+    """Archivos .lua de un directorio (recursivo) o de un patrón glob"""
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, '**', '*.lua')
+    return sorted(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+
+
+def output_paths(input_file: str, root: str, output_dir: str, suffix: str) -> Tuple[str, str]:
+    """Rutas de salida y reporte que conservan la estructura relativa a root"""
+    relative = os.path.relpath(input_file, root)
+    base = os.path.join(output_dir, os.path.splitext(relative)[0])
+    return f"{base}{suffix}.lua", f"{base}_report.txt"
+
+
+def _run_one(worker: Worker, input_file: str, output_file: str, report_file: str) -> FileResult:
+    """Procesa un archivo en el proceso hijo, aislando su salida y sus errores"""
+    start = time.perf_counter()
+    size = os.path.getsize(input_file)
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    try:
+        # Los mensajes de cada archivo se descartan para no mezclar la salida de los procesos
+        with contextlib.redirect_stdout(io.StringIO()):
+            ok, error = worker(input_file, output_file, report_file)
+    except Exception as e:
+        ok, error = False, f"{type(e).__name__}: {e}"
+    return FileResult(input_file, output_file, report_file, ok, error, size,
+                      time.perf_counter() - start)
+
+
+def run_batch(pattern: str, output_dir: str, worker: Worker, suffix: str,
+              jobs: Optional[int] = None) -> List[FileResult]:
+    """Procesa todos los archivos del lote y devuelve sus resultados"""
+    inputs = expand_inputs(pattern)
+    if not inputs:
+        print(f"❌ No se encontraron archivos .lua en '{pattern}'")
+        return []
+
+    root = pattern if os.path.isdir(pattern) else os.path.commonpath(
+        [os.path.dirname(os.path.abspath(path)) for path in inputs])
+    jobs = jobs or os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"📦 {len(inputs)} archivos, {jobs} procesos -> {output_dir}")
+
+    results: List[FileResult] = []
+    total_bytes = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = []
+        for input_file in inputs:
+            output_file, report_file = output_paths(os.path.abspath(input_file), os.path.abspath(root),
+                                                    output_dir, suffix)
+            futures.append(pool.submit(_run_one, worker, input_file, output_file, report_file))
+
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            total_bytes += result.size
+            elapsed = max(time.perf_counter() - start, 1e-9)
+            mark = "✅" if result.ok else "❌"
+            detail = "" if result.ok else f" - {result.error}"
+            print(f"{mark} [{len(results)}/{len(inputs)}] {result.input_file} "
+                  f"({result.size / 1024:.1f} KB, {result.seconds:.2f} s) "
+                  f"| {len(results) / elapsed:.1f} archivos/s, {total_bytes / 1e6 / elapsed:.2f} MB/s{detail}")
+
+    elapsed = time.perf_counter() - start
+    write_batch_report(results, output_dir, elapsed)
+    failed = sum(1 for result in results if not result.ok)
+    print(f"\n📊 {len(results) - failed} correctos, {failed} fallidos en {elapsed:.2f} s "
+          f"({len(results) / elapsed:.1f} archivos/s, {total_bytes / 1e6 / elapsed:.2f} MB/s)")
+    print(f"📊 Reporte del lote: {os.path.join(output_dir, BATCH_REPORT)}")
+    return results
+
+
+def write_batch_report(results: List[FileResult], output_dir: str, elapsed: float) -> None:
+    """Resumen del lote con los archivos fallidos y sus errores"""
+    total_bytes = sum(result.size for result in results)
+    failed = [result for result in results if not result.ok]
+    with open(os.path.join(output_dir, BATCH_REPORT), 'w', encoding='utf-8') as f:
+        f.write("=== REPORTE DEL LOTE ===\n\n")
+        f.write(f"Archivos procesados: {len(results)}\n")
+        f.write(f"Correctos: {len(results) - len(failed)}\n")
+        f.write(f"Fallidos: {len(failed)}\n")
+        f.write(f"Tiempo total: {elapsed:.2f} s\n")
+        f.write(f"Velocidad: {len(results) / elapsed:.2f} archivos/s, "
+                f"{total_bytes / 1e6 / elapsed:.2f} MB/s\n")
+
+        f.write("\n=== ARCHIVOS ===\n")
+        for result in sorted(results, key=lambda r: r.input_file):
+            status = "OK" if result.ok else "ERROR"
+            f.write(f"{status:5} {result.seconds:7.2f} s  {result.input_file} -> {result.output_file}\n")
+
+        if failed:
+            f.write("\n=== ERRORES ===\n")
+            for result in failed:
+                f.write(f"{result.input_file}: {result.error}\n")
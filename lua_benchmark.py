@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Banco de pruebas de rendimiento por tamaño de entrada
+Genera scripts sintéticos (lua_synthetic) de tamaños crecientes, ejecuta
+cada herramienta sobre ellos en un proceso propio y lee el perfil por
+pasada que escriben junto al reporte. Para cada pasada ajusta una recta
+log(tiempo) = k·log(tamaño) + c: k ≈ 1 es lineal y un k claramente mayor
+señala una pasada que empeora más que el tamaño del archivo. También
+mide los tokens por segundo y la memoria por token, tanto de cada
+herramienta completa como de los tokens guardados en una lista de Token
+o en columnas (TokenArray).
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from lua_synthetic import generate_script, parse_size
+from lua_lexer import benchmark_storage
+
+DEFAULT_SIZES = '10k,100k,1m'
+DEFAULT_OUTPUT = 'benchmark_results.json'
+
+# Exponente a partir del cual una pasada se marca como superlineal
+SUPERLINEAR_EXPONENT = 1.15
+
+# Las medidas por debajo de esto son sobre todo ruido y no entran en el ajuste
+NOISE_FLOOR = 0.005
+
+# herramienta -> (script, reporte cuyo perfil se lee)
+TOOLS = {
+    'basic': ('deobfuscator.py', 'deobfuscation_report.txt'),
+    'advanced': ('advanced_deobfuscator.py', 'advanced_deobfuscation_report.txt'),
+}
+
+
+def run_tool(tool: str, input_file: str, workdir: str) -> List[Dict]:
+    """Ejecuta una herramienta sin caché y devuelve las líneas de su perfil"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    script, report = TOOLS[tool]
+    profile = os.path.join(workdir, os.path.splitext(report)[0] + '.profile.ndjson')
+    # Un perfil anterior no debe pasar por el de esta ejecución si la herramienta falla
+    if os.path.exists(profile):
+        os.remove(profile)
+    subprocess.run([sys.executable, os.path.join(here, script), '--no-cache', input_file],
+                   cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    if not os.path.exists(profile):
+        raise RuntimeError(f"{script} no generó su perfil para {input_file}")
+    with open(profile, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def growth_exponent(points: List[Tuple[int, float]]) -> Optional[float]:
+    """Pendiente de log(segundos) frente a log(bytes) por mínimos cuadrados"""
+    points = [(size, seconds) for size, seconds in points if seconds >= NOISE_FLOOR]
+    if len(points) < 2:
+        return None
+    xs = [math.log(size) for size, _ in points]
+    ys = [math.log(seconds) for _, seconds in points]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    spread = sum((x - mean_x) ** 2 for x in xs)
+    if spread == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread
+
+
+def run_benchmark(sizes: List[int], seed: int = 0, repeat: int = 1,
+                  tools: Optional[List[str]] = None) -> Dict:
+    """Mide cada pasada de cada herramienta en cada tamaño"""
+    tools = tools or list(TOOLS)
+    runs: Dict[str, Dict[str, List[Dict]]] = {tool: {} for tool in tools}
+    storage: List[Dict] = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            input_file = os.path.join(workdir, f"synthetic_{size}.lua")
+            with open(input_file, 'w', encoding='utf-8') as f:
+                f.write(generate_script(size, seed))
+            actual = os.path.getsize(input_file)
+            with open(input_file, 'rb') as f:
+                stored = benchmark_storage(f.read())
+            storage.append({'size': actual, **{key: round(value, 1) for key, value in stored.items()}})
+            print(f"🧮 {actual / 1024:10.1f} KB  {int(stored['tokens'])} tokens, lexer "
+                  f"{stored['tokens_per_second']:,.0f} tokens/s; {stored['list_bytes_per_token']:.0f} B/token "
+                  f"en lista, {stored['array_bytes_per_token']:.0f} B/token en columnas")
+            for tool in tools:
+                start = time.perf_counter()
+                # Con varias repeticiones se queda la más rápida de cada pasada
+                best: Dict[str, Dict] = {}
+                for _ in range(repeat):
+                    for record in run_tool(tool, input_file, workdir):
+                        name = record['pass']
+                        if name not in best or record['seconds'] < best[name]['seconds']:
+                            best[name] = record
+                elapsed = time.perf_counter() - start
+                total = best['total']
+                # Tokens del análisis léxico: el plegado los cuenta antes de reducirlos
+                tokens = best.get('fold', {}).get('counters', {}).get('tokens_lexed') or 0
+                total['tokens_per_second'] = tokens / total['seconds'] if tokens and total['seconds'] else None
+                total['bytes_per_token'] = total['peak_rss'] / tokens if tokens and total['peak_rss'] else None
+                print(f"⏱️ {tool:<8} {actual / 1024:10.1f} KB  {total['seconds']:8.2f} s "
+                      f"(pico {total['peak_rss'] / 1e6:.0f} MB"
+                      + (f", {total['tokens_per_second']:,.0f} tokens/s, {total['bytes_per_token']:.0f} B/token"
+                         if tokens else "") + ")"
+                      + (f", {repeat} repeticiones en {elapsed:.1f} s" if repeat > 1 else ""))
+                for name, record in best.items():
+                    runs[tool].setdefault(name, []).append({
+                        'size': actual,
+                        'seconds': record['seconds'],
+                        'tokens_in': record.get('tokens_in'),
+                        'bytes_out': record.get('bytes_out'),
+                        'peak_rss': record.get('peak_rss'),
+                        **{key: record[key] for key in ('tokens_per_second', 'bytes_per_token') if key in record},
+                    })
+
+    growth: Dict[str, Dict[str, Dict]] = {}
+    for tool, passes in runs.items():
+        growth[tool] = {}
+        for name, points in passes.items():
+            exponent = growth_exponent([(point['size'], point['seconds']) for point in points])
+            growth[tool][name] = {
+                'exponent': None if exponent is None else round(exponent, 3),
+                'superlinear': exponent is not None and exponent > SUPERLINEAR_EXPONENT,
+            }
+
+    return {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'repeat': repeat,
+        'sizes': sizes,
+        'superlinear_exponent': SUPERLINEAR_EXPONENT,
+        'runs': runs,
+        'storage': storage,
+        'growth': growth,
+    }
+
+
+def print_summary(results: Dict) -> None:
+    """Tabla de tiempos por pasada con su exponente de crecimiento"""
+    for tool, passes in results['runs'].items():
+        print(f"\n📊 {tool}")
+        for name, points in passes.items():
+            growth = results['growth'][tool][name]
+            exponent = growth['exponent']
+            times = '  '.join(f"{point['seconds'] * 1000:9.1f}" for point in points)
+            mark = "⚠️ superlineal" if growth['superlinear'] else ""
+            shown = "   -" if exponent is None else f"{exponent:4.2f}"
+            print(f"  {name:<8} {times} ms  k={shown} {mark}")
+
+
+def main():
+    """Ejecuta el banco de pruebas y guarda los resultados en JSON"""
+    parser = argparse.ArgumentParser(description="Banco de pruebas de los desobfuscadores por tamaño")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help=f"tamaños separados por comas, p. ej. 10k,1m,50m (por defecto {DEFAULT_SIZES})")
+    parser.add_argument('--seed', type=int, default=0, help="semilla del generador")
+    parser.add_argument('--repeat', type=int, default=1, help="repeticiones por medida (se usa la más rápida)")
+    parser.add_argument('--tool', choices=sorted(TOOLS), action='append', help="herramienta a medir (por defecto, todas)")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="archivo JSON de resultados")
+    args = parser.parse_args()
+
+    sizes = sorted(parse_size(size) for size in args.sizes.split(','))
+    print(f"🧪 Tamaños: {', '.join(f'{size / 1024:.0f} KB' for size in sizes)}")
+    try:
+        results = run_benchmark(sizes, args.seed, max(args.repeat, 1), args.tool)
+    except subprocess.CalledProcessError as e:
+        print(f"❌ Falló {' '.join(e.cmd)}:\n{e.stderr.decode('utf-8', 'replace')}")
+        sys.exit(1)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print_summary(results)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Resultados guardados en: {args.output}")
+    flagged = [f"{tool}.{name}" for tool, passes in results['growth'].items()
+               for name, growth in passes.items() if growth['superlinear']]
+    if flagged:
+        print(f"⚠️ Pasadas con crecimiento peor que lineal: {', '.join(flagged)}")
+
+
+if __name__ == "__main__":
+    main()
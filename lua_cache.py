@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Caché en disco direccionada por contenido
+Cada resultado se guarda bajo una clave que encadena el hash del archivo
+de entrada con el nombre, la versión y el código de cada pasada. Si se
+modifica una pasada solo cambian su clave y las de las pasadas que la
+siguen; las anteriores se siguen reutilizando. El tamaño total se
+limita expulsando las entradas usadas hace más tiempo (LRU).
+"""
+
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+from typing import Any, Callable, Dict, Optional
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_MISSING = object()
+_module_hashes: Dict[str, str] = {}
+
+
+def default_cache_dir() -> str:
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'lua_deobfuscator')
+
+
+def module_hash(module) -> str:
+    """Hash del código fuente de un módulo: editarlo invalida las pasadas que lo usan"""
+    path = getattr(module, '__file__', None)
+    if path is None:
+        return ''
+    digest = _module_hashes.get(path)
+    if digest is None:
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        _module_hashes[path] = digest
+    return digest
+
+
+def source_key(data: bytes) -> str:
+    """Clave inicial de la cadena: el contenido del archivo de entrada"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def pass_key(parent: str, name: str, version: int = 1, *modules) -> str:
+    """Clave de una pasada a partir de la clave de su entrada"""
+    digest = hashlib.sha256()
+    digest.update(parent.encode('ascii'))
+    digest.update(f"\0{name}\0{version}".encode('utf-8'))
+    for module in modules:
+        digest.update(b'\0')
+        digest.update(module_hash(module).encode('ascii'))
+    return digest.hexdigest()
+
+
+class PassCache:
+    """Almacén de resultados por clave con expulsión LRU por tamaño"""
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES,
+                 enabled: bool = True):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key: str, suffix: str = '.pkl') -> str:
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    # Valores de Python
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if not self.enabled:
+            return default
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            self.misses += 1
+            return default
+        self.touch(path)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        self._store(self.path(key), lambda f: pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def cached(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Devuelve el valor guardado o lo calcula y lo guarda"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    # Archivos completos (salidas ya escritas)
+
+    def get_file(self, key: str, destination: str) -> bool:
+        """Copia el archivo guardado en destination; False si no está"""
+        if not self.enabled:
+            return False
+        path = self.path(key, '.blob')
+        try:
+            shutil.copyfile(path, destination)
+        except OSError:
+            self.misses += 1
+            return False
+        self.touch(path)
+        self.hits += 1
+        return True
+
+    def put_file(self, key: str, source: str) -> None:
+        if not self.enabled:
+            return
+
+        def copy(f):
+            with open(source, 'rb') as src:
+                shutil.copyfileobj(src, f)
+        self._store(self.path(key, '.blob'), copy)
+
+    # Mantenimiento
+
+    def touch(self, path: str) -> None:
+        """Marca la entrada como usada ahora (la fecha de modificación ordena el LRU)"""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _store(self, path: str, write: Callable) -> None:
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # Escritura atómica: nunca queda una entrada a medias si se interrumpe
+            fd, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(temporary, path)
+        except OSError:
+            return
+        self.evict()
+
+    def entries(self):
+        """(fecha de uso, tamaño, ruta) de cada entrada"""
+        result = []
+        if not os.path.isdir(self.directory):
+            return result
+        for bucket in os.scandir(self.directory):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                result.append((stat.st_mtime, stat.st_size, entry.path))
+        return result
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self) -> int:
+        """Borra las entradas menos usadas hasta quedar por debajo del límite"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        if total <= self.max_bytes:
+            return removed
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+            if total <= self.max_bytes:
+                break
+        return removed
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def add_cache_arguments(parser) -> None:
+    """Opciones de caché comunes a las herramientas de línea de comandos"""
+    parser.add_argument('--no-cache', action='store_true', help="no leer ni guardar resultados en caché")
+    parser.add_argument('--cache-dir', default=None, help=f"directorio de caché (por defecto {default_cache_dir()})")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="tamaño máximo de la caché en MB")
+
+
+def cache_from_arguments(args) -> PassCache:
+    return PassCache(args.cache_dir, args.cache_size * 1024 * 1024, enabled=not args.no_cache)
@@ -0,0 +1,723 @@
+#!/usr/bin/env python3
+"""
+Recuperación del flujo de control aplanado
+El obfuscador convierte cada función en una máquina de estados:
+
+    while M do
+        if M < K1 then
+            if M < K2 then <bloque> else <bloque> end
+        else ... end
+    end
+
+Cada bloque termina asignando el siguiente estado (M = n) o eligiendo
+entre dos (M = c and a or b). Este módulo indexa los bloques por
+intervalo de estado, reconstruye el grafo de bloques básicos y vuelve a
+emitir el código como secuencias e if/else anidados. Los estados que no
+se pueden estructurar (cabeceras de bucle, entradas de funciones,
+bloques compartidos) se conservan en un despachador mínimo.
+"""
+
+import bisect
+import math
+import sys
+from typing import Dict, List, Optional, Set, Tuple
+
+from lua_lexer import Token, NUMBER, KEYWORD, OP, NAME
+from lua_ast import (
+    Node, Chunk, Block, Local, Assign, If, While, LocalFunction, Function, BinaryOp,
+    Name, Number, String, Nil, Boolean, walk,
+)
+from lua_folding import lua_number, format_number
+from lua_parser import parse
+from lua_scope import ScopeResolver, Binding
+
+# Tipos de transición al final de un bloque
+GOTO = 'goto'
+BRANCH = 'branch'
+EXIT = 'exit'
+DYNAMIC = 'dynamic'
+
+# Un despachador con menos bloques no compensa la reconstrucción
+MIN_STATES = 4
+
+_RECURSION_LIMIT = 20000
+
+
+class StateBlock:
+    """Bloque hoja del despachador y la transición con la que termina"""
+
+    def __init__(self, low: float, high: float, block: Block):
+        self.low = low
+        self.high = high
+        self.block = block
+        self.kind = DYNAMIC
+        self.split = len(block.body)   # sentencias [0, split) preceden a la transición
+        self.condition: Optional[Node] = None
+        self.targets: List[int] = []
+        self.target_literals: List[str] = []
+        self.reads_state = False       # lee el estado con el que se entró: solo desde el despachador
+
+
+class StateIndex:
+    """Índice de intervalos estado -> bloque con búsqueda O(log n)"""
+
+    def __init__(self, blocks: List[StateBlock]):
+        self.blocks = blocks
+        self.starts = [block.low for block in blocks]
+
+    def lookup(self, state: float) -> int:
+        return bisect.bisect_right(self.starts, state) - 1
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+
+def _state_test(node: Node, var: str) -> Optional[Tuple[float, bool]]:
+    """Reconoce 'var < K' o 'var <= K' y devuelve (K, inclusivo)"""
+    if isinstance(node, BinaryOp) and node.op in ('<', '<=') and isinstance(node.left, Name) \
+            and node.left.id == var and isinstance(node.right, Number):
+        value = lua_number(node.right.text)
+        if value is not None:
+            return value, node.op == '<='
+    return None
+
+
+def _dispatch_if(block: Block, var: str) -> Optional[Tuple[If, float]]:
+    """Si el bloque es solo 'if var < K then ... else ... end', devuelve (if, corte)"""
+    if len(block.body) != 1 or not isinstance(block.body[0], If):
+        return None
+    node = block.body[0]
+    if len(node.tests) != 1:
+        return None
+    test = _state_test(node.tests[0], var)
+    if test is None:
+        return None
+    value, inclusive = test
+    cut = math.nextafter(value, math.inf) if inclusive else value
+    # Un corte infinito no tiene literal con que volver a escribir el despachador
+    if not math.isfinite(cut):
+        return None
+    return node, cut
+
+
+def build_state_index(loop: While) -> Optional[StateIndex]:
+    """Convierte el árbol binario de comparaciones en una lista ordenada de intervalos"""
+    if not isinstance(loop.test, Name):
+        return None
+    var = loop.test.id
+    if _dispatch_if(loop.body, var) is None:
+        return None
+
+    blocks: List[StateBlock] = []
+    # Recorrido en orden (rama then primero) sin recursión: los intervalos salen ordenados
+    stack: List[Tuple[Optional[Block], float, float]] = [(loop.body, -math.inf, math.inf)]
+    while stack:
+        block, low, high = stack.pop()
+        if low >= high:
+            continue
+        found = _dispatch_if(block, var) if block is not None else None
+        if found is None:
+            blocks.append(StateBlock(low, high, block if block is not None else Block([])))
+            continue
+        node, cut = found
+        stack.append((node.orelse, max(low, cut), high))
+        stack.append((node.blocks[0], low, min(high, cut)))
+
+    if len(blocks) < MIN_STATES:
+        return None
+    return StateIndex(blocks)
+
+
+def _mentions(node: Node, var: str) -> bool:
+    return any(isinstance(n, Name) and n.id == var for n in walk(node))
+
+
+def _assigned_names(statements: List[Node]) -> Optional[Set[str]]:
+    """Nombres asignados por sentencias simples (a = b, a = literal); None si hay otras"""
+    names: Set[str] = set()
+    for statement in statements:
+        if not isinstance(statement, Assign):
+            return None
+        for target, value in zip(statement.targets, statement.values + [None] * len(statement.targets)):
+            if not isinstance(target, Name):
+                return None
+            if value is not None and not isinstance(value, (Name, Number, String, Nil, Boolean)):
+                return None
+            names.add(target.id)
+    return names
+
+
+def _reads_entry_state(statements: List[Node], var: str) -> bool:
+    """¿Leen las sentencias M antes de que el propio bloque le asigne un valor?
+
+    Fuera del despachador M solo conserva el valor de las transiciones que
+    se emiten como salto: un bloque que lee el estado con el que se entró
+    tiene que ser raíz. Las lecturas de lo que el bloque acaba de guardar
+    en M (el intérprete lo usa también como registro) no dependen de él.
+    """
+    for statement in statements:
+        if isinstance(statement, Assign) and len(statement.targets) == 1 \
+                and isinstance(statement.targets[0], Name) and statement.targets[0].id == var:
+            # El valor se evalúa antes de la asignación
+            return any(_mentions(value, var) for value in statement.values)
+        if _mentions(statement, var):
+            return True
+    return False
+
+
+def _declared_names(statements: List[Node]) -> Set[str]:
+    """Locales que declaran las sentencias de un bloque en su propio ámbito"""
+    names: Set[str] = set()
+    for statement in statements:
+        if isinstance(statement, Local):
+            names.update(statement.names)
+        elif isinstance(statement, LocalFunction):
+            names.add(statement.name)
+    return names
+
+
+def classify_block(block: StateBlock, var: str, index: StateIndex) -> None:
+    """Determina la transición con la que termina un bloque"""
+    body = block.block.body
+    last = -1
+    for i in range(len(body) - 1, -1, -1):
+        statement = body[i]
+        if isinstance(statement, Assign) and len(statement.targets) == 1 \
+                and isinstance(statement.targets[0], Name) and statement.targets[0].id == var \
+                and len(statement.values) == 1:
+            last = i
+            break
+        if _mentions(statement, var):
+            # Escrituras de M dentro de sentencias anidadas: transición dinámica
+            return
+
+    if last < 0:
+        return
+
+    trailing = body[last + 1:]
+    if any(_mentions(statement, var) for statement in trailing):
+        return
+    block.reads_state = _reads_entry_state(body[:last + 1], var)
+
+    value = body[last].values[0]
+
+    if isinstance(value, Number):
+        state = lua_number(value.text)
+        if state is None:
+            return
+        block.kind = GOTO
+        block.split = last
+        block.targets = [index.lookup(state)]
+        block.target_literals = [value.text]
+        return
+
+    if isinstance(value, BinaryOp) and value.op == 'or' and isinstance(value.right, Number) \
+            and isinstance(value.left, BinaryOp) and value.left.op == 'and' \
+            and isinstance(value.left.right, Number):
+        first = lua_number(value.left.right.text)
+        second = lua_number(value.right.text)
+        if first is None or second is None:
+            return
+        condition = value.left.left
+        read = {n.id for n in walk(condition) if isinstance(n, Name)}
+        if read & _declared_names(body):
+            # La condición se evalúa después del do ... end del bloque: no ve sus locales
+            return
+        if trailing:
+            # Las sentencias posteriores se emiten antes de evaluar la condición:
+            # solo es seguro si no tocan nada de lo que la condición lee
+            assigned = _assigned_names(trailing)
+            if assigned is None or assigned & read:
+                return
+        block.kind = BRANCH
+        block.split = last
+        block.condition = condition
+        block.targets = [index.lookup(first), index.lookup(second)]
+        block.target_literals = [value.left.right.text, value.right.text]
+        if block.targets[0] == block.targets[1]:
+            block.kind = GOTO
+            block.condition = None
+            block.targets = block.targets[:1]
+            block.target_literals = block.target_literals[:1]
+        return
+
+    # Cualquier otro valor (nil, una global inexistente...) termina el bucle
+    block.kind = EXIT
+    block.split = len(body)
+
+
+class CaptureResolver(ScopeResolver):
+    """Resolución de ámbitos que anota desde qué funciones se usa cada variable
+
+    Si la variable de un despachador se lee o se escribe desde otra función
+    (un cierre creado dentro o fuera del bucle), ese código vería los
+    estados que la recuperación ya no asigna: el despachador se deja igual.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.scope_functions: List[int] = [0]          # id(Function) en curso; 0 = el archivo
+        self.users: Dict[object, Set[int]] = {}        # Binding (o nombre global) -> funciones
+        self.loops: Dict[int, Tuple[object, int]] = {}  # id(While) -> (variable, su función)
+
+    def function(self, node: Function, implicit_self: bool = False) -> None:
+        self.scope_functions.append(id(node))
+        super().function(node, implicit_self)
+        self.scope_functions.pop()
+
+    def reference(self, name: str, site) -> Optional[Binding]:
+        binding = super().reference(name, site)
+        self.users.setdefault(name if binding is None else binding, set()).add(self.scope_functions[-1])
+        return binding
+
+    def statement(self, node: Node) -> None:
+        if isinstance(node, While) and isinstance(node.test, Name):
+            binding = self.lookup(node.test.id)
+            self.loops[id(node)] = (node.test.id if binding is None else binding, self.scope_functions[-1])
+        super().statement(node)
+
+    def captured(self, loop: While) -> bool:
+        """¿Usa otra función la variable de la condición del bucle?"""
+        found = self.loops.get(id(loop))
+        if found is None:
+            return True
+        variable, function = found
+        return bool(self.users.get(variable, set()) - {function})
+
+
+class FlowGraph:
+    """Grafo de bloques básicos de un despachador"""
+
+    def __init__(self, index: StateIndex, var: str):
+        self.index = index
+        self.var = var
+        self.successors: List[List[int]] = [list(block.targets) for block in index.blocks]
+        self.predecessors: List[List[int]] = [[] for _ in index.blocks]
+        for source, targets in enumerate(self.successors):
+            for target in targets:
+                self.predecessors[target].append(source)
+
+    def find_roots(self, external_states: List[float]) -> Set[int]:
+        """Bloques que deben seguir accesibles a través del despachador"""
+        blocks = self.index.blocks
+        roots: Set[int] = {i for i, preds in enumerate(self.predecessors) if not preds}
+        for state in external_states:
+            roots.add(self.index.lookup(state))
+        for i, block in enumerate(blocks):
+            if block.reads_state:
+                # Se llega a él con un salto (M = <literal>), nunca en línea
+                roots.add(i)
+            if block.kind == DYNAMIC:
+                roots.add(i)
+                # Cualquier constante del bloque puede acabar en M
+                for node in walk(block.block):
+                    if isinstance(node, Number):
+                        value = lua_number(node.text)
+                        if value is not None:
+                            roots.add(self.index.lookup(value))
+
+        # Cabeceras de bucle: destinos de aristas de retroceso en un DFS
+        state = [0] * len(blocks)     # 0 = sin visitar, 1 = en la pila, 2 = terminado
+        order = sorted(roots) + list(range(len(blocks)))
+        for start in order:
+            if state[start]:
+                continue
+            roots.add(start)
+            state[start] = 1
+            stack = [(start, iter(self.successors[start]))]
+            while stack:
+                node, children = stack[-1]
+                child = next(children, None)
+                if child is None:
+                    state[node] = 2
+                    stack.pop()
+                elif state[child] == 1:
+                    roots.add(child)
+                elif state[child] == 0:
+                    state[child] = 1
+                    stack.append((child, iter(self.successors[child])))
+
+        # Bloques alcanzados desde regiones distintas pasan a ser raíces
+        changed = True
+        while changed:
+            changed = False
+            owner: Dict[int, int] = {}
+            for root in sorted(roots):
+                for node in self.region(root, roots):
+                    if node == root:
+                        continue
+                    if node in owner and owner[node] != root:
+                        roots.add(node)
+                        changed = True
+                    owner[node] = root
+        return roots
+
+    def region(self, root: int, roots: Set[int]) -> List[int]:
+        """Bloques alcanzables desde root sin atravesar otras raíces, en postorden"""
+        seen = {root}
+        order: List[int] = []
+        stack = [(root, iter(self.successors[root]))]
+        while stack:
+            node, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                order.append(node)
+                stack.pop()
+            elif child not in seen and child not in roots:
+                seen.add(child)
+                stack.append((child, iter(self.successors[child])))
+        return order
+
+    def post_dominators(self, root: int, roots: Set[int]) -> Dict[int, Optional[int]]:
+        """Postdominador inmediato de cada bloque de la región (None = salida)"""
+        ipdom: Dict[int, Optional[int]] = {}
+        depth: Dict[Optional[int], int] = {None: 0}
+
+        def intersect(a: Optional[int], b: Optional[int]) -> Optional[int]:
+            while a != b:
+                if depth[a] >= depth[b]:
+                    a = ipdom[a] if a is not None else None
+                else:
+                    b = ipdom[b] if b is not None else None
+                if a is None and b is None:
+                    return None
+            return a
+
+        # En una región acíclica el postorden procesa los sucesores primero
+        for node in self.region(root, roots):
+            result: Optional[int] = None
+            first = True
+            for child in self.successors[node]:
+                candidate = None if child in roots else child
+                result = candidate if first else intersect(result, candidate)
+                first = False
+            ipdom[node] = result
+            depth[node] = depth[result] + 1
+        return ipdom
+
+
+class ControlFlowRecovery:
+    """Reemplaza los despachadores de un flujo de tokens por código estructurado"""
+
+    def __init__(self, tokens: List[Token]):
+        self.tokens = tokens
+        self.replacements: Dict[int, Tuple[int, List[Token]]] = {}
+        self.found: List[Tuple[While, StateIndex]] = []
+        self.stats = {
+            'dispatchers': 0,
+            'states': 0,
+            'structured_blocks': 0,
+            'dispatch_roots': 0,
+        }
+
+    def run(self) -> List[Token]:
+        chunk = parse(self.tokens)
+        self.found = self._dispatchers(chunk)
+        if not self.found:
+            return self.tokens
+        return self.recover(self._external_states(chunk, self.found))
+
+    def analyze(self) -> List[float]:
+        """Busca los despachadores y devuelve las constantes del código que pueden entrar en M
+
+        Para recuperar trozos de un archivo por separado (lua_watch): las
+        constantes de todos los trozos juntas son las que recover necesita.
+        """
+        chunk = parse(self.tokens)
+        self.found = self._dispatchers(chunk)
+        return self._external_states(chunk, self.found)
+
+    def recover(self, external: List[float]) -> List[Token]:
+        """Sustituye los despachadores encontrados con las constantes externas del archivo"""
+        # Los despachadores internos primero, para que los externos copien su versión
+        self.found.sort(key=lambda item: item[0].span[1] - item[0].span[0])
+        previous = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(previous, _RECURSION_LIMIT))
+        try:
+            for loop, index in self.found:
+                self.replacements[loop.span[0]] = (loop.span[1], self.recover_dispatcher(loop, index, external))
+        finally:
+            sys.setrecursionlimit(previous)
+
+        return self.copy(0, len(self.tokens))
+
+    @staticmethod
+    def _dispatchers(chunk: Chunk) -> List[Tuple[While, StateIndex]]:
+        found = []
+        for loop in walk(chunk):
+            if isinstance(loop, While):
+                index = build_state_index(loop)
+                if index is not None:
+                    found.append((loop, index))
+        if found:
+            resolver = CaptureResolver()
+            resolver.resolve(chunk)
+            found = [(loop, index) for loop, index in found if not resolver.captured(loop)]
+        return found
+
+    def _external_states(self, chunk: Chunk, found) -> List[float]:
+        """Constantes que pueden entrar en M desde fuera de las transiciones conocidas"""
+        excluded: Set[int] = set()
+        for loop, index in found:
+            var = loop.test.id
+            for block in index.blocks:
+                classify_block(block, var, index)
+            for node in walk(loop.body):
+                if isinstance(node, If) and len(node.tests) == 1 and _state_test(node.tests[0], var):
+                    excluded.add(id(node.tests[0].right))
+            for block in index.blocks:
+                if block.kind in (GOTO, BRANCH):
+                    value = block.block.body[block.split].values[0]
+                    for node in walk(value):
+                        if isinstance(node, Number):
+                            excluded.add(id(node))
+        states = []
+        for node in walk(chunk):
+            if isinstance(node, Number) and id(node) not in excluded:
+                value = lua_number(node.text)
+                if value is not None:
+                    states.append(value)
+        return states
+
+    def copy(self, start: int, end: int) -> List[Token]:
+        """Copia tokens[start:end] aplicando los despachadores ya recuperados"""
+        if not self.replacements:
+            return self.tokens[start:end]
+        result: List[Token] = []
+        i = start
+        while i < end:
+            replacement = self.replacements.get(i)
+            if replacement is not None and replacement[0] <= end:
+                result.extend(replacement[1])
+                i = replacement[0]
+            else:
+                result.append(self.tokens[i])
+                i += 1
+        return result
+
+    def recover_dispatcher(self, loop: While, index: StateIndex, external: List[float]) -> List[Token]:
+        """Tokens estructurados de un despachador ya indexado y clasificado
+
+        external son los estados que pueden entrar en M desde fuera de las
+        transiciones: quien los conoce mejor que el archivo entero (como
+        lua_devirtualize, que sabe el estado inicial de cada función) puede
+        pasar solo esos y dejar menos raíces en el despachador.
+        """
+        var = loop.test.id
+        graph = FlowGraph(index, var)
+        roots = graph.find_roots(external)
+        position = self.tokens[loop.span[0]].start
+
+        emitter = _RegionEmitter(self, graph, roots, position)
+        regions: Dict[int, List[Token]] = {}
+        pending = sorted(roots)
+        while pending:
+            root = pending.pop(0)
+            if root in regions:
+                continue
+            regions[root] = emitter.emit_region(root)
+            for extra in sorted(emitter.promoted - set(regions)):
+                if extra not in pending:
+                    pending.append(extra)
+            roots |= emitter.promoted
+
+        self.stats['dispatchers'] += 1
+        self.stats['states'] += len(index)
+        self.stats['dispatch_roots'] += len(regions)
+        self.stats['structured_blocks'] += emitter.inlined
+
+        return self._dispatch_tokens(var, index, regions, position)
+
+    def _dispatch_tokens(self, var: str, index: StateIndex, regions: Dict[int, List[Token]],
+                         position: int) -> List[Token]:
+        """while M do if M < b1 then R1 elseif M < b2 then R2 ... else Rn end end"""
+        def tok(kind: str, value: str) -> Token:
+            return Token(kind, value, position, position)
+
+        ordered = sorted(regions)
+        out = [tok(KEYWORD, 'while'), tok(NAME, var), tok(KEYWORD, 'do')]
+        if len(ordered) == 1:
+            out.extend(regions[ordered[0]])
+        else:
+            for k, root in enumerate(ordered):
+                if k == len(ordered) - 1:
+                    out.append(tok(KEYWORD, 'else'))
+                else:
+                    # Cada raíz cubre hasta el inicio de la siguiente
+                    bound = index.blocks[ordered[k + 1]].low
+                    out.append(tok(KEYWORD, 'if' if k == 0 else 'elseif'))
+                    out.extend([tok(NAME, var), tok(OP, '<')])
+                    out.extend(_number_tokens(bound, position))
+                    out.append(tok(KEYWORD, 'then'))
+                out.extend(regions[root])
+            out.append(tok(KEYWORD, 'end'))
+        out.append(tok(KEYWORD, 'end'))
+        return out
+
+
+def _number_tokens(value: float, position: int) -> List[Token]:
+    text = format_number(value)
+    if text.startswith('-'):
+        return [Token(OP, '-', position, position), Token(NUMBER, text[1:], position, position)]
+    return [Token(NUMBER, text, position, position)]
+
+
+class _RegionEmitter:
+    """Emite una región de bloques como código estructurado"""
+
+    def __init__(self, recovery: ControlFlowRecovery, graph: FlowGraph, roots: Set[int], position: int):
+        self.recovery = recovery
+        self.graph = graph
+        self.roots = roots
+        self.position = position
+        self.emitted: Set[int] = set()
+        self.promoted: Set[int] = set()
+        self.inlined = 0
+        self.ipdom: Dict[int, Optional[int]] = {}
+
+    def tok(self, kind: str, value: str) -> Token:
+        return Token(kind, value, self.position, self.position)
+
+    def statements(self, statements: List[Node]) -> List[Token]:
+        out: List[Token] = []
+        for statement in statements:
+            out.extend(self.recovery.copy(*statement.span))
+        return out
+
+    def body(self, statements: List[Node]) -> List[Token]:
+        """Sentencias de un bloque; entre do ... end si declaran locales, que no deben verse en los siguientes"""
+        out = self.statements(statements)
+        if _declared_names(statements):
+            return [self.tok(KEYWORD, 'do')] + out + [self.tok(KEYWORD, 'end')]
+        return out
+
+    def jump(self, block: StateBlock, slot: int) -> List[Token]:
+        """M = <estado> hacia una raíz del despachador"""
+        literal = block.target_literals[slot]
+        out = [self.tok(NAME, self.graph.var), self.tok(OP, '=')]
+        if literal.startswith('-'):
+            out.extend([self.tok(OP, '-'), self.tok(NUMBER, literal[1:])])
+        else:
+            out.append(self.tok(NUMBER, literal))
+        return out
+
+    def emit_region(self, root: int) -> List[Token]:
+        # Un bloque al que se llega por dos caminos que no se unen en él (o ya
+        # emitido en otra región) pasa a ser raíz antes de emitir: si se
+        # promoviera a mitad de la emisión, la unión calculada sin él seguiría
+        # en línea tras el salto y el bloque no llegaría a ejecutarse.
+        while True:
+            self.ipdom = self.graph.post_dominators(root, self.roots)
+            shared = self.shared_blocks(root)
+            if not shared:
+                break
+            self.promoted |= shared
+            self.roots |= shared
+        self.emitted.add(root)
+        return self.emit(root, None, first=True)
+
+    def shared_blocks(self, root: int) -> Set[int]:
+        """Bloques que la emisión de la región alcanzaría más de una vez"""
+        seen = {root}
+        shared: Set[int] = set()
+        self.visit(root, None, seen, shared)
+        return shared
+
+    def enter(self, target: int, seen: Set[int], shared: Set[int]) -> bool:
+        if target in self.roots:
+            return False
+        if target in seen or target in self.emitted:
+            shared.add(target)
+            return False
+        seen.add(target)
+        return True
+
+    def visit(self, node: int, stop: Optional[int], seen: Set[int], shared: Set[int]) -> None:
+        """Recorre la región en el mismo orden que emit, sin generar código"""
+        blocks = self.graph.index.blocks
+        while True:
+            block = blocks[node]
+            if block.kind in (EXIT, DYNAMIC):
+                return
+            if block.kind == GOTO:
+                target = block.targets[0]
+                if target == stop or not self.enter(target, seen, shared):
+                    return
+                node = target
+                continue
+            join = self.ipdom.get(node)
+            for target in block.targets[:2]:
+                if target != join and self.enter(target, seen, shared):
+                    self.visit(target, join, seen, shared)
+            if join is None or join == stop or not self.enter(join, seen, shared):
+                return
+            node = join
+
+    def emit(self, node: int, stop: Optional[int], first: bool = False) -> List[Token]:
+        out: List[Token] = []
+        blocks = self.graph.index.blocks
+        while True:
+            if not first:
+                self.emitted.add(node)
+                self.inlined += 1
+            first = False
+            block = blocks[node]
+            body = block.block.body
+            trailing = body[block.split + 1:] if block.kind in (GOTO, BRANCH) else []
+            out.extend(self.body(body[:block.split] + trailing))
+
+            if block.kind in (EXIT, DYNAMIC):
+                return out
+
+            if block.kind == GOTO:
+                target = block.targets[0]
+                if target == stop:
+                    return out
+                if target in self.roots:
+                    out.extend(self.jump(block, 0))
+                    return out
+                node = target
+                continue
+
+            # Bifurcación: if c then <rama a> else <rama b> end, y se sigue en la unión
+            join = self.ipdom.get(node)
+            branches = [self.branch(block, slot, join) for slot in (0, 1)]
+            condition = self.recovery.copy(*block.condition.span)
+            if not branches[0] and branches[1]:
+                out.extend([self.tok(KEYWORD, 'if'), self.tok(KEYWORD, 'not'), self.tok(OP, '(')])
+                out.extend(condition)
+                out.extend([self.tok(OP, ')'), self.tok(KEYWORD, 'then')])
+                out.extend(branches[1])
+            else:
+                out.append(self.tok(KEYWORD, 'if'))
+                out.extend(condition)
+                out.append(self.tok(KEYWORD, 'then'))
+                out.extend(branches[0])
+                if branches[1]:
+                    out.append(self.tok(KEYWORD, 'else'))
+                    out.extend(branches[1])
+            out.append(self.tok(KEYWORD, 'end'))
+
+            if join is None or join == stop:
+                return out
+            if join in self.roots:
+                out.extend([self.tok(NAME, self.graph.var), self.tok(OP, '=')])
+                out.extend(_number_tokens(blocks[join].low if blocks[join].low != -math.inf
+                                          else blocks[join].high - 1, self.position))
+                return out
+            node = join
+
+    def branch(self, block: StateBlock, slot: int, join: Optional[int]) -> List[Token]:
+        target = block.targets[slot]
+        if target == join:
+            return []
+        if target in self.roots:
+            return self.jump(block, slot)
+        return self.emit(target, join, first=False)
+
+
+def recover_control_flow(tokens: List[Token]) -> Tuple[List[Token], Dict[str, int]]:
+    """Reconstruye los despachadores de estados de un flujo de tokens"""
+    recovery = ControlFlowRecovery(tokens)
+    result = recovery.run()
+    return result, recovery.stats
@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+Eliminación de ramas muertas y predicados opacos
+Tras recuperar el flujo quedan muchas comprobaciones cuyo resultado se
+conoce al escribir el código:
+
+    M = true
+    if M then <bloque> else <bloque nunca alcanzado> end
+
+Este módulo propaga las constantes (nil, booleanos, números y cadenas)
+por las variables locales y los parámetros de cada función, decide los if/elseif, los
+while y las selecciones a and b or c cuyo resultado ya se sabe y quita
+los bloques a los que no se puede llegar. Solo se siguen las locales que
+ninguna otra función ve: una llamada no puede cambiarlas por debajo.
+"""
+
+import sys
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple, Union
+
+from lua_lexer import Token, KEYWORD, OP, string_value
+from lua_ast import (
+    Node, Block, Local, Assign, CompoundAssign, Do, While, Repeat, If,
+    NumericFor, GenericFor, FunctionStatement, LocalFunction, Return, Break, Continue,
+    Goto, Label, Nil, Boolean, Number, String, Vararg, Function, BinaryOp, UnaryOp,
+    Name, Call, Invoke, Paren,
+)
+from lua_folding import lua_number, _apply
+from lua_parser import parse, _RECURSION_LIMIT
+from lua_profile import token_bytes
+from lua_scope import ScopeResolver, Binding
+
+
+class _Nil:
+    """El valor nil de Lua (None ya significa 'desconocido')"""
+
+    def __repr__(self) -> str:
+        return 'nil'
+
+
+NIL = _Nil()
+UNKNOWN = None
+
+Value = Union[_Nil, bool, float, bytes, None]
+Env = Dict[Binding, Value]
+
+# Una pieza de un reemplazo: un tramo de tokens originales o un token nuevo
+Piece = Union[Tuple[int, int], Token]
+
+
+class RemovedBlock(NamedTuple):
+    """Código que la eliminación quita, para los registros del reporte (lua_records)"""
+    reason: str     # 'if', 'while' o 'unreachable' (lo que sigue a un return, break o goto)
+    position: int   # posición en el archivo del primer token de la sentencia
+    blocks: int     # bloques quitados
+    size: int       # bytes de código que desaparecen
+
+
+_LOOPS = (While, Repeat, NumericFor, GenericFor)
+_MULTIPLE = (Call, Invoke, Vararg)
+_TERMINATORS = (Return, Break, Continue)
+_COMPARISONS = {
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+}
+
+
+def _truthy(value: Value) -> bool:
+    return value is not NIL and value is not False
+
+
+def _equal(left: Value, right: Value) -> bool:
+    # True == 1.0 en Python, pero no en Lua
+    return type(left) is type(right) and left == right
+
+
+def _merge(paths: List[Optional[Env]]) -> Optional[Env]:
+    """Constantes comunes a todos los caminos que llegan al mismo punto"""
+    live = [env for env in paths if env is not None]
+    if not live:
+        return None
+    merged = dict(live[0])
+    for env in live[1:]:
+        for binding in list(merged):
+            if binding not in env or not _equal(env[binding], merged[binding]):
+                del merged[binding]
+    return merged
+
+
+class _ConstantResolver(ScopeResolver):
+    """Resolución de ámbitos que además sabe qué locales ve otra función y qué asigna cada bucle
+
+    outer da, para cada llamada __unidad_k() de un esqueleto (lua_units),
+    los nombres que la unidad usa de ámbitos exteriores: las locales del
+    esqueleto con esos nombres cuentan como capturadas.
+    """
+
+    def __init__(self, outer: Optional[Dict[str, Set[str]]] = None):
+        super().__init__()
+        self.outer = outer or {}
+        self.depth = 0
+        self.depths: Dict[Binding, int] = {}
+        self.captured: Set[Binding] = set()
+        self.references: Dict[int, Binding] = {}    # id(Name o FunctionStatement) -> declaración
+        self.declared: Dict[Tuple[int, int], Binding] = {}  # (id(lista de nombres), i) -> declaración
+        self.assigned: Dict[int, Set[Binding]] = {}  # id(bucle) -> locales asignadas dentro
+        self.loops: List[Set[Binding]] = []
+        self.free: Set[str] = set()                 # nombres sin declaración local
+        self.functions: List[Function] = []
+        self.selections: Dict[int, List[BinaryOp]] = {}  # id(sentencia) -> sus and/or en preorden
+        self.current: List[BinaryOp] = []
+
+    def declare(self, name, kind, site, value=None, position=0) -> Binding:
+        binding = super().declare(name, kind, site, value, position)
+        self.depths[binding] = self.depth
+        holder, key = site
+        if isinstance(key, int):
+            self.declared[(id(holder), key)] = binding
+        return binding
+
+    def function(self, node: Function, implicit_self: bool = False) -> None:
+        self.functions.append(node)
+        self.depth += 1
+        super().function(node, implicit_self)
+        self.depth -= 1
+
+    def reference(self, name, site) -> Optional[Binding]:
+        binding = super().reference(name, site)
+        if binding is None:
+            self.free.add(name)
+            for outer_name in self.outer.get(name, ()):
+                captured = self.lookup(outer_name)
+                if captured is not None:
+                    self.captured.add(captured)
+        elif self.depths.get(binding, self.depth) != self.depth:
+            self.captured.add(binding)
+        if binding is not None and site[1] == 'id':
+            self.references[id(site[0])] = binding
+        return binding
+
+    def expression(self, node: Node) -> None:
+        if isinstance(node, BinaryOp) and node.op in ('and', 'or'):
+            self.current.append(node)
+        super().expression(node)
+
+    def statement(self, node: Node) -> None:
+        loop = isinstance(node, _LOOPS)
+        if loop:
+            self.loops.append(set())
+        outer, self.current = self.current, []
+        super().statement(node)
+        if self.current:
+            self.selections[id(node)] = self.current
+        self.current = outer
+        if self.loops:
+            if isinstance(node, (Assign, CompoundAssign)):
+                for target in node.targets if isinstance(node, Assign) else [node.target]:
+                    binding = self.references.get(id(target))
+                    if binding is not None:
+                        self.loops[-1].add(binding)
+        if isinstance(node, FunctionStatement) and len(node.names) == 1 and node.method is None:
+            binding = self.lookup(node.names[0])
+            if binding is not None:
+                self.references[id(node)] = binding
+                if self.loops:
+                    self.loops[-1].add(binding)
+        if loop:
+            assigned = self.loops.pop()
+            self.assigned[id(node)] = assigned
+            if self.loops:
+                self.loops[-1] |= assigned
+
+
+class DeadCodeElimination:
+    """Quita de un flujo de tokens las ramas que las constantes conocidas deciden"""
+
+    def __init__(self, tokens: List[Token], outer: Optional[Dict[str, Set[str]]] = None):
+        self.tokens = tokens
+        self.resolver = _ConstantResolver(outer)
+        self.replacements: Dict[int, Tuple[int, List[Piece]]] = {}
+        self.removed: List[RemovedBlock] = []
+        self.stats = {
+            'predicates_decided': 0,
+            'blocks_removed': 0,
+            'expressions_simplified': 0,
+            'bytes_removed': 0,
+        }
+
+    @property
+    def free(self) -> Set[str]:
+        """Nombres que el código usa sin declararlos (globales o de un ámbito exterior)"""
+        return self.resolver.free
+
+    def run(self) -> List[Token]:
+        chunk = parse(self.tokens)
+        previous = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(previous, _RECURSION_LIMIT))
+        try:
+            self.resolver.resolve(chunk)
+            # Cada función empieza sin constantes conocidas: se recorren por separado
+            self.block(chunk.body, {})
+            for function in self.resolver.functions:
+                self.block(function.body, {})
+        finally:
+            sys.setrecursionlimit(previous)
+        if not self.replacements:
+            return self.tokens
+        result = self.copy(0, len(self.tokens))
+        self.stats['bytes_removed'] = token_bytes(self.tokens) - token_bytes(result)
+        return result
+
+    def copy(self, start: int, end: int) -> List[Token]:
+        """Copia tokens[start:end] aplicando los reemplazos que caben en el tramo"""
+        result: List[Token] = []
+        i = start
+        while i < end:
+            replacement = self.replacements.get(i)
+            if replacement is not None and replacement[0] <= end:
+                for piece in replacement[1]:
+                    if isinstance(piece, Token):
+                        result.append(piece)
+                    else:
+                        result.extend(self.copy(*piece))
+                i = replacement[0]
+            else:
+                result.append(self.tokens[i])
+                i += 1
+        return result
+
+    def tracked(self, binding: Optional[Binding]) -> bool:
+        # El self implícito de los métodos no se declara: no se sabe si otra función lo ve
+        return binding in self.resolver.depths and binding not in self.resolver.captured
+
+    # Valores
+
+    def evaluate(self, node: Node, env: Env) -> Value:
+        """Valor constante de una expresión sin efectos, o UNKNOWN"""
+        if isinstance(node, Nil):
+            return NIL
+        if isinstance(node, Boolean):
+            return node.value
+        if isinstance(node, Number):
+            return lua_number(node.text)
+        if isinstance(node, String):
+            # Las cadenas interpoladas de Luau (`...`) no son constantes
+            return string_value(node.raw) if node.raw[:1] in ('"', "'", '[') else UNKNOWN
+        if isinstance(node, Name):
+            binding = self.resolver.references.get(id(node))
+            return env.get(binding, UNKNOWN) if binding is not None else UNKNOWN
+        if isinstance(node, Paren):
+            return self.evaluate(node.expr, env)
+        if isinstance(node, UnaryOp):
+            value = self.evaluate(node.operand, env)
+            if value is UNKNOWN:
+                return UNKNOWN
+            if node.op == 'not':
+                return not _truthy(value)
+            if node.op == '-' and type(value) is float:
+                return -value
+            if node.op == '#' and type(value) is bytes:
+                return float(len(value))
+            return UNKNOWN
+        if isinstance(node, BinaryOp):
+            left = self.evaluate(node.left, env)
+            if left is UNKNOWN:
+                return UNKNOWN
+            if node.op in ('and', 'or'):
+                if _truthy(left) == (node.op == 'or'):
+                    return left
+                return self.evaluate(node.right, env)
+            right = self.evaluate(node.right, env)
+            if right is UNKNOWN:
+                return UNKNOWN
+            if node.op in ('==', '~='):
+                return _equal(left, right) == (node.op == '==')
+            if type(left) is float and type(right) is float:
+                if node.op in _COMPARISONS:
+                    return _COMPARISONS[node.op](left, right)
+                return _apply(node.op, left, right) if node.op in ('+', '-', '*', '/', '//', '%', '^') \
+                    else UNKNOWN
+            if node.op == '..' and type(left) is bytes and type(right) is bytes:
+                return left + right
+        return UNKNOWN
+
+    def simplify(self, node: Node, env: Env) -> None:
+        """Reduce las selecciones and/or de una sentencia cuyo lado izquierdo se conoce"""
+        skipped: List[Tuple[int, int]] = []
+        for selection in self.resolver.selections.get(id(node), ()):
+            start = selection.span[0]
+            # En preorden: las que quedan dentro de un operando descartado ya no están
+            if any(low <= start < high for low, high in skipped):
+                continue
+            chosen = self.select(selection, env)
+            if chosen is selection:
+                continue
+            self.choose(selection, chosen)
+            if chosen.span[0] == start:
+                # Se queda con el operando izquierdo: es una constante, no hay nada dentro
+                skipped.append(selection.span)
+            else:
+                skipped += [(start, chosen.span[0]), (chosen.span[1], selection.span[1])]
+
+    def select(self, node: Node, env: Env) -> Node:
+        """Operando al que se reduce una cadena de and/or con el lado izquierdo conocido"""
+        while isinstance(node, BinaryOp) and node.op in ('and', 'or'):
+            left = self.evaluate(node.left, env)
+            if left is UNKNOWN:
+                break
+            node = node.left if _truthy(left) == (node.op == 'or') else node.right
+        return node
+
+    def choose(self, node: Node, operand: Node) -> None:
+        position = self.tokens[node.span[0]].start
+        if isinstance(operand, _MULTIPLE):
+            # (f()) se queda con un solo valor, como a and f()
+            pieces = [Token(OP, '(', position, position), operand.span, Token(OP, ')', position, position)]
+        else:
+            pieces = [operand.span]
+        self.replacements[node.span[0]] = (node.span[1], pieces)
+        self.stats['expressions_simplified'] += 1
+
+    def assign(self, bindings: List[Optional[Binding]], values: List[Node], env: Env) -> None:
+        """Asigna a las locales seguidas los valores de una lista de expresiones"""
+        known = [self.evaluate(value, env) for value in values[:len(bindings)]]
+        if len(values) < len(bindings):
+            # a, b = f() deja b desconocida; a, b = 1 la deja a nil
+            filler = UNKNOWN if values and isinstance(values[-1], _MULTIPLE) else NIL
+            known += [filler] * (len(bindings) - len(values))
+        for binding, value in zip(bindings, known):
+            if not self.tracked(binding):
+                continue
+            if value is UNKNOWN:
+                env.pop(binding, None)
+            else:
+                env[binding] = value
+
+    # Sentencias
+
+    def block(self, node: Block, env: Optional[Env]) -> Optional[Env]:
+        """Recorre un bloque y devuelve las constantes al salir (None si no se sale por el final)"""
+        statements = node.body
+        for k, statement in enumerate(statements):
+            if env is None:
+                if not any(isinstance(later, Label) for later in statements[k:]):
+                    self.replacements[statement.span[0]] = (statements[-1].span[1], [])
+                    self.stats['blocks_removed'] += 1
+                    self.record('unreachable', statement.span[0], statements[-1].span[1], [], 1)
+                    return None
+                # Se puede llegar saltando a una etiqueta: sin constantes conocidas
+                env = {}
+            env = self.statement(statement, env)
+        return env
+
+    def statement(self, node: Node, env: Env) -> Optional[Env]:
+        references = self.resolver.references
+        if isinstance(node, If):
+            return self.if_statement(node, env)
+        if isinstance(node, _LOOPS):
+            return self.loop(node, env)
+        self.simplify(node, env)
+        if isinstance(node, Local):
+            self.assign([self.resolver.declared.get((id(node.names), i)) for i in range(len(node.names))],
+                        node.values, env)
+        elif isinstance(node, Assign):
+            self.assign([references.get(id(target)) if isinstance(target, Name) else None
+                         for target in node.targets], node.values, env)
+        elif isinstance(node, CompoundAssign):
+            if isinstance(node.target, Name):
+                env.pop(references.get(id(node.target)), None)
+        elif isinstance(node, FunctionStatement):
+            env.pop(references.get(id(node)), None)
+        elif isinstance(node, Do):
+            return self.block(node.body, env)
+        elif isinstance(node, (Return, Break, Continue, Goto)):
+            return None
+        elif isinstance(node, Label):
+            return {}
+        return env
+
+    def loop(self, node: Node, env: Env) -> Env:
+        """Las locales que el bucle asigna no se conocen en ninguna vuelta ni a la salida"""
+        assigned = self.resolver.assigned.get(id(node), ())
+        entry = {binding: value for binding, value in env.items() if binding not in assigned}
+        if isinstance(node, While):
+            # La primera comprobación ve las constantes de antes del bucle
+            test = self.evaluate(node.test, env)
+            if test is not UNKNOWN and not _truthy(test):
+                self.stats['predicates_decided'] += 1
+                self.stats['blocks_removed'] += 1
+                self.record('while', *node.span, [], 1)
+                self.replace(node, [])
+                return env
+        # La cabecera de un for se evalúa una vez, pero con entry basta
+        self.simplify(node, entry)
+        self.block(node.body, dict(entry))
+        return entry
+
+    def if_statement(self, node: If, env: Env) -> Optional[Env]:
+        self.simplify(node, env)
+        kept: List[Tuple[Node, Block]] = []
+        paths: List[Optional[Env]] = []
+        final = node.orelse
+        decided = removed = 0
+        for k, (test, body) in enumerate(zip(node.tests, node.blocks)):
+            value = self.evaluate(test, env)
+            if value is UNKNOWN:
+                kept.append((test, body))
+                paths.append(self.block(body, dict(env)))
+                continue
+            decided += 1
+            if _truthy(value):
+                # Este brazo pasa a ser el else; los siguientes no se alcanzan
+                removed += len(node.blocks) - k - 1 + (node.orelse is not None)
+                final = body
+                break
+            removed += 1
+        paths.append(env if final is None else self.block(final, dict(env)))
+        if decided:
+            self.stats['predicates_decided'] += decided
+            self.stats['blocks_removed'] += removed
+            pieces = self.if_pieces(node, kept, final)
+            if removed:
+                self.record('if', *node.span, pieces, removed)
+            self.replace(node, pieces)
+        return _merge(paths)
+
+    def if_pieces(self, node: If, kept: List[Tuple[Node, Block]], final: Optional[Block]) -> List[Piece]:
+        position = self.tokens[node.span[0]].start
+
+        def tok(value: str) -> Token:
+            return Token(KEYWORD, value, position, position)
+
+        if not kept:
+            if final is None or not final.body:
+                return []
+            statements = final.body
+            # Las locales no pueden salir del bloque y return/break tienen que ir al final
+            if any(isinstance(statement, (Local, LocalFunction, Label)) for statement in statements) \
+                    or isinstance(statements[-1], _TERMINATORS):
+                return [tok('do'), final.span, tok('end')]
+            pieces: List[Piece] = [final.span]
+            if self.tokens[final.span[0]].value == '(':
+                pieces.insert(0, Token(OP, ';', position, position))
+            return pieces
+        pieces = []
+        for k, (test, body) in enumerate(kept):
+            pieces += [tok('if' if k == 0 else 'elseif'), test.span, tok('then'), body.span]
+        if final is not None:
+            pieces += [tok('else'), final.span]
+        pieces.append(tok('end'))
+        return pieces
+
+    def record(self, reason: str, start: int, end: int, pieces: List[Piece], blocks: int) -> None:
+        """Anota el código que quita un reemplazo de tokens[start:end] por pieces"""
+        kept = sum(len(piece.value) if isinstance(piece, Token) else token_bytes(self.tokens[piece[0]:piece[1]])
+                   for piece in pieces)
+        size = token_bytes(self.tokens[start:end]) - kept
+        self.removed.append(RemovedBlock(reason, self.tokens[start].start, blocks, size))
+
+    def replace(self, node: Node, pieces: List[Piece]) -> None:
+        """Sustituye una sentencia; un ';' evita que la siguiente, si empieza por '(', se una a la anterior"""
+        start, end = node.span
+        if end < len(self.tokens) and self.tokens[end].value == '(' and self.tokens[end].kind == OP:
+            position = self.tokens[start].start
+            pieces = pieces + [Token(OP, ';', position, position)]
+        self.replacements[start] = (end, pieces)
+
+
+def eliminate_dead_code(tokens: List[Token]) -> Tuple[List[Token], List[RemovedBlock], Dict[str, int]]:
+    """Quita las ramas muertas de un flujo de tokens"""
+    elimination = DeadCodeElimination(tokens)
+    result = elimination.run()
+    return result, elimination.removed, elimination.stats
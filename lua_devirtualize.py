@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+Desvirtualización del intérprete embebido
+Algunas versiones del obfuscador no aplanan cada función por separado:
+meten el programa entero en una sola función intérprete,
+
+    M = function(M, O, z, j)
+        local <registros>
+        while M do <árbol if M < K con los bloques de todas las funciones> end
+        M = #j return v(i)
+    end
+
+y cada función original pasa a ser un cierre que llama al intérprete con
+su estado inicial (una fábrica X(6315827, {...}) devuelve una función que
+hace M(J, {args}, ...)). No hay bytecode: la codificación de las
+instrucciones es la tabla estado -> bloque del despachador y el pool de
+constantes son los estados iniciales que reciben las fábricas. Este
+módulo guarda esa tabla en columnas, recorre sin ejecutar nada los
+estados alcanzables desde cada entrada (en tiempo lineal en el número de
+estados) y cambia el intérprete por una tabla {[estado] = function ...}
+con una función por cada función original, cada una con su propio
+despachador ya estructurado por lua_control_flow. Un bloque que calcula
+el siguiente estado con sus registros (u = n; M = c and u; ...) se sigue
+dentro del propio bloque; si no se puede, cualquier constante de la
+función cuenta como posible estado, igual que hace lua_control_flow con
+las del archivo entero.
+"""
+
+import bisect
+import re
+import sys
+from array import array
+from typing import Dict, List, Optional, Set, Tuple
+
+from lua_lexer import Token, KEYWORD, OP, NAME
+from lua_ast import (
+    Node, Local, Assign, CompoundAssign, While, Function, Name, Number, BinaryOp, UnaryOp, Call, Paren,
+    walk,
+)
+from lua_control_flow import (
+    StateBlock, StateIndex, ControlFlowRecovery, CaptureResolver, build_state_index,
+    classify_block, _number_tokens, GOTO, BRANCH, EXIT, DYNAMIC, _RECURSION_LIMIT,
+)
+from lua_folding import lua_number
+from lua_parser import parse
+from lua_scope import Binding, PARAM
+
+# Si las funciones separadas repiten más estados que esto (bloques compartidos), el intérprete se deja
+MAX_GROWTH = 2
+
+_KIND_CODES = {GOTO: 0, BRANCH: 1, EXIT: 2, DYNAMIC: 3}
+_ARITHMETIC = frozenset({'+', '-', '*', '/', '//', '%', '^'})
+_FACTORY_CALL = re.compile(rb'return\s*[A-Za-z_]\w*\s*\(\s*[A-Za-z_]\w*\s*,\s*\{')
+
+
+class VmProgram:
+    """Tabla de estados del intérprete guardada en columnas
+
+    lows[i] es el primer estado del bloque i, kinds[i] el código de su
+    transición y sus sucesores son targets[offsets[i]:offsets[i + 1]].
+    Un bloque de salida puede dejar en M un estado calculado con sus
+    registros (u = n; M = c and u; ...; M = M or v): esos estados van en
+    values[starts[i]:starts[i + 1]] y el bloque donde caen, en
+    constants. Si no se sabe qué deja (loose[i]), cualquier constante de
+    la función puede acabar en M: las de cada bloque van en
+    pool[pool_starts[i]:pool_starts[i + 1]]. entries es el pool de
+    estados iniciales de las fábricas.
+    """
+
+    def __init__(self, index: StateIndex, var: str, entries: List[float]):
+        self.lows = array('d', index.starts)
+        self.kinds = array('B', (_KIND_CODES[block.kind] for block in index.blocks))
+        self.offsets = array('I', [0])
+        self.targets = array('I')
+        self.starts = array('I', [0])
+        self.values = array('d')
+        self.constants = array('I')
+        self.loose = bytearray(len(index))
+        self.pool_starts = array('I', [0])
+        self.pool = array('d')
+        for i, block in enumerate(index.blocks):
+            self.targets.extend(block.targets)
+            self.offsets.append(len(self.targets))
+            if block.kind == EXIT:
+                states = _exit_states(block, var)
+                if states is None:
+                    self.loose[i] = 1
+                else:
+                    self.values.extend(sorted(states))
+            self.starts.append(len(self.values))
+            self.pool.extend(_block_constants(block))
+            self.pool_starts.append(len(self.pool))
+        self.constants.extend(self.lookup(value) for value in self.values)
+        self.entries = array('d', sorted(set(entries)))
+
+    def lookup(self, state: float) -> int:
+        return bisect.bisect_right(self.lows, state) - 1
+
+    def reachable(self, entry: float) -> Optional[Tuple[List[int], List[float]]]:
+        """Bloques alcanzables desde un estado inicial, en orden, y los estados que pueden entrar en M
+
+        None si algún bloque alcanzable calcula su sucesor de otra forma.
+        """
+        start = self.lookup(entry)
+        seen = bytearray(len(self.lows))
+        seen[start] = 1
+        found = [start]
+        states = [entry]
+        stack = [start]
+        loose = False
+        dynamic = _KIND_CODES[DYNAMIC]
+        while stack:
+            node = stack.pop()
+            if self.kinds[node] == dynamic:
+                return None
+            states.extend(self.values[self.starts[node]:self.starts[node + 1]])
+            successors = list(self.targets[self.offsets[node]:self.offsets[node + 1]])
+            successors.extend(self.constants[self.starts[node]:self.starts[node + 1]])
+            if self.loose[node] and not loose:
+                # Desde aquí cuentan las constantes de todos los bloques, ya vistos o no
+                loose = True
+                for seen_node in found:
+                    successors.extend(self.pool_constants(seen_node, states))
+            elif loose:
+                successors.extend(self.pool_constants(node, states))
+            for target in successors:
+                if not seen[target]:
+                    seen[target] = 1
+                    found.append(target)
+                    stack.append(target)
+        found.sort()
+        return found, states
+
+    def pool_constants(self, node: int, states: List[float]) -> List[int]:
+        values = self.pool[self.pool_starts[node]:self.pool_starts[node + 1]]
+        states.extend(values)
+        return [self.lookup(value) for value in values]
+
+
+def _block_constants(block: StateBlock) -> List[float]:
+    """Constantes numéricas del bloque salvo los estados de su transición"""
+    skip: Set[int] = set()
+    if block.kind in (GOTO, BRANCH):
+        skip = {id(node) for node in walk(block.block.body[block.split].values[0])}
+    values = []
+    for node in walk(block.block):
+        if isinstance(node, Number) and id(node) not in skip:
+            value = lua_number(node.text)
+            if value is not None:
+                values.append(value)
+    return values
+
+
+def _exit_states(block: StateBlock, var: str) -> Optional[Set[float]]:
+    """Números que puede dejar en M un bloque de salida; None si dependen de algo de fuera del bloque
+
+    Sigue las asignaciones simples del bloque. Como classify_block, da
+    por hecho que las llamadas y los índices (M = J["x"]) no devuelven
+    estados.
+    """
+    known: Dict[str, Optional[Set[float]]] = {}
+    for statement in block.block.body:
+        if isinstance(statement, Assign) and len(statement.targets) == 1 \
+                and isinstance(statement.targets[0], Name) and len(statement.values) == 1:
+            known[statement.targets[0].id] = _expression_states(statement.values[0], known)
+            continue
+        # Cualquier otra asignación deja sus nombres sin valor conocido
+        for node in walk(statement):
+            if isinstance(node, Assign):
+                names = [target.id for target in node.targets if isinstance(target, Name)]
+            elif isinstance(node, CompoundAssign):
+                names = [node.target.id] if isinstance(node.target, Name) else []
+            elif isinstance(node, Local):
+                names = node.names
+            else:
+                continue
+            for name in names:
+                known[name] = None
+    return known.get(var)
+
+
+def _expression_states(node: Node, known: Dict[str, Optional[Set[float]]]) -> Optional[Set[float]]:
+    """Números que puede valer una expresión (None si no se sabe)"""
+    value = _literal(node)
+    if value is not None:
+        return {value}
+    if isinstance(node, Name):
+        return known.get(node.id)
+    if isinstance(node, Paren):
+        return _expression_states(node.expr, known)
+    if isinstance(node, BinaryOp) and node.op == 'and':
+        # Si a es falso el resultado es nil o false: solo los números de b
+        return _expression_states(node.right, known)
+    if isinstance(node, BinaryOp) and node.op == 'or':
+        left = _expression_states(node.left, known)
+        right = _expression_states(node.right, known)
+        return None if left is None or right is None else left | right
+    if isinstance(node, BinaryOp) and node.op in _ARITHMETIC or isinstance(node, UnaryOp) and node.op == '-':
+        return None
+    return set()
+
+
+class _Interpreter:
+    """Un intérprete reconocido con todo lo necesario para separarlo"""
+
+    def __init__(self, func: Function, loop: While, index: StateIndex, calls: List[Call],
+                 entries: List[float], reached: List[Tuple[List[int], List[float]]]):
+        self.func = func
+        self.loop = loop
+        self.index = index
+        self.calls = calls
+        self.entries = entries
+        self.reached = reached
+
+
+class _VmResolver(CaptureResolver):
+    """Resolución de ámbitos que anota quién define, quién declara y quién llama a cada local"""
+
+    def __init__(self):
+        super().__init__()
+        self.references: Dict[int, Binding] = {}        # id(Name) -> declaración
+        self.owners: Dict[Binding, Function] = {}      # parámetro -> su función
+        self.definitions: Dict[Binding, List[Function]] = {}
+        self.defined: Dict[int, Binding] = {}           # id(Function) -> local a la que se asigna
+        self.calls: Dict[Binding, List[Call]] = {}
+        self.functions: List[Function] = []
+
+    def define(self, binding: Binding, value: Node) -> None:
+        if isinstance(value, Function):
+            self.definitions.setdefault(binding, []).append(value)
+            self.defined[id(value)] = binding
+
+    def declare(self, name, kind, site, value=None, position=0) -> Binding:
+        binding = super().declare(name, kind, site, value, position)
+        if kind == PARAM and self.functions:
+            self.owners[binding] = self.functions[-1]
+        self.define(binding, value)
+        return binding
+
+    def function(self, node: Function, implicit_self: bool = False) -> None:
+        self.functions.append(node)
+        super().function(node, implicit_self)
+        self.functions.pop()
+
+    def reference(self, name, site) -> Optional[Binding]:
+        binding = super().reference(name, site)
+        if binding is not None and site[1] == 'id':
+            self.references[id(site[0])] = binding
+        return binding
+
+    def statement(self, node: Node) -> None:
+        super().statement(node)
+        if isinstance(node, Assign):
+            for target, value in zip(node.targets, node.values):
+                binding = self.references.get(id(target)) if isinstance(target, Name) else None
+                if binding is not None:
+                    self.define(binding, value)
+
+    def expression(self, node: Node) -> None:
+        super().expression(node)
+        if isinstance(node, Call) and isinstance(node.func, Name):
+            binding = self.references.get(id(node.func))
+            if binding is not None:
+                self.calls.setdefault(binding, []).append(node)
+
+
+def _literal(node: Node) -> Optional[float]:
+    """Valor de un literal numérico (con signo menos opcional)"""
+    if isinstance(node, Number):
+        return lua_number(node.text)
+    if isinstance(node, UnaryOp) and node.op == '-' and isinstance(node.operand, Number):
+        value = lua_number(node.operand.text)
+        return None if value is None else -value
+    return None
+
+
+def may_have_interpreter(data: bytes) -> bool:
+    """Sin ninguna llamada return f(J, {...}) en el código no hay fábricas ni intérprete que separar"""
+    return _FACTORY_CALL.search(data) is not None
+
+
+def _has_factories(tokens: List[Token]) -> bool:
+    """¿Hay alguna llamada return f(J, {...})? Sin ellas no hace falta analizar el archivo"""
+    last = len(tokens) - 5
+    for i, token in enumerate(tokens):
+        if i < last and token.value == 'return' and token.kind == KEYWORD and tokens[i + 1].kind == NAME \
+                and tokens[i + 2].value == '(' and tokens[i + 3].kind == NAME \
+                and tokens[i + 4].value == ',' and tokens[i + 5].value == '{':
+            return True
+    return False
+
+
+class Devirtualizer:
+    """Separa cada intérprete de un flujo de tokens en las funciones que ejecuta"""
+
+    def __init__(self, tokens: List[Token]):
+        self.tokens = tokens
+        self.replacements: Dict[int, Tuple[int, List[Token]]] = {}
+        self.recovery = ControlFlowRecovery(tokens)
+        self.stats = {
+            'vm_interpreters': 0,
+            'vm_functions': 0,
+            'vm_states': 0,
+            'vm_unreachable': 0,
+            'vm_structured_blocks': 0,
+            'vm_dispatch_roots': 0,
+        }
+
+    def run(self) -> List[Token]:
+        if not _has_factories(self.tokens):
+            return self.tokens
+        chunk = parse(self.tokens)
+        resolver = _VmResolver()
+        resolver.resolve(chunk)
+
+        previous = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(previous, _RECURSION_LIMIT))
+        try:
+            for binding, functions in resolver.definitions.items():
+                interpreter = self.recognize(resolver, binding, functions)
+                if interpreter is not None:
+                    self.lift(interpreter)
+        finally:
+            sys.setrecursionlimit(previous)
+
+        self.stats['vm_structured_blocks'] = self.recovery.stats['structured_blocks']
+        self.stats['vm_dispatch_roots'] = self.recovery.stats['dispatch_roots']
+        if not self.replacements:
+            return self.tokens
+        return self.copy(0, len(self.tokens))
+
+    @staticmethod
+    def single_definition(binding: Binding, functions: List[Function]) -> bool:
+        """La local recibe una sola función y nada más"""
+        return len(functions) == 1 and binding.writes + (binding.value is not None) == 1
+
+    def entry_states(self, resolver: _VmResolver, param: Binding) -> Optional[List[float]]:
+        """Estados con que se llama a la fábrica que declara param (todos literales)"""
+        factory = resolver.owners.get(param)
+        binding = resolver.defined.get(id(factory)) if factory is not None else None
+        if binding is None or param.writes \
+                or not self.single_definition(binding, resolver.definitions.get(binding, [])):
+            return None
+        calls = resolver.calls.get(binding, [])
+        if not calls or len(calls) != binding.uses - binding.writes:
+            return None
+        states = []
+        for call in calls:
+            value = _literal(call.args[param.position]) if param.position < len(call.args) else None
+            if value is None:
+                return None
+            states.append(value)
+        return states
+
+    def recognize(self, resolver: _VmResolver, binding: Binding,
+                  functions: List[Function]) -> Optional[_Interpreter]:
+        """Comprueba la forma del intérprete y que solo lo llamen fábricas con estados literales"""
+        if not self.single_definition(binding, functions):
+            return None
+        func = functions[0]
+        body = func.body.body
+        if not func.params or func.span is None:
+            return None
+        var = func.params[0]
+        position = next((i for i, statement in enumerate(body) if isinstance(statement, While)), None)
+        if position is None:
+            return None
+        loop = body[position]
+        if not isinstance(loop.test, Name) or loop.test.id != var:
+            return None
+        if any(isinstance(node, Name) and node.id == var for statement in body[:position]
+               for node in walk(statement)):
+            return None
+        if resolver.captured(loop):
+            # Un cierre del intérprete que usa M vería estados que ya nadie asigna
+            return None
+
+        calls = resolver.calls.get(binding, [])
+        if not calls or len(calls) != binding.uses - binding.writes:
+            return None
+        entries: List[float] = []
+        seen: Set[Binding] = set()
+        for call in calls:
+            if not call.args or not isinstance(call.args[0], Name):
+                return None
+            start, end = call.args[0].span
+            if self.tokens[call.func.span[1]].value != '(' or self.tokens[end].value not in (',', ')') \
+                    or func.span[0] <= start < func.span[1]:
+                return None
+            param = resolver.references.get(id(call.args[0]))
+            if param is None or param.kind != PARAM:
+                return None
+            if param not in seen:
+                seen.add(param)
+                states = self.entry_states(resolver, param)
+                if states is None:
+                    return None
+                entries.extend(states)
+
+        index = build_state_index(loop)
+        if index is None:
+            return None
+        for block in index.blocks:
+            classify_block(block, var, index)
+        program = VmProgram(index, var, entries)
+        reached = []
+        for entry in program.entries:
+            found = program.reachable(entry)
+            if found is None:
+                return None
+            reached.append(found)
+        if sum(len(blocks) for blocks, _ in reached) > MAX_GROWTH * len(index):
+            return None
+        return _Interpreter(func, loop, index, calls, list(program.entries), reached)
+
+    def lift(self, interpreter: _Interpreter) -> None:
+        """vm(J, ...) -> vm[J](...) y el intérprete -> {[estado] = function ... end}"""
+        func = interpreter.func
+        position = self.tokens[func.span[0]].start
+
+        def tok(kind: str, value: str) -> Token:
+            return Token(kind, value, position, position)
+
+        for call in interpreter.calls:
+            start, end = call.args[0].span
+            tail = end + 1 if self.tokens[end].value == ',' else end
+            self.replacements[call.func.span[1]] = (
+                tail, [tok(OP, '[')] + self.tokens[start:end] + [tok(OP, ']'), tok(OP, '(')])
+
+        var = func.params[0]
+        body = func.body.body
+        split = body.index(interpreter.loop)
+        prelude, post = body[:split], body[split + 1:]
+        params: List[Token] = []
+        for name in func.params[1:]:
+            params.extend([tok(NAME, name), tok(OP, ',')])
+        if func.is_vararg:
+            params.append(tok(OP, '...'))
+        elif params:
+            params.pop()
+
+        out = [tok(OP, '{')]
+        reachable: Set[int] = set()
+        for entry, (blocks, states) in zip(interpreter.entries, interpreter.reached):
+            reachable.update(blocks)
+            sub = self.sub_index(interpreter.index, blocks)
+            used = {node.id for block in sub.blocks for node in walk(block.block) if isinstance(node, Name)}
+            used.update(node.id for statement in post for node in walk(statement) if isinstance(node, Name))
+            out.append(tok(OP, '['))
+            out.extend(_number_tokens(entry, position))
+            out.extend([tok(OP, ']'), tok(OP, '='), tok(KEYWORD, 'function'), tok(OP, '(')])
+            out.extend(params)
+            out.extend([tok(OP, ')'), tok(KEYWORD, 'local'), tok(NAME, var), tok(OP, '=')])
+            out.extend(_number_tokens(entry, position))
+            out.extend(self.prelude(prelude, used, tok))
+            out.extend(self.recovery.recover_dispatcher(interpreter.loop, sub, states))
+            for statement in post:
+                out.extend(self.tokens[statement.span[0]:statement.span[1]])
+            out.extend([tok(KEYWORD, 'end'), tok(OP, ',')])
+        out[-1] = tok(OP, '}')
+        self.replacements[func.span[0]] = (func.span[1], out)
+
+        self.stats['vm_interpreters'] += 1
+        self.stats['vm_functions'] += len(interpreter.entries)
+        self.stats['vm_states'] += len(interpreter.index)
+        self.stats['vm_unreachable'] += len(interpreter.index) - len(reachable)
+
+    @staticmethod
+    def sub_index(index: StateIndex, blocks: List[int]) -> StateIndex:
+        """Despachador con solo los bloques de una función: cada uno cubre hasta el siguiente"""
+        position = {original: k for k, original in enumerate(blocks)}
+        result: List[StateBlock] = []
+        for k, original in enumerate(blocks):
+            source = index.blocks[original]
+            low = source.low if k else -float('inf')
+            high = index.blocks[blocks[k + 1]].low if k + 1 < len(blocks) else float('inf')
+            block = StateBlock(low, high, source.block)
+            block.kind = source.kind
+            block.split = source.split
+            block.condition = source.condition
+            block.targets = [position[target] for target in source.targets]
+            block.target_literals = source.target_literals
+            result.append(block)
+        return StateIndex(result)
+
+    def prelude(self, statements: List[Node], used: Set[str], tok) -> List[Token]:
+        """Las sentencias previas al bucle, con solo los registros que la función usa"""
+        out: List[Token] = []
+        for statement in statements:
+            if not isinstance(statement, Local) or statement.values:
+                out.extend(self.tokens[statement.span[0]:statement.span[1]])
+                continue
+            names = [name for name in statement.names if name in used]
+            if names:
+                out.append(tok(KEYWORD, 'local'))
+                for name in names:
+                    out.extend([tok(NAME, name), tok(OP, ',')])
+                out.pop()
+        return out
+
+    def copy(self, start: int, end: int) -> List[Token]:
+        result: List[Token] = []
+        i = start
+        while i < end:
+            replacement = self.replacements.get(i)
+            if replacement is not None:
+                result.extend(replacement[1])
+                i = replacement[0]
+            else:
+                result.append(self.tokens[i])
+                i += 1
+        return result
+
+
+def devirtualize(tokens: List[Token]) -> Tuple[List[Token], Dict[str, int]]:
+    """Separa los intérpretes embebidos en las funciones que ejecutan"""
+    devirtualizer = Devirtualizer(tokens)
+    result = devirtualizer.run()
+    return result, devirtualizer.stats
@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+Motor único de desobfuscación
+Lee el archivo una vez y ejecuta una cadena declarada de pasadas
+(lua_passes) según un perfil (lua_presets). Varios perfiles sobre el
+mismo archivo comparten el análisis léxico y las pasadas comunes. Cada
+pasada se guarda en la caché bajo una clave encadenada con las
+anteriores, y la ejecución retoma desde la última pasada guardada que
+permita terminar la cadena. --passes permite quitar o elegir pasadas,
+p. ej. los comentarios o el reporte en lotes grandes. Antes de empezar,
+lua_fingerprint reconoce la familia del obfuscador con unas muestras del
+archivo y se omiten las pasadas que no tienen nada que hacer en él. Con
+--jobs, un archivo grande se reparte por unidades entre procesos (lua_units).
+Con --watch se queda vigilando el archivo y reprocesa solo lo editado
+(lua_watch).
+"""
+
+import argparse
+import os
+import sys
+import time
+from functools import partial
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from lua_lexer import TokenArray
+from lua_passes import PASSES, Pass, State, state_stats
+from lua_presets import PRESETS, Preset
+from lua_fingerprint import fingerprint, skippable
+from lua_batch import run_batch
+from lua_input import map_source
+from lua_profile import PassProfiler, token_bytes, profile_path, cprofile, add_profile_arguments
+from lua_cache import PassCache, source_key, pass_key, add_cache_arguments, cache_from_arguments
+from lua_records import records_path, index_records, add_records_arguments
+
+_MISSING = object()
+
+# Campos que el motor pone en el estado antes de la primera pasada
+INPUTS = frozenset({'source', 'input_file', 'output_file', 'report_file', 'preset', 'profiler', 'counters',
+                    'jobs', 'tree_units'})
+
+# Campos que nunca se guardan en la caché: datos de esta ejecución o demasiado grandes
+EPHEMERAL = frozenset({'source', 'input_file', 'output_file', 'report_file', 'preset', 'profiler',
+                       'jobs', 'tree_units', 'tokens', 'chunk', 'annotations', 'units'})
+
+# Campos que describen unos tokens concretos: dejan de valer cuando una pasada produce tokens nuevos
+DERIVED = ('chunk', 'annotations', 'units')
+
+
+class PipelineError(ValueError):
+    """Cadena de pasadas mal formada (pasada desconocida o sin sus entradas)"""
+
+
+class Target(NamedTuple):
+    """Un perfil con su cadena de pasadas y sus archivos de salida"""
+    preset: Preset
+    passes: List[Pass]
+    output_file: str
+    report_file: str
+    tailor: bool = True  # la cadena se ajusta a la familia detectada
+
+
+def consumed(passes: Iterable[Pass]) -> Set[str]:
+    """Campos que las pasadas leen sin producirlos ellas mismas"""
+    needed: Set[str] = set()
+    produced: Set[str] = set()
+    for step in passes:
+        needed |= step.requires - produced
+        produced |= step.produces
+        if 'tokens' in step.produces:
+            produced.difference_update(DERIVED)
+    return needed
+
+
+def validate(passes: List[Pass]) -> None:
+    """Comprueba que cada pasada tiene disponibles los campos que necesita"""
+    available = set(INPUTS)
+    seen: Set[str] = set()
+    for step in passes:
+        if step.name in seen:
+            raise PipelineError(f"La pasada '{step.name}' aparece dos veces")
+        seen.add(step.name)
+        missing = step.requires - available
+        if missing:
+            producers = [name for name, other in PASSES.items() if missing & other.produces]
+            raise PipelineError(f"La pasada '{step.name}' necesita {', '.join(sorted(missing))}: "
+                                f"añada antes {' o '.join(producers) or 'otra pasada'}")
+        if 'tokens' in step.produces:
+            available.difference_update(DERIVED)
+        available |= step.produces
+
+
+def prune(passes: List[Pass], skip: Iterable[str]) -> List[Pass]:
+    """Quita las pasadas indicadas y las que se quedan sin sus entradas"""
+    skip = set(skip)
+    available = set(INPUTS)
+    kept = []
+    for step in passes:
+        if step.name in skip or not step.requires <= available:
+            continue
+        kept.append(step)
+        if 'tokens' in step.produces:
+            available.difference_update(DERIVED)
+        available |= step.produces
+    return kept
+
+
+def splittable(passes: List[Pass]) -> bool:
+    """Indica si todas las pasadas que leen el árbol admiten que esté repartido en unidades"""
+    return all(step.units for step in passes if 'chunk' in step.requires)
+
+
+def resolve_passes(preset: Preset, spec: Optional[str] = None) -> List[Pass]:
+    """Cadena de pasadas de un perfil, modificada por --passes
+
+    spec es una lista separada por comas: con nombres sueltos sustituye la
+    cadena del perfil ('fold,strings,resolve,output'); con nombres precedidos
+    de '-' quita esas pasadas de la cadena del perfil ('-comments,-report').
+    """
+    names = list(preset.passes)
+    if spec:
+        entries = [entry.strip() for entry in spec.split(',') if entry.strip()]
+        removals = [entry for entry in entries if entry.startswith('-')]
+        if removals and len(removals) != len(entries):
+            raise PipelineError("--passes no puede mezclar pasadas a quitar (-nombre) con una lista de pasadas")
+        unknown = [entry.lstrip('-') for entry in entries if entry.lstrip('-') not in PASSES]
+        if unknown:
+            raise PipelineError(f"Pasadas desconocidas: {', '.join(unknown)} "
+                                f"(disponibles: {', '.join(PASSES)})")
+        if removals:
+            removed = {entry[1:] for entry in removals}
+            names = [name for name in names if name not in removed]
+        else:
+            names = entries
+    passes = [PASSES[name] for name in names]
+    validate(passes)
+    return passes
+
+
+def pipeline_keys(root: str, preset: Preset, passes: List[Pass]) -> List[str]:
+    """Claves de caché encadenadas: cada pasada depende de todas las anteriores"""
+    keys = []
+    parent = root
+    preset_module = sys.modules[preset.write_report.__module__]
+    for step in passes:
+        if step.per_preset:
+            parent = pass_key(parent, f"{step.name}@{preset.name}", step.version, *step.modules, preset_module)
+        else:
+            parent = pass_key(parent, step.name, step.version, *step.modules)
+        keys.append(parent)
+    return keys
+
+
+class Engine:
+    """Ejecuta las cadenas de pasadas de uno o varios perfiles sobre un archivo"""
+
+    def __init__(self, cache: Optional[PassCache] = None, trace_memory: bool = False,
+                 detect: bool = True, jobs: int = 1):
+        self.cache = cache or PassCache(enabled=False)
+        self.trace_memory = trace_memory
+        self.detect = detect
+        self.jobs = jobs
+
+    def run(self, input_file: str, targets: List[Target]) -> List[State]:
+        """Procesa el archivo con cada perfil y devuelve el estado final de cada uno"""
+        print(f"📁 Leyendo archivo: {input_file}")
+        states = []
+        # El archivo se mapea en memoria: el lexer lee sus bytes sin copiarlo a un str
+        with map_source(input_file) as data:
+            root = source_key(data)
+            # Con varios perfiles, las pasadas comunes se calculan una vez y se comparten en memoria
+            memo: Optional[Dict[str, Any]] = {} if len(targets) > 1 else None
+            for target in targets:
+                states.append(self.run_target(data, root, input_file, target, memo))
+        return states
+
+    def run_target(self, data, root: str, input_file: str, target: Target,
+                   memo: Optional[Dict[str, Any]] = None) -> State:
+        """Ejecuta la cadena de un perfil, retomándola desde la caché si se puede"""
+        passes = target.passes
+        profiler = PassProfiler(self.trace_memory)
+        state: State = {
+            'source': data, 'input_file': input_file, 'output_file': target.output_file,
+            'report_file': target.report_file, 'preset': target.preset, 'profiler': profiler,
+            'counters': {},
+        }
+        if self.detect and target.tailor:
+            passes = self.tailor(state, passes)
+        # El renombrado necesita el árbol entero: con él, solo el plegado se reparte entre procesos
+        state['jobs'] = self.jobs
+        state['tree_units'] = self.jobs > 1 and splittable(passes)
+        print(f"🔍 Perfil '{target.preset.name}': {' → '.join(step.name for step in passes)}")
+        keys = pipeline_keys(root, target.preset, passes)
+        start = self.restore(state, passes, keys, memo)
+
+        for index in range(start, len(passes)):
+            step = passes[index]
+            tokens = state.get('tokens') if 'tokens' in step.requires else None
+            bytes_in = len(data) if 'source' in step.requires else (token_bytes(tokens) if tokens else 0)
+            with profiler.measure(step.name, bytes_in, len(tokens) if tokens else 0) as record:
+                updates, counters = step.run(state)
+            if 'tokens' in updates:
+                for name in DERIVED:
+                    state.pop(name, None)
+                record.output(updates['tokens'])
+            state.update(updates)
+            state['counters'] = {**state['counters'], step.name: counters}
+            record.counters = counters
+            if step.writes:
+                record.output(size=os.path.getsize(state[step.writes]))
+            if step.cached:
+                self.save(state, step, keys[index], 'tokens' in updates, memo)
+
+        output_file = state['output_file']
+        profiler.write(profile_path(target.report_file), input_file=input_file, input_bytes=len(data),
+                       output_bytes=os.path.getsize(output_file) if os.path.exists(output_file) else 0,
+                       **state_stats(state))
+        print(f"⏱️ Perfil por pasada: {profile_path(target.report_file)}")
+        # El estado devuelto solo conserva los resultados, no los datos de trabajo
+        for name in ('source', 'tokens') + DERIVED:
+            state.pop(name, None)
+        return state
+
+    def tailor(self, state: State, passes: List[Pass]) -> List[Pass]:
+        """Reconoce la familia del obfuscador y quita las pasadas que no aplican"""
+        data = state['source']
+        with state['profiler'].measure('fingerprint') as record:
+            found = fingerprint(data)
+            kept = prune(passes, skippable([step.name for step in passes], found))
+        skipped = [step.name for step in passes if step not in kept]
+        record.bytes_in = found.sampled
+        record.counters = {'family': found.family, 'confidence': found.confidence, 'skipped': len(skipped)}
+        state['fingerprint'] = {'family': found.family, 'label': found.label, 'confidence': found.confidence,
+                                'recognized': found.recognized, 'skipped': skipped}
+        print(f"🧬 Familia: {found.label} (confianza {found.confidence:.0%})"
+              + (f"; se omiten: {', '.join(skipped)}" if skipped else ""))
+        return kept
+
+    # Caché
+
+    def _get(self, key: str, memo: Optional[Dict[str, Any]]) -> Any:
+        if memo is not None and key in memo:
+            return memo[key]
+        return self.cache.get(key, _MISSING)
+
+    def _put(self, key: str, value: Any, memo: Optional[Dict[str, Any]]) -> None:
+        if memo is not None:
+            memo[key] = value
+        self.cache.put(key, value)
+
+    def save(self, state: State, step: Pass, key: str, new_tokens: bool,
+             memo: Optional[Dict[str, Any]]) -> None:
+        """Guarda los resultados acumulados tras una pasada (y sus tokens, si son nuevos)"""
+        if not self.cache.enabled and memo is None:
+            return
+        if new_tokens:
+            state['tokens_key'] = pass_key(key, 'tokens')
+            if memo is not None:
+                memo[state['tokens_key']] = state['tokens']
+            # En disco van en columnas (TokenArray): el archivo ocupa un 40 % menos que la lista de Token
+            if self.cache.enabled:
+                self.cache.put(state['tokens_key'], TokenArray.from_tokens(state['tokens']))
+        self._put(key, {name: value for name, value in state.items() if name not in EPHEMERAL}, memo)
+        if step.writes:
+            self.cache.put_file(key, state[step.writes])
+
+    def restore(self, state: State, passes: List[Pass], keys: List[str],
+                memo: Optional[Dict[str, Any]]) -> int:
+        """Carga la última pasada guardada desde la que se puede terminar la cadena
+
+        Devuelve el índice de la primera pasada que queda por ejecutar. Solo
+        se leen los tokens si alguna pasada posterior los necesita, así que
+        un resultado completo en caché no carga ningún dato intermedio.
+        """
+        if not self.cache.enabled and memo is None:
+            return 0
+        started = time.perf_counter()
+        for index in reversed(range(len(passes))):
+            step = passes[index]
+            if not step.cached:
+                continue
+            needed = consumed(passes[index + 1:])
+            # El árbol no se guarda: si hace falta, hay que reconstruirlo desde antes
+            if needed.intersection(DERIVED):
+                continue
+            facts = self._get(keys[index], memo)
+            if facts is _MISSING:
+                continue
+            tokens = None
+            if 'tokens' in needed:
+                tokens = self._get(facts['tokens_key'], memo) if facts.get('tokens_key') else _MISSING
+                if tokens is _MISSING:
+                    continue
+            if step.writes and not self.cache.get_file(keys[index], state[step.writes]):
+                continue
+
+            state.update(facts)
+            if isinstance(tokens, TokenArray):
+                tokens = tokens.tokens()
+            if tokens is not None:
+                state['tokens'] = tokens
+            profiler = state['profiler']
+            for done in passes[:index + 1]:
+                with profiler.measure(done.name) as record:
+                    record.cached = True
+                record.counters = facts['counters'].get(done.name, {})
+                if done.writes and done is step:
+                    record.output(size=os.path.getsize(state[done.writes]))
+            record.seconds = time.perf_counter() - started
+            if step.writes:
+                print(f"⚡ Resultado recuperado de la caché: {state[step.writes]}")
+            else:
+                print(f"⚡ Pasadas hasta '{step.name}' recuperadas de la caché")
+            return index + 1
+        return 0
+
+
+def explicit_passes(spec: Optional[str]) -> bool:
+    """--passes da la cadena completa (no solo pasadas a quitar): no se ajusta a la familia"""
+    return bool(spec) and not spec.strip().startswith('-')
+
+
+def process_file(input_file: str, output_file: str, report_file: str, preset: str,
+                 passes: Optional[str] = None, cache: Optional[PassCache] = None,
+                 trace_memory: bool = False, detect: bool = True) -> Tuple[bool, Optional[str]]:
+    """Desobfusca un archivo con su propio reporte (usado por el modo por lotes)"""
+    chosen = PRESETS[preset]
+    target = Target(chosen, resolve_passes(chosen, passes), output_file, report_file,
+                    not explicit_passes(passes))
+    try:
+        Engine(cache, trace_memory, detect).run(input_file, [target])
+    except Exception as e:
+        return False, f"{type(e).__name__}: {e}"
+    return True, None
+
+
+def build_parser(description: str, choose_preset: bool = False) -> argparse.ArgumentParser:
+    """Opciones comunes a las herramientas de línea de comandos"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('input_file', nargs='?', help="archivo Lua a desobfuscar")
+    if choose_preset:
+        parser.add_argument('--preset', default='advanced',
+                            help=f"perfiles separados por comas ({', '.join(PRESETS)}); "
+                                 "varios perfiles comparten el análisis del archivo")
+    parser.add_argument('--passes', default=None,
+                        help="pasadas a ejecutar (fold,strings,...) o a quitar del perfil (-comments,-report); "
+                             f"disponibles: {', '.join(PASSES)}")
+    parser.add_argument('--no-fingerprint', action='store_true',
+                        help="no reconoce la familia del obfuscador: ejecuta todas las pasadas del perfil")
+    parser.add_argument('--list-passes', action='store_true', help="muestra las pasadas y los perfiles")
+    parser.add_argument('--batch', metavar='DIR', help="procesa todos los .lua de un directorio o patrón glob")
+    parser.add_argument('--output-dir', default='deobfuscated', help="directorio de salida del modo por lotes")
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="procesos en paralelo: archivos del lote con --batch, trabajos a la vez con --serve "
+                             "o unidades de un archivo grande (por defecto, uno por CPU en los dos primeros "
+                             "y uno solo con un archivo)")
+    parser.add_argument('--serve', action='store_true',
+                        help="servicio de larga duración: trabajos JSON por línea en la entrada estándar "
+                             "o en --socket (ver lua_server.py)")
+    parser.add_argument('--socket', metavar='RUTA', help="socket Unix en el que escucha --serve")
+    parser.add_argument('--watch', action='store_true',
+                        help="se queda vigilando el archivo y, con cada cambio, reprocesa solo las funciones "
+                             "editadas (ver lua_watch.py)")
+    add_cache_arguments(parser)
+    add_profile_arguments(parser)
+    add_records_arguments(parser)
+    return parser
+
+
+def list_passes() -> None:
+    print("Pasadas:")
+    for name, step in PASSES.items():
+        print(f"  {name:<9} {step.description}")
+    print("Perfiles:")
+    for name, preset in PRESETS.items():
+        print(f"  {name:<9} {','.join(preset.passes)}")
+
+
+def main(description: str = "Motor de desobfuscación de Lua", presets: Optional[List[str]] = None) -> None:
+    """Punto de entrada común: con presets fijos es una de las herramientas clásicas"""
+    parser = build_parser(description, choose_preset=presets is None)
+    args = parser.parse_args()
+    if args.list_passes:
+        list_passes()
+        return
+    names = presets or [name.strip() for name in args.preset.split(',') if name.strip()]
+    unknown = [name for name in names if name not in PRESETS]
+    if unknown or not names:
+        parser.error(f"perfil desconocido: {', '.join(unknown)} (disponibles: {', '.join(PRESETS)})")
+    try:
+        pipelines = {name: resolve_passes(PRESETS[name], args.passes) for name in names}
+    except PipelineError as e:
+        parser.error(str(e))
+    cache = cache_from_arguments(args)
+
+    with cprofile(args.profile):
+        run(args, names, pipelines, cache)
+
+
+def run(args, names: List[str], pipelines: Dict[str, List[Pass]], cache: PassCache) -> None:
+    """Ejecuta el modo elegido en la línea de comandos"""
+    script = os.path.basename(sys.argv[0])
+    if args.serve:
+        # Importado aquí: lua_server usa el motor de este módulo
+        from lua_server import serve
+        try:
+            serve(args.jobs or os.cpu_count() or 1, cache,
+                  {'preset': ','.join(names), 'passes': args.passes, 'fingerprint': not args.no_fingerprint},
+                  args.socket)
+        except OSError as e:
+            print(f"❌ Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        return
+
+    if args.batch:
+        if len(names) > 1:
+            print("❌ Error: El modo por lotes procesa un solo perfil cada vez")
+            sys.exit(2)
+        preset = PRESETS[names[0]]
+        results = run_batch(args.batch, args.output_dir,
+                            partial(process_file, preset=preset.name, passes=args.passes, cache=cache,
+                                    trace_memory=args.trace_memory, detect=not args.no_fingerprint),
+                            preset.suffix, args.jobs)
+        if args.strings_db:
+            # Los procesos del lote solo escriben sus registros: el índice lo escribe este proceso
+            index_records(args.strings_db, [records_path(result.report_file) for result in results if result.ok])
+        if not results or not all(result.ok for result in results):
+            sys.exit(1)
+        return
+
+    if not args.input_file:
+        print("❌ Error: Falta el archivo de entrada")
+        print(f"💡 Uso: python {script} <archivo.lua>")
+        print(f"💡 Ejemplo: python {script} inkgame.lua")
+        print(f"💡 Lotes: python {script} --batch scripts/ --output-dir salida/")
+        return
+
+    input_file = args.input_file
+    if not os.path.exists(input_file):
+        print(f"❌ Error: El archivo '{input_file}' no existe")
+        return
+
+    # Generar el nombre de los archivos de salida de cada perfil
+    base_name = os.path.splitext(input_file)[0]
+    targets = [Target(PRESETS[name], pipelines[name], f"{base_name}{PRESETS[name].suffix}.lua",
+                      PRESETS[name].report_file, not explicit_passes(args.passes)) for name in names]
+
+    # Un solo archivo va en serie salvo con --jobs: abrir procesos solo compensa
+    # con archivos grandes y no en todos los equipos
+    jobs = args.jobs or 1
+    if args.watch:
+        # Importado aquí: lua_watch usa el motor de este módulo
+        from lua_watch import watch
+        watch(input_file, targets, Engine(cache, args.trace_memory, not args.no_fingerprint, jobs))
+        return
+
+    try:
+        Engine(cache, args.trace_memory, not args.no_fingerprint, jobs).run(input_file, targets)
+    except Exception as e:
+        print(f"❌ Error durante la desobfuscación: {type(e).__name__}: {e}")
+        print("❌ La desobfuscación falló")
+        sys.exit(1)
+    if args.strings_db:
+        index_records(args.strings_db, [records_path(target.report_file) for target in targets
+                                        if any(step.writes == 'report_file' for step in target.passes)])
+
+    print("✅ Desobfuscación completada exitosamente!")
+    print(f"\n🎉 ¡Proceso completado!")
+    for target in targets:
+        if any(step.writes == 'output_file' for step in target.passes):
+            print(f"📂 Archivo desobfuscado ({target.preset.name}): {target.output_file}")
+        if any(step.writes == 'report_file' for step in target.passes):
+            print(f"📊 Reporte ({target.preset.name}): {target.report_file}")
+            print(f"🧾 Registros NDJSON ({target.preset.name}): {records_path(target.report_file)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Reconocimiento de la familia del obfuscador
+Lee solo unas muestras del archivo (el principio, el final y la ventana
+que sigue a la tabla de strings) y busca las marcas de cada familia
+conocida: el prólogo return(function(...)local J={, el bucle de
+rotación, la función de acceso, la tabla del alfabeto, el despachador
+de estados, la entrada return(X(n, {}))(...) de un intérprete embebido
+y el epílogo getfenv and getfenv()or _ENV. Con ellas se estima la
+familia y su confianza. Que una marca falte en las muestras no prueba
+que falte en el archivo: antes de omitir una pasada se comprueba en el
+archivo entero, con una expresión regular sobre sus bytes, que no está
+lo mínimo que necesita para hacer algo.
+"""
+
+import os
+import re
+import sys
+import time
+from typing import Dict, FrozenSet, List, NamedTuple, Tuple
+
+# Bytes que se leen del principio y del final del archivo, y tras la tabla de strings
+SAMPLE_BYTES = 8 * 1024
+
+# Por debajo de esta confianza no se reconoce la familia y se ejecutan todas las pasadas
+MIN_CONFIDENCE = 0.6
+
+_PROLOGUE = re.compile(rb'\A\s*return\s*\(\s*function\s*\(\s*\.\.\.\s*\)\s*local\s+[A-Za-z_]\w*\s*=\s*\{')
+_STRING_TABLE = re.compile(rb'local\s+[A-Za-z_]\w*\s*=\s*\{\s*["\']')
+_ESCAPE = re.compile(rb'\\(?:[0-9]{1,3}|x[0-9a-fA-F]{2})')
+_ROTATION = re.compile(rb'for\s+\w+\s*,\s*\w+\s+in\s+ipairs\s*\(\s*\{\s*\{')
+_ACCESSOR = re.compile(rb'local\s+function\s+\w+\s*\(\s*(\w+)\s*\)\s*return\s+\w+\s*\[\s*\1\s*[-+]')
+_ALPHABET_ENTRY = re.compile(rb'[{,;]\s*(?:[A-Za-z]|\[\s*"(?:\\\d{1,3}|.)"\s*\])\s*=\s*-?\(?\d')
+_DISPATCH_TEST = re.compile(rb'\bif\s*[A-Za-z_]\w*\s*<\s*-?\(?\d')
+_EPILOGUE = re.compile(rb'getfenv\s+and\s+getfenv\s*\(\s*\)\s*or\s+_ENV')
+_ARITHMETIC = re.compile(rb'\d\s*[-+]\s*\(?-?\d')
+_VM_ENTRY = re.compile(rb'return\s*\(\s*[A-Za-z_]\w*\s*\(\s*[-+()\d\s]+,\s*\{\s*\}\s*\)\s*\)\s*\(')
+
+# Lo mínimo que tiene que haber en el archivo para que una pasada haga algo:
+# (forma exacta, ancla). La forma exacta solo admite espacios entre los
+# tokens; si el archivo tiene comentarios, que pueden separarlos, hace
+# falta que no aparezca ni el ancla. Empiezan por un literal, sin \b
+# delante, para que la búsqueda salte por el archivo sin probar cada byte
+_REQUIRED = {
+    # find_string_table: el primer local VAR = {
+    'string_table': (re.compile(rb'local\s+[A-Za-z_]\w*\s*=\s*\{'), b'local'),
+    # decode: strings con alguna barra invertida
+    'escapes': (re.compile(rb'\\'), b'\\'),
+    # devirt: alguna fábrica return f(J, {...})
+    'vm': (re.compile(rb'return\s*[A-Za-z_]\w*\s*\(\s*[A-Za-z_]\w*\s*,\s*\{'), b'return'),
+    # flow: while M do if M < K
+    'dispatcher': (re.compile(rb'while\s+[A-Za-z_]\w*\s+do[\s;]+if\s+[A-Za-z_]\w*\s*<'), b'while'),
+}
+
+
+class Family(NamedTuple):
+    """Familia conocida: marca -> (valor esperado, peso)"""
+    label: str
+    signals: Dict[str, Tuple[bool, int]]
+
+
+FAMILIES: Dict[str, Family] = {
+    'constant_array': Family("tabla de constantes rotada en base64 y flujo aplanado (estilo Prometheus)", {
+        'prologue': (True, 3), 'string_table': (True, 2), 'rotation': (True, 2), 'accessor': (True, 2),
+        'alphabet': (True, 2), 'epilogue': (True, 2), 'dispatcher': (True, 1), 'arithmetic': (True, 1),
+    }),
+    'escaped_table': Family("tabla de strings con secuencias de escape", {
+        'string_table': (True, 2), 'escapes': (True, 2), 'rotation': (False, 1), 'accessor': (False, 1),
+        'alphabet': (False, 1), 'dispatcher': (False, 1),
+    }),
+    'plain': Family("código Lua sin obfuscar", {
+        'prologue': (False, 1), 'string_table': (False, 2), 'escapes': (False, 1), 'rotation': (False, 1),
+        'alphabet': (False, 1), 'dispatcher': (False, 2), 'arithmetic': (False, 1),
+    }),
+}
+
+# Pasadas que no tienen nada que hacer si falta alguna de estas marcas. Las
+# demás (prune, comments...) se aplican a cualquier código y nunca se omiten
+PASS_SIGNALS: Dict[str, Tuple[str, ...]] = {
+    'strings': ('string_table',),
+    'resolve': ('string_table',),
+    'decode': ('escapes',),
+    'devirt': ('vm',),
+    'flow': ('dispatcher',),
+}
+
+
+class Fingerprint(NamedTuple):
+    family: str
+    confidence: float
+    signals: Dict[str, bool]
+    sampled: int
+    absent: FrozenSet[str] = frozenset()  # marcas que faltan en el archivo entero
+
+    @property
+    def recognized(self) -> bool:
+        return self.confidence >= MIN_CONFIDENCE
+
+    @property
+    def label(self) -> str:
+        return FAMILIES[self.family].label if self.recognized else "desconocida"
+
+
+def samples(data, size: int = SAMPLE_BYTES) -> Tuple[bytes, bytes, bytes]:
+    """(principio, ventana tras la tabla de strings, final) del archivo"""
+    head = data[:size]
+    tail = data[max(len(data) - size, 0):]
+    window = b''
+    found = _STRING_TABLE.search(head)
+    if found:
+        # Las strings de estas tablas van escapadas: la primera '}' cierra la tabla
+        close = data.find(b'}', found.end())
+        if close >= 0:
+            window = data[close:close + size]
+    return head, window, tail
+
+
+def detect_signals(data, size: int = SAMPLE_BYTES) -> Tuple[Dict[str, bool], int]:
+    """Marcas presentes en las muestras y cantidad de bytes leídos"""
+    head, window, tail = samples(data, size)
+    body = window + b'\n' + tail
+    every = head + b'\n' + body
+    signals = {
+        'prologue': bool(_PROLOGUE.search(head)),
+        'string_table': bool(_STRING_TABLE.search(head)),
+        'escapes': len(_ESCAPE.findall(every)) >= 4,
+        'rotation': bool(_ROTATION.search(window)),
+        'accessor': bool(_ACCESSOR.search(window)),
+        'alphabet': len(_ALPHABET_ENTRY.findall(window)) >= 32,
+        'dispatcher': len(_DISPATCH_TEST.findall(body)) >= 3,
+        'epilogue': bool(_EPILOGUE.search(tail)),
+        'arithmetic': len(_ARITHMETIC.findall(every)) >= 16,
+        'vm': bool(_VM_ENTRY.search(tail)),
+    }
+    return signals, len(head) + len(window) + len(tail)
+
+
+def confidence(family: Family, signals: Dict[str, bool]) -> float:
+    """Fracción ponderada de las marcas de la familia que coinciden con lo esperado"""
+    total = sum(weight for _, weight in family.signals.values())
+    agree = sum(weight for name, (expected, weight) in family.signals.items() if signals[name] == expected)
+    return agree / total if total else 0.0
+
+
+def absent_signals(data, signals: Dict[str, bool]) -> FrozenSet[str]:
+    """Marcas que faltan en las muestras y tampoco están en el resto del archivo"""
+    commented = data.find(b'--') >= 0
+    absent = set()
+    for signal, (exact, anchor) in _REQUIRED.items():
+        if signals[signal] or exact.search(data):
+            continue
+        if commented and data.find(anchor) >= 0:
+            continue
+        absent.add(signal)
+    return frozenset(absent)
+
+
+def fingerprint(data, size: int = SAMPLE_BYTES) -> Fingerprint:
+    """Familia más probable del archivo según sus muestras"""
+    signals, sampled = detect_signals(data, size)
+    scores = {name: confidence(family, signals) for name, family in FAMILIES.items()}
+    best = max(scores, key=scores.get)
+    found = Fingerprint(best, round(scores[best], 3), signals, sampled)
+    # Sin familia no se omite nada: no hace falta recorrer el archivo
+    return found._replace(absent=absent_signals(data, signals)) if found.recognized else found
+
+
+def skippable(names: List[str], found: Fingerprint) -> List[str]:
+    """Pasadas de la lista sin nada que hacer en el archivo (ninguna si la familia es desconocida)"""
+    if not found.recognized:
+        return []
+    return [name for name in names
+            if any(signal in found.absent for signal in PASS_SIGNALS.get(name, ()))]
+
+
+def main():
+    """Muestra la familia, la confianza y las marcas de uno o varios archivos"""
+    if len(sys.argv) < 2:
+        print("💡 Uso: python lua_fingerprint.py <archivo.lua> [...]")
+        return
+    for path in sys.argv[1:]:
+        if not os.path.exists(path):
+            print(f"❌ Error: Archivo '{path}' no encontrado")
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        start = time.perf_counter()
+        found = fingerprint(data)
+        elapsed = time.perf_counter() - start
+        marks = ', '.join(name for name, present in found.signals.items() if present) or 'ninguna'
+        print(f"🧬 {path}: {found.label} [{found.family}] con confianza {found.confidence:.0%} "
+              f"({found.sampled / 1024:.0f} KB leídos en {elapsed * 1000:.1f} ms)")
+        print(f"   Marcas: {marks}")
+        skipped = skippable(list(PASS_SIGNALS), found)
+        print(f"   Pasadas omitibles: {', '.join(skipped) or 'ninguna'}")
+
+
+if __name__ == "__main__":
+    main()
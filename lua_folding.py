@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Plegado de constantes sobre el flujo de tokens
+Colapsa expresiones aritméticas constantes como -757900+757901 en un
+único literal, en una pasada lineal y con la semántica numérica de
+Lua 5.1/Luau (todos los números son dobles IEEE-754)
+"""
+
+import math
+from typing import List, Optional, Tuple
+
+from lua_lexer import Token, NAME, NUMBER, STRING, OP, KEYWORD
+
+# Precedencias de Lua, de menor a mayor
+_BINARY_PRECEDENCE = {
+    'or': 1, 'and': 2,
+    '<': 3, '>': 3, '<=': 3, '>=': 3, '~=': 3, '==': 3,
+    '|': 4, '~': 5, '&': 6, '<<': 7, '>>': 7,
+    '..': 8,
+    '+': 9, '-': 9,
+    '*': 10, '/': 10, '//': 10, '%': 10,
+    '^': 12,
+}
+_UNARY_PRECEDENCE = 11
+_ATOM_PRECEDENCE = 100
+_RIGHT_ASSOCIATIVE = frozenset({'^', '..'})
+
+# Operadores que el plegador sabe evaluar
+_ARITHMETIC = frozenset({'+', '-', '*', '/', '//', '%', '^'})
+_RUN_VALUES = _ARITHMETIC | {'(', ')'}
+
+_OPERAND_VALUES = frozenset({')', ']', '}', '...', 'true', 'false', 'nil'})
+
+# Sustitución de tokens[inicio:fin] por los tokens del literal
+Fold = Tuple[int, int, List[Token]]
+
+
+def lua_number(text: str) -> Optional[float]:
+    """Convierte un literal numérico de Lua/Luau a su valor doble"""
+    text = text.replace('_', '')
+    try:
+        lowered = text.lower()
+        if lowered.startswith('0x'):
+            if '.' in lowered or 'p' in lowered:
+                return float.fromhex(text)
+            return float(int(text, 16))
+        if lowered.startswith('0b'):
+            return float(int(text[2:], 2))
+        return float(text)
+    except (ValueError, OverflowError):
+        return None
+
+
+def format_number(value: float) -> str:
+    """Escribe un doble como literal Lua que se relee con el mismo valor
+
+    inf y nan no tienen literal (repr daría el nombre de una global):
+    lanza ValueError, y quien pliega tiene que dejar la expresión.
+    """
+    if not math.isfinite(value):
+        raise ValueError(f"{value!r} no tiene literal en Lua")
+    if value.is_integer() and abs(value) < 2.0 ** 63:
+        if value == 0 and math.copysign(1.0, value) < 0:
+            return '-0'
+        return str(int(value))
+    return repr(value)
+
+
+def _is_operand(token: Optional[Token]) -> bool:
+    """Indica si el token termina un operando (tras él, - es binario y ( es llamada)"""
+    if token is None:
+        return False
+    if token.kind in (NAME, NUMBER, STRING):
+        return True
+    return token.value in _OPERAND_VALUES
+
+
+def _apply(op: str, left: float, right: float) -> Optional[float]:
+    """Aplica un operador aritmético con la semántica de dobles de Lua"""
+    try:
+        if op == '+':
+            result = left + right
+        elif op == '-':
+            result = left - right
+        elif op == '*':
+            result = left * right
+        elif op == '/':
+            if right == 0:
+                return None
+            result = left / right
+        elif op == '//':
+            if right == 0:
+                return None
+            result = float(math.floor(left / right))
+        elif op == '%':
+            if right == 0:
+                return None
+            # a % b == a - floor(a/b)*b, igual que el módulo de Python
+            result = math.fmod(left, right)
+            if result != 0 and (result < 0) != (right < 0):
+                result += right
+        else:
+            result = math.pow(left, right)
+    except (OverflowError, ValueError, ZeroDivisionError):
+        return None
+    if math.isinf(result) or math.isnan(result):
+        return None
+    return result
+
+
+class _Parser:
+    """Analizador por precedencias limitado a un tramo de tokens constantes"""
+
+    def __init__(self, tokens: List[Token], end: int):
+        self.tokens = tokens
+        self.end = end
+
+    def expression(self, pos: int, min_precedence: int = 0) -> Optional[Tuple[float, int, int]]:
+        """Devuelve (valor, precedencia del operador raíz, posición final) o None"""
+        left = self.unary(pos)
+        if left is None:
+            return None
+        value, precedence, pos = left
+        tokens = self.tokens
+        while pos < self.end:
+            op = tokens[pos].value
+            if tokens[pos].kind != OP or op not in _ARITHMETIC:
+                break
+            op_precedence = _BINARY_PRECEDENCE[op]
+            if op_precedence < min_precedence:
+                break
+            next_min = op_precedence if op in _RIGHT_ASSOCIATIVE else op_precedence + 1
+            right = self.expression(pos + 1, next_min)
+            if right is None:
+                # El operando derecho no es constante: la expresión acaba antes
+                break
+            result = _apply(op, value, right[0])
+            if result is None:
+                break
+            value, precedence, pos = result, op_precedence, right[2]
+        return value, precedence, pos
+
+    def unary(self, pos: int) -> Optional[Tuple[float, int, int]]:
+        if pos >= self.end:
+            return None
+        token = self.tokens[pos]
+        if token.kind == OP and token.value == '-':
+            operand = self.expression(pos + 1, _UNARY_PRECEDENCE)
+            # -1e309 es -inf, que no tiene literal: como en _apply, no se pliega
+            if operand is None or not math.isfinite(operand[0]):
+                return None
+            return -operand[0], min(operand[1], _UNARY_PRECEDENCE), operand[2]
+        if token.kind == OP and token.value == '(':
+            inner = self.expression(pos + 1)
+            if inner is None or inner[2] >= self.end or self.tokens[inner[2]].value != ')':
+                return None
+            return inner[0], _ATOM_PRECEDENCE, inner[2] + 1
+        if token.kind == NUMBER:
+            value = lua_number(token.value)
+            if value is None:
+                return None
+            return value, _ATOM_PRECEDENCE, pos + 1
+        return None
+
+
+def _run_end(tokens: List[Token], start: int) -> int:
+    """Fin del tramo máximo de números, operadores aritméticos y paréntesis"""
+    depth = 0
+    i = start
+    count = len(tokens)
+    while i < count:
+        token = tokens[i]
+        if token.kind == NUMBER:
+            pass
+        elif token.kind == OP and token.value in _RUN_VALUES:
+            if token.value == '(':
+                depth += 1
+            elif token.value == ')':
+                if depth == 0:
+                    break
+                depth -= 1
+        else:
+            break
+        i += 1
+    return i
+
+
+def _left_precedence(tokens: List[Token], index: int) -> int:
+    """Precedencia con la que el token anterior a index reclama al operando que sigue"""
+    if index == 0:
+        return 0
+    prev = tokens[index - 1]
+    if prev.kind not in (OP, KEYWORD):
+        return 0
+    if prev.value in ('not', '#', '~'):
+        # ~ puede ser unario (5.3); se asume el caso más restrictivo
+        return _UNARY_PRECEDENCE
+    if prev.value == '-' and not _is_operand(tokens[index - 2] if index > 1 else None):
+        return _UNARY_PRECEDENCE
+    return _BINARY_PRECEDENCE.get(prev.value, 0)
+
+
+def _fits(precedence: int, left: int, following: Optional[Token]) -> bool:
+    """Comprueba que un operando con esa precedencia se agrupa igual en su contexto"""
+    if left == _BINARY_PRECEDENCE['^']:
+        # El exponente admite una expresión unaria: 2^-3
+        if precedence < _UNARY_PRECEDENCE:
+            return False
+    elif precedence <= left:
+        return False
+
+    if following is not None and following.kind in (OP, KEYWORD) and following.value in _BINARY_PRECEDENCE:
+        right = _BINARY_PRECEDENCE[following.value]
+        if precedence < right:
+            return False
+        if precedence == right and following.value in _RIGHT_ASSOCIATIVE:
+            return False
+    return True
+
+
+def _literal_tokens(value: float, start: int, end: int) -> List[Token]:
+    """Tokens del literal que sustituye a la expresión plegada"""
+    text = format_number(value)
+    if text.startswith('-'):
+        return [Token(OP, '-', start, start), Token(NUMBER, text[1:], start, end)]
+    return [Token(NUMBER, text, start, end)]
+
+
+def evaluate(tokens: List[Token], start: int, end: int) -> Optional[float]:
+    """Evalúa tokens[start:end] si forman, completos, una expresión constante"""
+    result = _Parser(tokens, end).expression(start)
+    if result is None or result[2] != end:
+        return None
+    return result[0]
+
+
+def fold_range(tokens: List[Token], start: int = 0, end: Optional[int] = None) -> Tuple[List[Fold], int, int]:
+    """Expresiones constantes de tokens[start:end] que se pueden plegar
+
+    Devuelve (sustituciones, expresiones plegadas, bytes eliminados). Cada
+    tramo constante se analiza una sola vez y solo se sustituye si su
+    agrupación no cambia con los operadores vecinos: en x*2+3 no se
+    pliega 2+3. Los vecinos se leen de la lista completa, así que dos
+    tramos separados por un nombre, una palabra clave o una string se
+    pueden plegar por separado (lua_units) con el mismo resultado.
+    """
+    folds: List[Fold] = []
+    folded = 0
+    removed = 0
+    count = len(tokens)
+    end = count if end is None else end
+    i = start
+
+    while i < end:
+        token = tokens[i]
+        prev = tokens[i - 1] if i > 0 else None
+        starts_run = (token.kind == NUMBER
+                      or (token.kind == OP and token.value in ('-', '(') and not _is_operand(prev)))
+        if not starts_run:
+            i += 1
+            continue
+
+        run_end = _run_end(tokens, i)
+        parsed = _Parser(tokens, run_end).expression(i)
+        if parsed is None or parsed[2] - i < 2:
+            i += 1
+            continue
+
+        value, precedence, stop = parsed
+        if not math.isfinite(value):
+            # (1e309): el valor no tiene literal con que escribirlo
+            i += 1
+            continue
+        left = _left_precedence(tokens, i)
+        following = tokens[stop] if stop < count else None
+        if not _fits(precedence, left, following):
+            i += 1
+            continue
+
+        literal = _literal_tokens(value, token.start, tokens[stop - 1].end)
+        literal_precedence = _UNARY_PRECEDENCE if len(literal) == 2 else _ATOM_PRECEDENCE
+        if not _fits(literal_precedence, left, following):
+            literal = [Token(OP, '(', token.start, token.start)] + literal + \
+                      [Token(OP, ')', tokens[stop - 1].end, tokens[stop - 1].end)]
+
+        if [t.value for t in literal] != [t.value for t in tokens[i:stop]]:
+            folds.append((i, stop, literal))
+            folded += 1
+            removed += (sum(len(t.value) for t in tokens[i:stop])
+                        - sum(len(t.value) for t in literal))
+        i = stop
+
+    return folds, folded, removed
+
+
+def apply_folds(tokens: List[Token], folds: List[Fold]) -> List[Token]:
+    """Tokens con cada tramo (inicio, fin) sustituido por su literal, en orden"""
+    result: List[Token] = []
+    position = 0
+    for start, stop, literal in folds:
+        result.extend(tokens[position:start])
+        result.extend(literal)
+        position = stop
+    result.extend(tokens[position:])
+    return result
+
+
+def fold_constants(tokens: List[Token]) -> Tuple[List[Token], int, int]:
+    """Pliega todas las expresiones constantes en una pasada
+
+    Devuelve (tokens nuevos, expresiones plegadas, bytes eliminados).
+    """
+    folds, folded, removed = fold_range(tokens)
+    return apply_folds(tokens, folds), folded, removed
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Entrada de archivos mapeados en memoria
+El archivo se mapea con mmap y el lexer trabaja directamente sobre sus
+bytes, sin cargar una copia str del código completo. La salida la
+escribe el impresor de forma incremental, así que la memoria máxima
+depende sobre todo de los tokens y del árbol, no de copias del texto.
+
+Ejecutado como script mide la memoria máxima (RSS) de cada herramienta
+sobre un archivo y la expresa como múltiplo del tamaño de la entrada.
+"""
+
+import mmap
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from lua_lexer import Token, tokenize_buffer
+
+# Memoria máxima documentada de cada herramienta sobre la base del
+# intérprete, como múltiplo del tamaño de la entrada (tests/test_memory.py)
+PEAK_RSS_RATIO = 120
+
+
+@contextmanager
+def map_source(path: str) -> Iterator[bytes]:
+    """Mapea el archivo en memoria de solo lectura (bytes vacíos si está vacío)"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap no admite archivos vacíos
+            yield b''
+            return
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield buffer
+        finally:
+            buffer.close()
+
+
+def tokenize_file(path: str, keep_comments: bool = False) -> List[Token]:
+    """Tokens de un archivo leídos a través de mmap"""
+    with map_source(path) as buffer:
+        return tokenize_buffer(buffer, keep_comments)
+
+
+def _peak_rss_of(command: List[str], cwd: Optional[str] = None) -> Optional[int]:
+    """Ejecuta un proceso y devuelve su RSS máximo en bytes (solo Unix)"""
+    if not hasattr(os, 'wait4'):
+        return None
+    process = subprocess.Popen(command, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss está en KB en Linux/Android y en bytes en macOS
+    return usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+
+
+def measure_peak_memory(input_file: str) -> Dict[str, Optional[int]]:
+    """RSS máximo de cada herramienta y de un intérprete vacío que las importa"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    results: Dict[str, Optional[int]] = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        results['baseline'] = _peak_rss_of([
+            sys.executable, '-c',
+            f"import sys; sys.path.insert(0, {here!r}); import deobfuscator, advanced_deobfuscator"])
+        # Cada herramienta procesa una copia dentro de un directorio temporal,
+        # donde también deja su salida y su reporte
+        copy = os.path.join(workdir, os.path.basename(input_file))
+        shutil.copyfile(input_file, copy)
+        for name, script in (('basic', 'deobfuscator.py'), ('advanced', 'advanced_deobfuscator.py')):
+            results[name] = _peak_rss_of([
+                sys.executable, os.path.join(here, script), '--no-cache', copy], cwd=workdir)
+    return results
+
+
+def main():
+    """Mide la memoria máxima de ambas herramientas sobre un archivo"""
+    if len(sys.argv) < 2:
+        print("💡 Uso: python lua_input.py <archivo.lua>")
+        return
+    input_file = sys.argv[1]
+    if not os.path.exists(input_file):
+        print(f"❌ Error: Archivo '{input_file}' no encontrado")
+        return
+
+    size = os.path.getsize(input_file)
+    results = measure_peak_memory(input_file)
+    baseline = results['baseline']
+    if baseline is None:
+        print("❌ La medición de memoria requiere un sistema Unix")
+        return
+
+    print(f"📏 Entrada: {size / 1024:.1f} KB")
+    print(f"🐍 Intérprete con las herramientas importadas: {baseline / 1e6:.1f} MB")
+    for name in ('basic', 'advanced'):
+        peak = results[name]
+        extra = max(peak - baseline, 0)
+        print(f"📈 {name}: {peak / 1e6:.1f} MB de pico, "
+              f"{extra / 1e6:.1f} MB sobre la base = {extra / size:.1f} × la entrada")
+        if extra > PEAK_RSS_RATIO * size:
+            print(f"⚠️ {name} supera el límite documentado de {PEAK_RSS_RATIO} × la entrada")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,546 @@
+#!/usr/bin/env python3
+"""
+Analizador léxico de Lua 5.1/Luau
+Recorre el código fuente una sola vez y produce el flujo de tokens
+que comparten todas las pasadas del desobfuscador
+"""
+
+import re
+import sys
+import os
+import time
+import tracemalloc
+from array import array
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+# Tipos de token
+NAME = 'name'
+KEYWORD = 'keyword'
+NUMBER = 'number'
+STRING = 'string'
+OP = 'op'
+COMMENT = 'comment'
+
+LUA_KEYWORDS = frozenset({
+    'and', 'break', 'do', 'else', 'elseif', 'end', 'false', 'for',
+    'function', 'if', 'in', 'local', 'nil', 'not', 'or', 'repeat',
+    'return', 'then', 'true', 'until', 'while'
+})
+
+
+class Token(NamedTuple):
+    kind: str
+    value: str
+    start: int
+    end: int
+
+
+class LuaLexError(ValueError):
+    """Error léxico con la posición donde se produjo"""
+
+    def __init__(self, message: str, position: int):
+        super().__init__(f"{message} (posición {position})")
+        self.position = position
+
+
+# Una sola expresión con alternativas nombradas, ordenadas por frecuencia.
+# Las cadenas y comentarios largos se cierran con una referencia al nivel
+_TOKEN_PATTERN = r'''
+    (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<comment>--(?:\[(?P<clevel>=*)\[[\s\S]*?\](?P=clevel)\]|(?!\[=*\[)[^\n]*))
+  | (?P<op>
+        \.\.\.|\.\.=|//=|\.\.|==|~=|<=|>=|//|::|<<|>>|->
+      | [-+*/%^]=
+      | [+*/%^\#&~|<>=(){}\];:,?]
+      | -(?!-)
+      | \.(?![0-9])
+      | \[(?!=*\[)
+    )
+  | (?P<number>
+        0[xX][0-9a-fA-F_]*(?:\.[0-9a-fA-F_]*)?(?:[pP][+-]?[0-9]+)?
+      | 0[bB][01_]+
+      | (?:[0-9][0-9_]*(?:\.[0-9_]*)?|\.[0-9][0-9_]*)(?:[eE][+-]?[0-9]+)?
+    )
+  | (?P<string>
+        "[^"\\\n]*(?:\\(?:z\s*|\r\n?|\n\r?|[\s\S])[^"\\\n]*)*"
+      | '[^'\\\n]*(?:\\(?:z\s*|\r\n?|\n\r?|[\s\S])[^'\\\n]*)*'
+      | \[(?P<level>=*)\[[\s\S]*?\](?P=level)\]
+    )
+  | (?P<error>--\[=*\[|\S)
+'''
+_TOKEN_RE = re.compile(_TOKEN_PATTERN, re.VERBOSE)
+# La misma expresión sobre bytes: permite analizar un mmap sin decodificar el archivo entero
+_TOKEN_RE_BYTES = re.compile(_TOKEN_PATTERN.encode('ascii'), re.VERBOSE)
+
+_ERRORS = {
+    '"': "Cadena sin cerrar",
+    "'": "Cadena sin cerrar",
+    '[': "Cadena larga sin cerrar",
+    '-': "Comentario largo sin cerrar",
+}
+
+
+def tokenize(source: str, keep_comments: bool = False) -> List[Token]:
+    """Convierte el código fuente en una lista de tokens en una sola pasada"""
+    tokens: List[Token] = []
+    append = tokens.append
+    keywords = LUA_KEYWORDS
+
+    for m in _TOKEN_RE.finditer(source):
+        kind = m.lastgroup
+        if kind == NAME:
+            value = m.group()
+            if value in keywords:
+                kind = KEYWORD
+        elif kind == COMMENT:
+            if not keep_comments:
+                continue
+            value = m.group()
+        elif kind == 'error':
+            char = m.group()[0]
+            raise LuaLexError(_ERRORS.get(char, f"Carácter inesperado {char!r}"), m.start())
+        else:
+            value = m.group()
+        start, end = m.span()
+        append(Token(kind, value, start, end))
+
+    return tokens
+
+
+def tokenize_buffer(buffer, keep_comments: bool = False, start: int = 0,
+                    end: Optional[int] = None) -> List[Token]:
+    """Como tokenize, pero sobre bytes, bytearray o mmap
+
+    Solo se decodifica el texto de cada token (UTF-8 con surrogateescape,
+    así cualquier byte de una cadena se conserva). Los valores repetidos
+    comparten el mismo objeto str. Las posiciones son desplazamientos en bytes.
+    Con start y end se analiza solo buffer[start:end], como si el archivo
+    acabara en end (lua_watch vuelve a analizar así la parte editada).
+    """
+    tokens: List[Token] = []
+    append = tokens.append
+    keywords = LUA_KEYWORDS
+    values: Dict[bytes, str] = {}
+
+    for m in _TOKEN_RE_BYTES.finditer(buffer, start, len(buffer) if end is None else end):
+        kind = m.lastgroup
+        if kind == COMMENT and not keep_comments:
+            continue
+        if kind == 'error':
+            char = m.group()[:1].decode('latin-1')
+            raise LuaLexError(_ERRORS.get(char, f"Carácter inesperado {char!r}"), m.start())
+        raw = m.group()
+        value = values.get(raw)
+        if value is None:
+            value = values[raw] = raw.decode('utf-8', 'surrogateescape')
+        if kind == NAME and value in keywords:
+            kind = KEYWORD
+        start, end = m.span()
+        append(Token(kind, value, start, end))
+
+    return tokens
+
+
+# Código de cada tipo en la columna de tipos de TokenArray
+KINDS = (NAME, KEYWORD, NUMBER, STRING, OP, COMMENT)
+_KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+
+class TokenArray:
+    """Flujo de tokens guardado en columnas en lugar de un objeto por token
+
+    Cuatro arrays paralelos (tipo, inicio, fin y número de valor) y la
+    tabla de valores distintos: 13 bytes por token más la tabla, unos 25
+    en total frente a los más de 150 de una lista de Token. Así se guardan
+    los tokens en la caché; kind(i) y value(i) leen las columnas sin crear
+    objetos, e indexarlo crea el Token de esa posición.
+    """
+    __slots__ = ('kinds', 'starts', 'ends', 'ids', 'values')
+
+    def __init__(self):
+        self.kinds = array('B')
+        self.starts = array('I')
+        self.ends = array('I')
+        self.ids = array('I')
+        self.values: List[str] = []
+
+    @classmethod
+    def from_tokens(cls, tokens: Iterable[Token]) -> 'TokenArray':
+        columns = cls()
+        kinds, starts, ends, ids = columns.kinds, columns.starts, columns.ends, columns.ids
+        values = columns.values
+        numbers: Dict[str, int] = {}
+        for kind, value, start, end in tokens:
+            number = numbers.get(value)
+            if number is None:
+                number = numbers[value] = len(values)
+                values.append(value)
+            kinds.append(_KIND_CODES[kind])
+            starts.append(start)
+            ends.append(end)
+            ids.append(number)
+        return columns
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def kind(self, i: int) -> str:
+        return KINDS[self.kinds[i]]
+
+    def value(self, i: int) -> str:
+        return self.values[self.ids[i]]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(len(self)))]
+        return Token(KINDS[self.kinds[i]], self.values[self.ids[i]], self.starts[i], self.ends[i])
+
+    def __iter__(self) -> Iterator[Token]:
+        values = self.values
+        for code, number, start, end in zip(self.kinds, self.ids, self.starts, self.ends):
+            yield Token(KINDS[code], values[number], start, end)
+
+    def tokens(self) -> List[Token]:
+        """Lista de Token para las pasadas que trabajan con objetos"""
+        return list(self)
+
+    def nbytes(self) -> int:
+        """Memoria de las columnas y de la tabla de valores"""
+        columns = sum(column.itemsize * len(column) for column in (self.kinds, self.starts, self.ends, self.ids))
+        return columns + sys.getsizeof(self.values) + sum(sys.getsizeof(value) for value in self.values)
+
+
+def benchmark_storage(buffer) -> Dict[str, float]:
+    """Tokens por segundo del lexer y bytes por token como lista de Token y como TokenArray"""
+    start = time.perf_counter()
+    tokens = tokenize_buffer(buffer)
+    elapsed = time.perf_counter() - start
+    count = max(len(tokens), 1)
+
+    # La lista se mide con tracemalloc en un segundo análisis: así no cuenta en el tiempo
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    listed = tokenize_buffer(buffer)
+    list_bytes = tracemalloc.get_traced_memory()[0] - before
+    del listed
+    if not tracing:
+        tracemalloc.stop()
+    return {
+        'tokens': float(len(tokens)),
+        'tokens_per_second': len(tokens) / elapsed if elapsed else float('inf'),
+        'list_bytes_per_token': list_bytes / count,
+        'array_bytes_per_token': TokenArray.from_tokens(tokens).nbytes() / count,
+    }
+
+
+# Fusiones peligrosas al pegar dos tokens sin espacio entre ellos
+_MERGING_PAIRS = frozenset({
+    ('-', '-'), ('.', '.'), ('=', '='), ('<', '='), ('>', '='), ('~', '='),
+    ('<', '<'), ('>', '>'), ('/', '/'), ('/', '='), ('[', '['), ('[', '='),
+    (':', ':'), ('+', '='), ('-', '='), ('*', '='), ('%', '='), ('^', '='),
+    ('.', '='), ('-', '>'),
+})
+
+_WORD_KINDS = frozenset({NAME, KEYWORD, NUMBER})
+
+
+def needs_space(prev: Token, current: Token) -> bool:
+    """Indica si dos tokens consecutivos necesitan un espacio para no fusionarse"""
+    if prev.kind in _WORD_KINDS and current.kind in _WORD_KINDS:
+        return True
+    if prev.kind == NUMBER and current.value[0] == '.':
+        return True
+    if prev.kind == COMMENT:
+        return True
+    return (prev.value[-1], current.value[0]) in _MERGING_PAIRS
+
+
+def render_tokens(tokens: List[Token], spaced: bool = False) -> str:
+    """Reconstruye código a partir de tokens
+
+    Con spaced=True separa todos los tokens con un espacio, salvo antes de
+    delimitadores de cierre y separadores, para que el resultado sea legible.
+    """
+    if not tokens:
+        return ''
+    parts = [tokens[0].value]
+    append = parts.append
+    prev = tokens[0]
+    for token in tokens[1:]:
+        if prev.kind == COMMENT and not prev.value.startswith('--['):
+            append('\n')
+        elif spaced:
+            if token.value not in (',', ';', ')', ']', '}', '.', ':') and \
+                    prev.value not in ('(', '[', '{', '.', ':', '#'):
+                append(' ')
+            elif needs_space(prev, token):
+                append(' ')
+        elif needs_space(prev, token):
+            append(' ')
+        append(token.value)
+        prev = token
+    return ''.join(parts)
+
+
+# Tablas de escapes precalculadas: cada secuencia se resuelve con una consulta,
+# sin expresiones regulares ni una función por coincidencia
+_SIMPLE_ESCAPES = {
+    ord('a'): b'\a', ord('b'): b'\b', ord('f'): b'\f', ord('n'): b'\n', ord('r'): b'\r',
+    ord('t'): b'\t', ord('v'): b'\v', ord('"'): b'"', ord("'"): b"'",
+}
+# '7', '07' y '007' -> b'\x07': Lua lee hasta tres dígitos decimales
+_DECIMAL_ESCAPES = {
+    text.encode('ascii'): bytes((value,))
+    for value in range(256) for text in {str(value), f"{value:02d}", f"{value:03d}"}
+}
+_HEX_ESCAPES = {f"{value:02x}".encode('ascii'): bytes((value,)) for value in range(256)}
+_NEWLINE_PAIRS = (b'\r\n', b'\n\r')
+
+# Secuencia completa (con la barra) -> bytes, para las formas de longitud fija
+_ESCAPE_SEQUENCES = {b'\\' + text: value for text, value in _DECIMAL_ESCAPES.items()}
+_ESCAPE_SEQUENCES.update({b'\\' + bytes((key,)): value for key, value in _SIMPLE_ESCAPES.items()})
+_ESCAPE_SEQUENCES[b'\\\\'] = b'\\'
+for _text, _value in _HEX_ESCAPES.items():
+    for _high in {_text[:1], _text[:1].upper()}:
+        for _low in {_text[1:], _text[1:].upper()}:
+            _ESCAPE_SEQUENCES[b'\\x' + _high + _low] = _value
+del _text, _value, _high, _low
+_ESCAPE_SPLIT = re.compile(rb'(\\(?:[0-9]{1,3}|x[0-9a-fA-F]{2}|[abfnrtv"\'\\]))')
+
+# Byte -> texto dentro de un literal entre comillas dobles, para str.translate
+_QUOTE_TABLE = {byte: chr(byte) if 32 <= byte <= 126 else f'\\{byte:03d}' for byte in range(256)}
+_QUOTE_TABLE.update({0x22: '\\"', 0x5C: '\\\\', 0x0A: '\\n', 0x0D: '\\r', 0x09: '\\t'})
+
+
+def decode_escapes(body: bytes) -> bytes:
+    """Resuelve las secuencias de escape del cuerpo de una cadena Lua
+
+    Admite \\ddd (decimal, como el intérprete de Lua), \\xHH, \\u{...},
+    \\z, los escapes de un carácter y la barra seguida de salto de línea.
+    El cuerpo se divide una sola vez por sus secuencias de escape y cada una
+    se traduce con una consulta a _ESCAPE_SEQUENCES; todo el recorrido ocurre
+    en re.split, map y bytes.join, sin código Python por secuencia. Solo las
+    formas variables o erróneas pasan por _decode_escapes_slow.
+    """
+    parts = _ESCAPE_SPLIT.split(body)
+    sequences = parts[1::2]
+    try:
+        parts[1::2] = map(_ESCAPE_SEQUENCES.__getitem__, sequences)
+    except KeyError:
+        return _decode_escapes_slow(body)
+    # Cada secuencia consume una barra, y '\\\\' dos: si sobran barras hay otras formas
+    if body.count(b'\\') != len(sequences) + sequences.count(b'\\\\'):
+        return _decode_escapes_slow(body)
+    return b''.join(parts)
+
+
+def _decode_escapes_slow(body: bytes) -> bytes:
+    """Recorrido trozo a trozo para \\z, \\u{...}, saltos de línea y errores"""
+    parts = body.split(b'\\')
+    out = [parts[0]]
+    append = out.append
+    position = len(parts[0])
+    literal = False
+    for i in range(1, len(parts)):
+        part = parts[i]
+        position += len(part) + 1
+        if literal:
+            # Trozo que sigue a una barra escapada: es texto, no empieza ningún escape
+            append(part)
+            literal = False
+            continue
+        if not part:
+            append(b'\\')
+            literal = True
+            continue
+        first = part[0]
+        if 48 <= first <= 57:
+            size = 3 if part[:3].isdigit() else 2 if part[:2].isdigit() else 1
+            value = _DECIMAL_ESCAPES.get(part[:size])
+            if value is None:
+                raise LuaLexError("Escape decimal fuera de rango", position - len(part))
+            append(value)
+            append(part[size:])
+        elif first in _SIMPLE_ESCAPES:
+            append(_SIMPLE_ESCAPES[first])
+            append(part[1:])
+        elif first == 0x78:  # x
+            value = _HEX_ESCAPES.get(part[1:3].lower())
+            if value is None:
+                raise LuaLexError("Escape hexadecimal inválido", position - len(part))
+            append(value)
+            append(part[3:])
+        elif first == 0x7A:  # z: se descarta junto con el espacio que le sigue
+            append(part[1:].lstrip())
+        elif first in (0x0A, 0x0D):
+            append(b'\n')
+            append(part[2:] if part[:2] in _NEWLINE_PAIRS else part[1:])
+        elif first == 0x75 and part[1:2] == b'{' and b'}' in part:  # u{XXX}
+            close = part.index(b'}')
+            try:
+                append(chr(int(part[2:close], 16)).encode('utf-8', 'surrogatepass'))
+            except ValueError:
+                raise LuaLexError("Escape \\u inválido", position - len(part)) from None
+            append(part[close + 1:])
+        else:
+            raise LuaLexError(f"Escape inválido \\{chr(first)}", position - len(part))
+    return b''.join(out)
+
+
+def string_value(raw: str) -> bytes:
+    """Obtiene el contenido en bytes de un literal de cadena Lua
+
+    Las secuencias \\ddd son decimales, como en el intérprete de Lua.
+    """
+    if raw.startswith('['):
+        # Cadena larga: sin escapes, se omite el salto de línea inicial
+        level = raw.index('[', 1) + 1
+        body = raw[level:len(raw) - level]
+        if body.startswith('\r\n') or body.startswith('\n\r'):
+            body = body[2:]
+        elif body[:1] in ('\n', '\r'):
+            body = body[1:]
+        return body.encode('utf-8', 'surrogateescape')
+
+    body = raw[1:-1].encode('utf-8', 'surrogateescape')
+    if b'\\' not in body:
+        return body
+    return decode_escapes(body)
+
+
+def quote_string(value: bytes) -> str:
+    """Genera un literal Lua entre comillas dobles para unos bytes dados"""
+    return '"' + value.decode('latin-1').translate(_QUOTE_TABLE) + '"'
+
+
+def _regex_path(code: str) -> int:
+    """Reproduce las pasadas regex originales sobre el archivo completo"""
+    octal = re.compile(r'\\([0-7]{3})')
+    re.search(r'local\s+(\w+)\s*=\s*\{([^}]+)\}', code)
+    code = re.sub(r'"([^"]*\\[0-7]{3}[^"]*)"',
+                  lambda m: '"' + octal.sub(lambda o: chr(int(o.group(1), 8)), m.group(1)) + '"',
+                  code)
+    code = re.sub(r'--.*$', '', code, flags=re.MULTILINE)
+    code = re.sub(r'([=<>!+\-*/%])(?!=)', r' \1 ', code)
+    code = re.sub(r'([,;])', r'\1 ', code)
+    code = re.sub(r'\s+', ' ', code)
+    return len(code)
+
+
+_ESCAPE_RE = re.compile(
+    r'\\(?:([0-9]{1,3})|x([0-9a-fA-F]{2})|u\{([0-9a-fA-F]+)\}|z\s*|\r\n?|\n\r?|(.))',
+    re.DOTALL
+)
+_REGEX_SIMPLE = {chr(key): value for key, value in _SIMPLE_ESCAPES.items()}
+_REGEX_SIMPLE.update({'\\': b'\\'})
+
+
+def _regex_string_value(body: str) -> bytes:
+    """Decodificación anterior: una coincidencia de regex por secuencia de escape"""
+    out = bytearray()
+    last = 0
+    for m in _ESCAPE_RE.finditer(body):
+        out += body[last:m.start()].encode('utf-8', 'surrogateescape')
+        decimal, hexa, codepoint, single = m.groups()
+        if decimal is not None:
+            out.append(int(decimal))
+        elif hexa is not None:
+            out.append(int(hexa, 16))
+        elif codepoint is not None:
+            out += chr(int(codepoint, 16)).encode('utf-8', 'surrogatepass')
+        elif single is not None:
+            out += _REGEX_SIMPLE[single]
+        elif m.group().startswith(('\\\n', '\\\r')):
+            out += b'\n'
+        last = m.end()
+    out += body[last:].encode('utf-8', 'surrogateescape')
+    return bytes(out)
+
+
+def _octal_callback_path(body: str) -> str:
+    """Decodificación original: \\ddd como octal con una función por coincidencia
+    y un filtro de caracteres imprimibles uno a uno"""
+    decoded = re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), body)
+    return ''.join(c for c in decoded if c.isprintable() or c in '\n\t\r')
+
+
+def benchmark_escapes(source: str, repeat: int = 3) -> Dict[str, float]:
+    """Mide la decodificación de escapes sobre todas las strings del archivo (strings/s)
+
+    Compara las tablas precalculadas (string_value) con la decodificación
+    por regex anterior y con la ruta octal original.
+    """
+    raws = [token.value for token in tokenize(source)
+            if token.kind == STRING and not token.value.startswith('[')]
+    bodies = [raw[1:-1] for raw in raws]
+    results: Dict[str, float] = {}
+
+    for label, func in (('table', lambda: [string_value(raw) for raw in raws]),
+                        ('regex', lambda: [_regex_string_value(body) for body in bodies]),
+                        ('octal', lambda: [_octal_callback_path(body) for body in bodies])):
+        best: Optional[float] = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[label] = len(raws) / best if best else float('inf')
+
+    results['strings'] = float(len(raws))
+    results['escapes'] = float(sum(body.count('\\') - body.count('\\\\') for body in bodies))
+    return results
+
+
+def benchmark(source: str, repeat: int = 3) -> Dict[str, float]:
+    """Mide el rendimiento del lexer frente a la ruta regex original (MB/s)"""
+    megabytes = len(source.encode('utf-8')) / (1024 * 1024)
+    results: Dict[str, float] = {}
+
+    for label, func in (('lexer', lambda: tokenize(source)),
+                        ('regex', lambda: _regex_path(source))):
+        best: Optional[float] = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[label] = megabytes / best if best else float('inf')
+
+    results['tokens'] = float(len(tokenize(source)))
+    return results
+
+
+def main():
+    """Ejecuta el benchmark de rendimiento sobre un archivo Lua"""
+    if len(sys.argv) < 2:
+        print("💡 Uso: python lua_lexer.py <archivo.lua>")
+        return
+
+    input_file = sys.argv[1]
+    if not os.path.exists(input_file):
+        print(f"❌ Error: Archivo '{input_file}' no encontrado")
+        return
+
+    with open(input_file, 'r', encoding='utf-8') as f:
+        source = f.read()
+
+    results = benchmark(source)
+    print(f"📏 Tamaño: {len(source) / 1024:.1f} KB, {int(results['tokens'])} tokens")
+    print(f"⚡ Lexer (una pasada): {results['lexer']:.2f} MB/s")
+    print(f"🐢 Ruta regex original: {results['regex']:.2f} MB/s")
+
+    storage = benchmark_storage(source.encode('utf-8'))
+    print(f"🧮 {storage['tokens_per_second']:,.0f} tokens/s; {storage['list_bytes_per_token']:.0f} B/token "
+          f"en lista de Token, {storage['array_bytes_per_token']:.0f} B/token en columnas (TokenArray)")
+
+    escapes = benchmark_escapes(source)
+    print(f"🔤 Escapes: {int(escapes['strings'])} strings, {int(escapes['escapes'])} secuencias")
+    print(f"⚡ Tablas precalculadas: {escapes['table']:.0f} strings/s")
+    print(f"🐢 Regex por secuencia: {escapes['regex']:.0f} strings/s")
+    print(f"🐢 Octal con callback y filtro: {escapes['octal']:.0f} strings/s")
+
+
+if __name__ == "__main__":
+    main()
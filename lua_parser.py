@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+Analizador sintáctico de Lua 5.1/Luau por descenso recursivo
+Construye el árbol de lua_ast a partir del flujo de tokens de lua_lexer
+"""
+
+import sys
+from typing import List, Optional
+
+from lua_lexer import Token, tokenize, NAME, NUMBER, STRING, KEYWORD, OP, COMMENT
+from lua_ast import (
+    Node, Chunk, Block, Local, Assign, CompoundAssign, CallStatement, Do, While,
+    Repeat, If, NumericFor, GenericFor, FunctionStatement, LocalFunction, Return,
+    Break, Continue, Goto, Label, Nil, Boolean, Number, String, Vararg, Function,
+    Field, Table, BinaryOp, UnaryOp, Name, Member, Index, Call, Invoke, Paren,
+)
+
+# Precedencias binarias (izquierda, derecha) como en lparser.c
+_BINARY_PRIORITY = {
+    'or': (1, 1), 'and': (2, 2),
+    '<': (3, 3), '>': (3, 3), '<=': (3, 3), '>=': (3, 3), '~=': (3, 3), '==': (3, 3),
+    '|': (4, 4), '~': (5, 5), '&': (6, 6), '<<': (7, 7), '>>': (7, 7),
+    '..': (9, 8),
+    '+': (10, 10), '-': (10, 10),
+    '*': (11, 11), '/': (11, 11), '//': (11, 11), '%': (11, 11),
+    '^': (14, 13),
+}
+_UNARY_PRIORITY = 12
+_UNARY_OPERATORS = frozenset({'not', '-', '#', '~'})
+_COMPOUND_OPERATORS = frozenset({'+=', '-=', '*=', '/=', '//=', '%=', '^=', '..='})
+_BLOCK_END = frozenset({'end', 'else', 'elseif', 'until'})
+
+# Árboles muy anidados (despachadores, cadenas de ..) superan el límite por defecto
+_RECURSION_LIMIT = 20000
+
+
+class LuaSyntaxError(ValueError):
+    """Error sintáctico con el token donde se produjo"""
+
+    def __init__(self, message: str, token: Optional[Token]):
+        where = f" (posición {token.start})" if token is not None else " (fin del archivo)"
+        super().__init__(message + where)
+        self.message = message
+        self.token = token
+
+    def __reduce__(self):
+        # Se reconstruye con sus dos argumentos al volver de otro proceso (lua_units)
+        return type(self), (self.message, self.token)
+
+
+class LuaParser:
+    def __init__(self, tokens: List[Token]):
+        self.tokens = [t for t in tokens if t.kind != COMMENT]
+        self.pos = 0
+
+    # Utilidades sobre el flujo de tokens
+
+    def peek(self, offset: int = 0) -> Optional[Token]:
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def check(self, value: str) -> bool:
+        token = self.peek()
+        return token is not None and token.value == value and token.kind in (KEYWORD, OP)
+
+    def accept(self, value: str) -> bool:
+        if self.check(value):
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, value: str, opening: Optional[str] = None) -> Token:
+        token = self.peek()
+        if not self.check(value):
+            found = repr(token.value) if token is not None else 'fin del archivo'
+            context = f" para cerrar '{opening}'" if opening else ''
+            raise LuaSyntaxError(f"Se esperaba '{value}'{context} y se encontró {found}", token)
+        self.pos += 1
+        return token
+
+    def expect_name(self) -> str:
+        token = self.peek()
+        if token is None or token.kind != NAME:
+            raise LuaSyntaxError("Se esperaba un nombre", token)
+        self.pos += 1
+        return token.value
+
+    def node(self, cls, *values, start: int) -> Node:
+        return cls(*values, span=(start, self.pos))
+
+    # Bloques y sentencias
+
+    def parse_chunk(self) -> Chunk:
+        block = self.parse_block()
+        if self.pos < len(self.tokens):
+            raise LuaSyntaxError(f"Token inesperado {self.peek().value!r}", self.peek())
+        return Chunk(block, span=(0, self.pos))
+
+    def parse_block(self) -> Block:
+        start = self.pos
+        body = []
+        while True:
+            token = self.peek()
+            if token is None or (token.kind == KEYWORD and token.value in _BLOCK_END):
+                break
+            if token.kind == KEYWORD and token.value == 'return':
+                body.append(self.parse_return())
+                break
+            statement = self.parse_statement()
+            if statement is not None:
+                body.append(statement)
+        return Block(body, span=(start, self.pos))
+
+    def parse_return(self) -> Return:
+        start = self.pos
+        self.pos += 1
+        values = []
+        token = self.peek()
+        if token is not None and not (token.kind == KEYWORD and token.value in _BLOCK_END) \
+                and not self.check(';'):
+            values = self.parse_expression_list()
+        self.accept(';')
+        return self.node(Return, values, start=start)
+
+    def parse_statement(self) -> Optional[Node]:
+        start = self.pos
+        token = self.peek()
+        value = token.value
+
+        if token.kind == OP:
+            if value == ';':
+                self.pos += 1
+                return None
+            if value == '::':
+                self.pos += 1
+                name = self.expect_name()
+                self.expect('::')
+                return self.node(Label, name, start=start)
+        elif token.kind == KEYWORD:
+            if value == 'if':
+                return self.parse_if()
+            if value == 'while':
+                self.pos += 1
+                test = self.parse_expression()
+                self.expect('do')
+                body = self.parse_block()
+                self.expect('end', 'while')
+                return self.node(While, test, body, start=start)
+            if value == 'do':
+                self.pos += 1
+                body = self.parse_block()
+                self.expect('end', 'do')
+                return self.node(Do, body, start=start)
+            if value == 'for':
+                return self.parse_for()
+            if value == 'repeat':
+                self.pos += 1
+                body = self.parse_block()
+                self.expect('until', 'repeat')
+                test = self.parse_expression()
+                return self.node(Repeat, body, test, start=start)
+            if value == 'function':
+                self.pos += 1
+                names = [self.expect_name()]
+                method = None
+                while self.accept('.'):
+                    names.append(self.expect_name())
+                if self.accept(':'):
+                    method = self.expect_name()
+                func = self.parse_function_body(self.pos)
+                return self.node(FunctionStatement, names, method, func, start=start)
+            if value == 'local':
+                self.pos += 1
+                if self.accept('function'):
+                    name = self.expect_name()
+                    func = self.parse_function_body(self.pos)
+                    return self.node(LocalFunction, name, func, start=start)
+                names = [self.parse_local_name()]
+                while self.accept(','):
+                    names.append(self.parse_local_name())
+                values = self.parse_expression_list() if self.accept('=') else []
+                return self.node(Local, names, values, start=start)
+            if value == 'break':
+                self.pos += 1
+                return self.node(Break, start=start)
+        elif token.kind == NAME and value == 'continue':
+            # continue de Luau: palabra clave contextual
+            following = self.peek(1)
+            if following is None or following.kind == KEYWORD or following.value == ';':
+                self.pos += 1
+                return self.node(Continue, start=start)
+        elif token.kind == NAME and value == 'goto':
+            # goto de Lua 5.2+: en Lua 5.1 y Luau es un nombre más, pero
+            # dos nombres seguidos no pueden empezar otra sentencia
+            following = self.peek(1)
+            if following is not None and following.kind == NAME:
+                self.pos += 1
+                return self.node(Goto, self.expect_name(), start=start)
+
+        return self.parse_expression_statement()
+
+    def parse_local_name(self) -> str:
+        name = self.expect_name()
+        # Atributos de Lua 5.4: <const>, <close>
+        if self.check('<'):
+            self.pos += 1
+            self.expect_name()
+            self.expect('>')
+        return name
+
+    def parse_if(self) -> If:
+        start = self.pos
+        self.pos += 1
+        tests = [self.parse_expression()]
+        self.expect('then')
+        blocks = [self.parse_block()]
+        orelse = None
+        while True:
+            if self.accept('elseif'):
+                tests.append(self.parse_expression())
+                self.expect('then')
+                blocks.append(self.parse_block())
+            elif self.accept('else'):
+                orelse = self.parse_block()
+                self.expect('end', 'if')
+                break
+            else:
+                self.expect('end', 'if')
+                break
+        return self.node(If, tests, blocks, orelse, start=start)
+
+    def parse_for(self) -> Node:
+        start = self.pos
+        self.pos += 1
+        first = self.expect_name()
+        if self.accept('='):
+            begin = self.parse_expression()
+            self.expect(',')
+            stop = self.parse_expression()
+            step = self.parse_expression() if self.accept(',') else None
+            self.expect('do')
+            body = self.parse_block()
+            self.expect('end', 'for')
+            return self.node(NumericFor, first, begin, stop, step, body, start=start)
+        names = [first]
+        while self.accept(','):
+            names.append(self.expect_name())
+        self.expect('in')
+        values = self.parse_expression_list()
+        self.expect('do')
+        body = self.parse_block()
+        self.expect('end', 'for')
+        return self.node(GenericFor, names, values, body, start=start)
+
+    def parse_expression_statement(self) -> Node:
+        start = self.pos
+        target = self.parse_suffixed_expression()
+
+        token = self.peek()
+        if token is not None and token.kind == OP and token.value in _COMPOUND_OPERATORS:
+            self.pos += 1
+            value = self.parse_expression()
+            return self.node(CompoundAssign, token.value[:-1], target, value, start=start)
+
+        if self.check('=') or self.check(','):
+            targets = [target]
+            while self.accept(','):
+                targets.append(self.parse_suffixed_expression())
+            for item in targets:
+                if not isinstance(item, (Name, Member, Index)):
+                    raise LuaSyntaxError("No se puede asignar a esta expresión", self.peek())
+            self.expect('=')
+            values = self.parse_expression_list()
+            return self.node(Assign, targets, values, start=start)
+
+        if not isinstance(target, (Call, Invoke)):
+            raise LuaSyntaxError("Se esperaba una llamada o una asignación", self.peek())
+        return self.node(CallStatement, target, start=start)
+
+    # Expresiones
+
+    def parse_expression_list(self) -> List[Node]:
+        values = [self.parse_expression()]
+        while self.accept(','):
+            values.append(self.parse_expression())
+        return values
+
+    def parse_expression(self, limit: int = 0) -> Node:
+        start = self.pos
+        token = self.peek()
+        if token is not None and token.kind in (KEYWORD, OP) and token.value in _UNARY_OPERATORS:
+            self.pos += 1
+            operand = self.parse_expression(_UNARY_PRIORITY)
+            left = self.node(UnaryOp, token.value, operand, start=start)
+        else:
+            left = self.parse_simple_expression()
+
+        while True:
+            token = self.peek()
+            if token is None or token.kind not in (KEYWORD, OP):
+                break
+            priority = _BINARY_PRIORITY.get(token.value)
+            if priority is None or priority[0] <= limit:
+                break
+            self.pos += 1
+            right = self.parse_expression(priority[1])
+            left = self.node(BinaryOp, token.value, left, right, start=start)
+        return left
+
+    def parse_simple_expression(self) -> Node:
+        start = self.pos
+        token = self.peek()
+        if token is None:
+            raise LuaSyntaxError("Se esperaba una expresión", None)
+        if token.kind == NUMBER:
+            self.pos += 1
+            return self.node(Number, token.value, start=start)
+        if token.kind == STRING:
+            self.pos += 1
+            return self.node(String, token.value, start=start)
+        if token.kind == KEYWORD:
+            if token.value == 'nil':
+                self.pos += 1
+                return self.node(Nil, start=start)
+            if token.value in ('true', 'false'):
+                self.pos += 1
+                return self.node(Boolean, token.value == 'true', start=start)
+            if token.value == 'function':
+                self.pos += 1
+                return self.parse_function_body(start)
+        if token.kind == OP:
+            if token.value == '...':
+                self.pos += 1
+                return self.node(Vararg, start=start)
+            if token.value == '{':
+                return self.parse_table()
+        return self.parse_suffixed_expression()
+
+    def parse_primary_expression(self) -> Node:
+        start = self.pos
+        token = self.peek()
+        if token is not None and token.kind == NAME:
+            self.pos += 1
+            return self.node(Name, token.value, start=start)
+        if self.accept('('):
+            expr = self.parse_expression()
+            self.expect(')', '(')
+            return self.node(Paren, expr, start=start)
+        found = repr(token.value) if token is not None else 'fin del archivo'
+        raise LuaSyntaxError(f"Expresión inesperada {found}", token)
+
+    def parse_suffixed_expression(self) -> Node:
+        start = self.pos
+        expr = self.parse_primary_expression()
+        while True:
+            token = self.peek()
+            if token is None:
+                return expr
+            value = token.value
+            if token.kind == OP and value == '.':
+                self.pos += 1
+                expr = self.node(Member, expr, self.expect_name(), start=start)
+            elif token.kind == OP and value == '[':
+                self.pos += 1
+                key = self.parse_expression()
+                self.expect(']', '[')
+                expr = self.node(Index, expr, key, start=start)
+            elif token.kind == OP and value == ':':
+                self.pos += 1
+                method = self.expect_name()
+                args = self.parse_call_arguments()
+                expr = self.node(Invoke, expr, method, args, start=start)
+            elif (token.kind == OP and value in ('(', '{')) or token.kind == STRING:
+                args = self.parse_call_arguments()
+                expr = self.node(Call, expr, args, start=start)
+            else:
+                return expr
+
+    def parse_call_arguments(self) -> List[Node]:
+        token = self.peek()
+        if token is not None and token.kind == STRING:
+            self.pos += 1
+            return [String(token.value, span=(self.pos - 1, self.pos))]
+        if self.check('{'):
+            return [self.parse_table()]
+        self.expect('(')
+        if self.accept(')'):
+            return []
+        args = self.parse_expression_list()
+        self.expect(')', '(')
+        return args
+
+    def parse_table(self) -> Table:
+        start = self.pos
+        self.expect('{')
+        items = []
+        while not self.check('}'):
+            item_start = self.pos
+            token = self.peek()
+            if token is not None and token.kind == OP and token.value == '[':
+                self.pos += 1
+                key = self.parse_expression()
+                self.expect(']', '[')
+                self.expect('=')
+                value = self.parse_expression()
+                items.append(self.node(Field, 'expr', key, value, start=item_start))
+            elif token is not None and token.kind == NAME and self.peek(1) is not None \
+                    and self.peek(1).value == '=' and self.peek(1).kind == OP:
+                self.pos += 2
+                value = self.parse_expression()
+                items.append(self.node(Field, 'name', token.value, value, start=item_start))
+            else:
+                value = self.parse_expression()
+                items.append(self.node(Field, 'list', None, value, start=item_start))
+            if not (self.accept(',') or self.accept(';')):
+                break
+        self.expect('}', '{')
+        return self.node(Table, items, start=start)
+
+    def parse_function_body(self, start: int) -> Function:
+        self.expect('(')
+        params = []
+        is_vararg = False
+        if not self.check(')'):
+            while True:
+                if self.accept('...'):
+                    is_vararg = True
+                    break
+                params.append(self.expect_name())
+                if not self.accept(','):
+                    break
+        self.expect(')', '(')
+        body = self.parse_block()
+        self.expect('end', 'function')
+        return self.node(Function, params, is_vararg, body, start=start)
+
+
+def parse(tokens: List[Token]) -> Chunk:
+    """Construye el árbol sintáctico de un flujo de tokens"""
+    previous = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(previous, _RECURSION_LIMIT))
+    try:
+        return LuaParser(tokens).parse_chunk()
+    finally:
+        sys.setrecursionlimit(previous)
+
+
+def parse_source(source: str) -> Chunk:
+    """Analiza código fuente Lua completo"""
+    return parse(tokenize(source))
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Pasadas del motor de desobfuscación
+Cada pasada lee del estado compartido los campos que declara en
+'requires' y devuelve (campos nuevos, contadores). El motor (lua_engine)
+las encadena según el perfil elegido, mide cada una y guarda en la caché
+las que se pueden reutilizar entre ejecuciones.
+"""
+
+import sys
+from typing import Any, Callable, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from lua_lexer import Token, tokenize_buffer, render_tokens, string_value, quote_string, STRING
+from lua_units import fold_units, split_tree, annotate_tree, write_units
+from lua_string_table import (TableReads, find_string_table, find_rotation, rotation_order, find_accessor,
+                              resolve_accessor_calls, substitute_table_references, table_reads,
+                              find_alphabet, decode_base64_batch)
+from lua_control_flow import recover_control_flow
+from lua_devirtualize import devirtualize
+from lua_dead_code import eliminate_dead_code
+from lua_parser import LuaSyntaxError, parse
+from lua_ast import Table
+from lua_scope import Binding, rename_locals
+from lua_printer import write_lua, open_output
+import lua_lexer
+import lua_ast
+import lua_folding
+import lua_string_table
+import lua_control_flow
+import lua_devirtualize
+import lua_dead_code
+import lua_parser
+import lua_scope
+import lua_printer
+import lua_units
+
+State = Dict[str, Any]
+PassResult = Tuple[Dict[str, Any], Dict[str, int]]
+
+class Pass(NamedTuple):
+    """Una etapa de la cadena y lo que necesita para ejecutarse y guardarse"""
+    name: str
+    run: Callable[[State], PassResult]
+    requires: FrozenSet[str]
+    produces: FrozenSet[str]
+    version: int = 1
+    modules: Tuple = ()
+    cached: bool = True         # su resultado se guarda en la caché
+    per_preset: bool = False    # depende del perfil (encabezado, comentarios, reporte)
+    writes: Optional[str] = None  # campo del estado con la ruta del archivo que escribe
+    units: bool = False         # admite el árbol repartido en unidades (lua_units)
+    description: str = ''
+
+
+def state_stats(state: State) -> Dict[str, int]:
+    """Contadores de todas las pasadas ejecutadas, en un solo diccionario"""
+    stats: Dict[str, int] = {}
+    for counters in state.get('counters', {}).values():
+        stats.update(counters)
+    return stats
+
+
+# Pasadas sobre tokens
+
+def fold_pass(state: State) -> PassResult:
+    """Análisis léxico y plegado de constantes"""
+    # Un único análisis léxico compartido por todas las pasadas
+    return fold_tokens(tokenize_buffer(state['source']), state.get('jobs', 1))
+
+
+def fold_tokens(tokens: List[Token], jobs: int = 1) -> PassResult:
+    """Plegado de constantes sobre tokens ya analizados (el archivo o una unidad de lua_watch)"""
+    lexed = len(tokens)
+    # '\\\\' es un solo escape: las barras dobles se descuentan una vez
+    escapes = sum(t.value.count('\\') - t.value.count('\\\\') for t in tokens if t.kind == STRING)
+
+    # Plegar constantes primero: todas las pasadas siguientes trabajan sobre menos tokens
+    tokens, constants_folded, folded_bytes = fold_units(tokens, jobs)
+    print(f"➗ Plegadas {constants_folded} constantes ({folded_bytes} bytes menos)")
+    return {'tokens': tokens}, {'tokens_lexed': lexed, 'constants_folded': constants_folded,
+                                'folded_bytes': folded_bytes, 'escapes': escapes}
+
+
+class StringTable(NamedTuple):
+    """Tabla de strings localizada: literales en el orden final, fin, rotación y alfabeto"""
+    name: str
+    literals: List[str]
+    end: int
+    rotation: List[Tuple[int, int]]
+    alphabet: Optional[Dict[int, int]]
+
+
+def locate_strings(tokens: List[Token]) -> Optional[StringTable]:
+    """Localiza la tabla de strings, su rotación y su alfabeto sin decodificar nada"""
+    location = find_string_table(tokens)
+    if location is None:
+        return None
+    name, start, end = location
+    literals = [t.value for t in tokens[start:end] if t.kind == STRING]
+
+    # Reproducir la rotación sobre los índices antes de numerar
+    rotation = []
+    found = find_rotation(tokens, name, end + 1)
+    if found:
+        rotation, _, end = found
+        literals = [literals[k] for k in rotation_order(len(literals), rotation)]
+    alphabet = find_alphabet(tokens, end) if literals else None
+    return StringTable(name, literals, end, rotation, alphabet[0] if alphabet else None)
+
+
+def strings_pass(state: State) -> PassResult:
+    """Extrae la tabla de strings, reproduce su rotación y la decodifica"""
+    print("🔍 Extrayendo tabla de strings...")
+    return decode_strings(locate_strings(state['tokens']))
+
+
+def decode_strings(table: Optional[StringTable]) -> PassResult:
+    """Decodifica los literales de la tabla (y su base64) en los datos de la pasada strings"""
+    facts = {'string_table': {}, 'table_name': None, 'table_end': 0, 'table_values': [],
+             'alphabet': None, 'rotation': []}
+    if table is None:
+        print("⚠️ No se encontró ninguna tabla de strings")
+        return facts, {'strings_decoded': 0, 'base64_decoded': 0}
+    values = [string_value(literal) for literal in table.literals]
+    print(f"✅ Decodificadas {len(values)} strings")
+
+    # Segunda capa: base64 con alfabeto propio
+    base64_decoded = 0
+    if table.alphabet:
+        values = decode_base64_batch(values, table.alphabet)
+        base64_decoded = len(values)
+        print(f"🔓 Decodificadas {base64_decoded} strings con el alfabeto base64 del script")
+    name = table.name
+    strings = {f"{name}[{i}]": value.decode('utf-8', 'backslashreplace') for i, value in enumerate(values, 1)}
+
+    facts.update(string_table=strings, table_name=name, table_end=table.end, table_values=values,
+                 alphabet=table.alphabet, rotation=table.rotation)
+    return facts, {'strings_decoded': len(strings), 'base64_decoded': base64_decoded}
+
+
+def decode_pass(state: State) -> PassResult:
+    """Reescribe cada string con escapes en su forma más legible
+
+    El literal se decodifica a bytes y se vuelve a escribir entre comillas
+    dobles: los caracteres imprimibles quedan tal cual y el resto como \\ddd
+    decimal, de modo que el valor de la cadena no cambia.
+    """
+    print("🔓 Decodificando secuencias de escape...")
+    result = []
+    rewritten = 0
+    for token in state['tokens']:
+        if token.kind == STRING and token.value[0] != '[' and '\\' in token.value:
+            literal = quote_string(string_value(token.value))
+            if literal != token.value:
+                token = token._replace(value=literal)
+                rewritten += 1
+        result.append(token)
+    return {'tokens': result}, {'strings_rewritten': rewritten}
+
+
+def resolve_pass(state: State) -> PassResult:
+    """Resuelve las llamadas de acceso l(n) y las referencias directas T[n] a su literal"""
+    tokens = state['tokens']
+    name = state['table_name']
+    if not name:
+        return {'tokens': tokens, 'accessor': None}, {'accessor_calls': 0}
+    print("🔧 Procesando código...")
+
+    accessor = find_accessor(tokens, name, state['table_end'])
+    try:
+        reads = table_reads(tokens, name, accessor, state['table_end'])
+    except LuaSyntaxError as e:
+        # Sin ámbitos no se sabe qué T[n] y l(n) son la tabla: no se sustituye ninguno
+        print(f"⚠️ No se pudo analizar el código para resolver las referencias a {name}: {e}")
+        return {'tokens': tokens, 'accessor': accessor}, {'accessor_calls': 0}
+    tokens, calls = resolve_references(tokens, name, table_literals(state['table_values']), accessor, reads)
+    if accessor:
+        print(f"🔑 Función de acceso {accessor[0]}(n): {calls} llamadas resueltas")
+    return {'tokens': tokens, 'accessor': accessor}, {'accessor_calls': calls}
+
+
+def table_literals(values: List[bytes]) -> Dict[int, str]:
+    """Tabla de búsqueda índice -> literal ya escapado, construida una vez"""
+    return {i: quote_string(value) for i, value in enumerate(values, 1)}
+
+
+def resolve_references(tokens: List[Token], name: str, literals: Dict[int, str],
+                       accessor: Optional[Tuple[str, int]], reads: TableReads) -> Tuple[List[Token], int]:
+    """Sustituye l(n) y T[n] por su literal en unos tokens (el archivo o una unidad de lua_watch)
+
+    reads dice qué lecturas son la tabla y su función de acceso (ver
+    lua_string_table.select_reads).
+    """
+    if reads.written:
+        literals = {key: literal for key, literal in literals.items() if key not in reads.written}
+    calls = 0
+    if accessor:
+        tokens, calls = resolve_accessor_calls(tokens, accessor[0], accessor[1], literals,
+                                               reads.reads.get(accessor[0], set()))
+    return substitute_table_references(tokens, name, literals, reads.reads.get(name, set())), calls
+
+
+def devirt_pass(state: State) -> PassResult:
+    """Separa el intérprete embebido en las funciones que ejecuta (vm(J, ...) -> vm[J](...))"""
+    tokens = state['tokens']
+    vm_stats = {}
+    try:
+        tokens, vm_stats = devirtualize(tokens)
+    except LuaSyntaxError as e:
+        print(f"⚠️ No se pudo analizar el código para separar el intérprete: {e}")
+    if vm_stats.get('vm_interpreters'):
+        print(f"🧩 Intérpretes: {vm_stats['vm_interpreters']}, "
+              f"funciones separadas: {vm_stats['vm_functions']}, "
+              f"estados: {vm_stats['vm_states']} ({vm_stats['vm_unreachable']} inalcanzables)")
+    return {'tokens': tokens}, dict(vm_stats)
+
+
+def flow_pass(state: State) -> PassResult:
+    """Deshace el aplanamiento del flujo de control (while M do if M < K ...)"""
+    tokens = state['tokens']
+    flow_stats = {}
+    try:
+        tokens, flow_stats = recover_control_flow(tokens)
+    except LuaSyntaxError as e:
+        print(f"⚠️ No se pudo analizar el código para recuperar el flujo: {e}")
+    if flow_stats.get('dispatchers'):
+        print(f"🧭 Despachadores: {flow_stats['dispatchers']}, estados: {flow_stats['states']}, "
+              f"bloques estructurados: {flow_stats['structured_blocks']}")
+    return {'tokens': tokens}, dict(flow_stats)
+
+
+def prune_pass(state: State) -> PassResult:
+    """Quita las ramas que deciden las constantes conocidas (predicados opacos)"""
+    tokens = state['tokens']
+    removed, prune_stats = [], {}
+    try:
+        tokens, removed, prune_stats = eliminate_dead_code(tokens)
+    except LuaSyntaxError as e:
+        print(f"⚠️ No se pudo analizar el código para eliminar ramas muertas: {e}")
+    if prune_stats.get('predicates_decided') or prune_stats.get('expressions_simplified'):
+        print(f"✂️ Predicados decididos: {prune_stats['predicates_decided']}, "
+              f"bloques eliminados: {prune_stats['blocks_removed']} ({prune_stats['bytes_removed']} bytes), "
+              f"selecciones simplificadas: {prune_stats['expressions_simplified']}")
+    return {'tokens': tokens, 'removed_blocks': removed}, dict(prune_stats)
+
+
+# Pasadas sobre el árbol
+
+def parse_pass(state: State) -> PassResult:
+    """Construye el árbol sintáctico una vez para el renombrado, los comentarios y el formato
+
+    Si las pasadas siguientes lo admiten, solo se analiza el esqueleto del
+    archivo: las unidades las analizan y formatean otros procesos en la
+    pasada de salida.
+    """
+    tokens = state['tokens']
+    units = []
+    if state.get('tree_units'):
+        tokens, units = split_tree(tokens, state['jobs'], state.get('source', b''))
+    try:
+        chunk = parse(tokens)
+    except LuaSyntaxError as e:
+        # Sin árbol no hay formato: la salida será el código tal cual
+        print(f"⚠️ No se pudo analizar el código: {e}")
+        chunk = None
+        units = []
+    if units:
+        print(f"🧩 {len(units)} unidades para {state['jobs']} procesos")
+    return {'chunk': chunk, 'units': units}, {'units': len(units)}
+
+
+def rename_pass(state: State) -> PassResult:
+    """Da a cada variable local de una letra un nombre descriptivo y único"""
+    chunk = state['chunk']
+    if chunk is None:
+        return {'variable_names': {}}, {'variables_renamed': 0}
+    print("🏷️ Mejorando nombres de variables...")
+    table_name = state.get('table_name')
+
+    def hint(binding: Binding) -> Optional[str]:
+        if binding.name == table_name and isinstance(binding.value, Table):
+            return 'stringTable'
+        return None
+
+    # Cada declaración se resuelve en su ámbito: dos 'l' distintas reciben nombres distintos
+    renamed = rename_locals(chunk, lambda binding: len(binding.name) == 1, hint)
+    variable_names = {binding.new_name: binding.name for binding in renamed}
+    return {'variable_names': variable_names}, {'variables_renamed': len(variable_names)}
+
+
+def comments_pass(state: State) -> PassResult:
+    """Decide el comentario de cada sentencia según el perfil"""
+    chunk = state['chunk']
+    annotations: Dict[int, str] = {}
+    functions = 0
+    if chunk is not None:
+        # Con unidades, este es el esqueleto: las unidades se comentan al formatearlas
+        annotations, functions = annotate_tree(chunk, state)
+    return {'annotations': annotations}, {'annotations': len(annotations), 'functions': functions}
+
+
+def output_pass(state: State) -> PassResult:
+    """Escribe el código indentado (y comentado, si hubo pasada de comentarios)"""
+    output_file = state['output_file']
+    chunk = state.get('chunk')
+    annotations = state.get('annotations')
+    print("📝 Aplicando formato, indentación y comentarios...")
+    print(f"💾 Guardando resultado en: {output_file}")
+    with open_output(output_file) as f:
+        if annotations is not None:
+            f.write(state['preset'].header)
+        if chunk is not None and state.get('units'):
+            try:
+                written = write_units(chunk, state['tokens'], state['units'], f, state['jobs'],
+                                      state, annotations)
+            except LuaSyntaxError as e:
+                # Una unidad inválida hace inválido el archivo entero: se guarda como sin árbol
+                print(f"⚠️ No se pudo analizar el código: {e}")
+                f.seek(0)
+                f.truncate()
+                if annotations is not None:
+                    f.write(state['preset'].header)
+                chunk = None
+            else:
+                counters = {'lines': written['lines']}
+                if annotations is not None:
+                    # Totales del archivo: la pasada de comentarios solo vio el esqueleto
+                    comments = state['counters'].get('comments', {})
+                    counters['functions'] = comments.get('functions', 0) + written['functions']
+                    counters['annotations'] = comments.get('annotations', 0) + written['annotations']
+                return {}, counters
+        if chunk is None:
+            # Sin árbol se guarda el código limpio tal cual
+            code = render_tokens(state['tokens'], spaced=True)
+            f.write(code)
+            return {}, {'lines': code.count('\n') + 1}
+        # El árbol se imprime directamente en el archivo, sin copias intermedias del código
+        annotate = None if annotations is None else (lambda node: annotations.get(id(node)))
+        lines = write_lua(chunk, f, annotate=annotate)
+    return {}, {'lines': lines}
+
+
+def report_pass(state: State) -> PassResult:
+    """Escribe el reporte de texto del perfil y sus registros NDJSON"""
+    state['preset'].write_report(state)
+    return {}, {}
+
+
+_SELF = sys.modules[__name__]
+
+# Registro de pasadas en su orden habitual. 'modules' son los módulos que
+# implementan cada pasada, también las que no se guardan: sus claves se
+# encadenan en las de las pasadas siguientes (la salida, por ejemplo)
+PASSES: Dict[str, Pass] = {step.name: step for step in (
+    Pass('fold', fold_pass, frozenset({'source'}), frozenset({'tokens'}),
+         modules=(lua_lexer, lua_folding, lua_units, _SELF),
+         description="análisis léxico y plegado de constantes"),
+    Pass('strings', strings_pass, frozenset({'tokens'}),
+         frozenset({'string_table', 'table_name', 'table_end', 'table_values', 'alphabet', 'rotation'}),
+         modules=(lua_lexer, lua_folding, lua_string_table, _SELF),
+         description="tabla de strings: rotación y base64"),
+    Pass('decode', decode_pass, frozenset({'tokens'}), frozenset({'tokens'}),
+         modules=(lua_lexer, _SELF), description="secuencias de escape de todas las strings"),
+    Pass('resolve', resolve_pass, frozenset({'tokens', 'table_name', 'table_values', 'table_end'}),
+         frozenset({'tokens', 'accessor'}),
+         modules=(lua_lexer, lua_folding, lua_ast, lua_parser, lua_scope, lua_string_table, _SELF),
+         description="llamadas l(n) y referencias T[n] a su literal"),
+    Pass('devirt', devirt_pass, frozenset({'tokens'}), frozenset({'tokens'}),
+         modules=(lua_lexer, lua_folding, lua_ast, lua_parser, lua_scope, lua_control_flow, lua_devirtualize,
+                  _SELF),
+         description="intérprete embebido separado en una función por estado inicial"),
+    Pass('flow', flow_pass, frozenset({'tokens'}), frozenset({'tokens'}),
+         modules=(lua_lexer, lua_folding, lua_ast, lua_parser, lua_scope, lua_control_flow, _SELF),
+         description="recuperación del flujo de control aplanado"),
+    Pass('prune', prune_pass, frozenset({'tokens'}), frozenset({'tokens', 'removed_blocks'}),
+         modules=(lua_lexer, lua_folding, lua_ast, lua_parser, lua_scope, lua_dead_code, _SELF),
+         description="ramas muertas y predicados opacos que deciden las constantes"),
+    Pass('parse', parse_pass, frozenset({'tokens'}), frozenset({'chunk', 'units'}), cached=False,
+         modules=(lua_lexer, lua_ast, lua_parser, lua_units, _SELF),
+         description="árbol sintáctico (o su esqueleto, con unidades para otros procesos)"),
+    Pass('rename', rename_pass, frozenset({'chunk'}), frozenset({'variable_names'}), cached=False,
+         modules=(lua_ast, lua_scope, _SELF),
+         description="nombres descriptivos para las variables locales"),
+    Pass('comments', comments_pass, frozenset({'chunk'}), frozenset({'annotations'}),
+         modules=(lua_ast, lua_units, _SELF), cached=False, per_preset=True, units=True,
+         description="encabezado y comentarios por sentencia"),
+    Pass('output', output_pass, frozenset({'tokens'}), frozenset(),
+         modules=(lua_lexer, lua_ast, lua_printer, lua_units, _SELF), per_preset=True, writes='output_file',
+         units=True,
+         description="código formateado en el archivo de salida"),
+    Pass('report', report_pass, frozenset(), frozenset(), modules=(_SELF,), cached=False, per_preset=True,
+         writes='report_file', description="reporte de texto y registros NDJSON (strings, nombres, bloques)"),
+)}
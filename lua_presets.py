@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Perfiles del motor de desobfuscación
+Cada perfil es una cadena de pasadas de lua_passes más lo que cambia
+entre herramientas: el encabezado y los comentarios de la salida, el
+sufijo del archivo y el formato del reporte. deobfuscator.py usa el
+perfil 'basic' y advanced_deobfuscator.py el perfil 'advanced'.
+"""
+
+from datetime import datetime
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from lua_ast import Node, Local, Table, FunctionStatement, LocalFunction, Return, Call, Paren
+from lua_passes import State, state_stats
+from lua_profile import profile_path
+from lua_records import write_records
+
+
+class Preset(NamedTuple):
+    """Cadena de pasadas y presentación de una herramienta"""
+    name: str
+    passes: Tuple[str, ...]
+    suffix: str
+    report_file: str
+    header: str
+    annotate: Callable[[Node, State], Optional[str]]
+    write_report: Callable[[State], None]
+
+
+# Perfil básico
+
+BASIC_HEADER = """-- Archivo Lua desobfuscado
+-- Generado por el desobfuscador de Termux
+-- Estructura del juego restaurada
+
+"""
+
+
+def basic_annotate(node: Node, state: State) -> Optional[str]:
+    """Comentario con el nombre de cada función declarada"""
+    if isinstance(node, FunctionStatement):
+        return f"Función: {'.'.join(node.names)}"
+    if isinstance(node, LocalFunction):
+        return f"Función: {node.name}"
+    return None
+
+
+def basic_report(state: State) -> None:
+    """Genera un reporte detallado del proceso"""
+    report_file = state['report_file']
+    string_table = state.get('string_table', {})
+    variable_names = state.get('variable_names', {})
+    stats = state_stats(state)
+    records_file = write_records(state)
+    with open(report_file, 'w', encoding='utf-8') as f:
+        f.write("=== REPORTE DE DESOBFUSCACIÓN ===\n\n")
+        f.write(f"Archivo original: {state['input_file']}\n")
+        f.write(f"Archivo desobfuscado: {state['output_file']}\n")
+        f.write(f"Fecha de procesamiento: {datetime.now()}\n\n")
+
+        f.write(f"=== ESTADÍSTICAS ===\n")
+        f.write(f"Total de strings decodificadas: {len(string_table)}\n")
+        f.write(f"Variables renombradas: {len(variable_names)}\n")
+        f.write(f"Constantes plegadas: {stats.get('constants_folded', 0)}\n")
+        f.write(f"Bytes eliminados por plegado: {stats.get('folded_bytes', 0)}\n")
+        found = state.get('fingerprint')
+        if found:
+            f.write(f"Familia del obfuscador: {found['label']} (confianza {found['confidence']:.0%})\n")
+            f.write(f"Pasadas omitidas: {', '.join(found['skipped']) or 'ninguna'}\n")
+
+        f.write("\n=== TIEMPO POR PASADA ===\n")
+        for line in state['profiler'].summary_lines():
+            f.write(f"{line}\n")
+        f.write(f"Detalle por pasada (NDJSON): {profile_path(report_file)}\n")
+
+        f.write("\n=== STRINGS Y VARIABLES RENOMBRADAS ===\n")
+        f.write(f"Una línea JSON por string y por variable (NDJSON): {records_file}\n")
+    print(f"📊 Reporte generado: {report_file}")
+
+
+# Perfil avanzado
+
+ADVANCED_HEADER = """--[[
+    CÓDIGO LUA DESOBFUSCADO
+    Generado por el Desobfuscador Avanzado para Termux
+    
+    Este archivo contiene el código original del juego/aplicación
+    en formato completamente legible y estructurado.
+    
+    Estructura principal:
+    - Definición de tabla de strings
+    - Funciones de inicialización
+    - Lógica principal del programa
+    - Funciones de utilidad
+--]]
+
+"""
+
+_RULE = "═══════════════════════════════════════════════════════════════════════════════\n"
+
+
+def advanced_annotate(node: Node, state: State) -> Optional[str]:
+    """Comentario explicativo para las sentencias que lo merecen"""
+    if isinstance(node, Local) and node.values and isinstance(node.values[0], Table):
+        return 'Tabla de strings decodificadas' if node.names[0] == state.get('table_name') else None
+    if isinstance(node, (FunctionStatement, LocalFunction)):
+        return 'Definición de función'
+    if isinstance(node, Return) and node.values and isinstance(node.values[0], (Call, Paren)):
+        return 'Función principal de retorno'
+    return None
+
+
+def _section(f, title: str) -> None:
+    f.write(_RULE)
+    f.write(f"{title:^79}".rstrip() + "\n")
+    f.write(_RULE)
+
+
+def advanced_report(state: State) -> None:
+    """Genera un reporte final detallado"""
+    report_file = state['report_file']
+    output_file = state['output_file']
+    stats = state_stats(state)
+    records_file = write_records(state)
+    with open(report_file, 'w', encoding='utf-8') as f:
+        f.write("╔═══════════════════════════════════════════════════════════════════════════════╗\n")
+        f.write("║                        REPORTE DE DESOBFUSCACIÓN AVANZADA                    ║\n")
+        f.write("╚═══════════════════════════════════════════════════════════════════════════════╝\n\n")
+
+        f.write(f"📁 Archivo original: {state['input_file']}\n")
+        f.write(f"📂 Archivo desobfuscado: {output_file}\n")
+        f.write(f"📅 Fecha de procesamiento: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+
+        _section(f, "ESTADÍSTICAS")
+        f.write(f"✓ Strings decodificadas: {stats.get('strings_decoded', 0)}\n")
+        f.write(f"✓ Rotaciones de la tabla: {len(state.get('rotation', []))}\n")
+        f.write(f"✓ Strings base64 decodificadas: {stats.get('base64_decoded', 0)}\n")
+        f.write(f"✓ Llamadas de acceso resueltas: {stats.get('accessor_calls', 0)}\n")
+        f.write(f"✓ Constantes plegadas: {stats.get('constants_folded', 0)} "
+                f"({stats.get('folded_bytes', 0)} bytes eliminados)\n")
+        f.write(f"✓ Intérpretes separados: {stats.get('vm_interpreters', 0)} "
+                f"({stats.get('vm_functions', 0)} funciones, {stats.get('vm_states', 0)} estados, "
+                f"{stats.get('vm_unreachable', 0)} inalcanzables, "
+                f"{stats.get('vm_dispatch_roots', 0)} siguen en un despachador)\n")
+        f.write(f"✓ Despachadores de estados: {stats.get('dispatchers', 0)} "
+                f"({stats.get('states', 0)} estados, "
+                f"{stats.get('structured_blocks', 0)} bloques estructurados, "
+                f"{stats.get('dispatch_roots', 0)} siguen en el despachador)\n")
+        f.write(f"✓ Ramas muertas eliminadas: {stats.get('blocks_removed', 0)} bloques "
+                f"({stats.get('bytes_removed', 0)} bytes, {stats.get('predicates_decided', 0)} predicados "
+                f"decididos, {stats.get('expressions_simplified', 0)} selecciones simplificadas)\n")
+        f.write(f"✓ Funciones identificadas: {stats.get('functions', 0)}\n")
+        f.write(f"✓ Líneas de código procesadas: {stats.get('lines', 0)}\n")
+        f.write(f"✓ Secuencias de escape decodificadas: {stats.get('escapes', 0)}\n")
+        found = state.get('fingerprint')
+        if found:
+            f.write(f"✓ Familia del obfuscador: {found['label']} (confianza {found['confidence']:.0%})\n")
+            f.write(f"✓ Pasadas omitidas: {', '.join(found['skipped']) or 'ninguna'}\n")
+        f.write("\n")
+
+        profiler = state['profiler']
+        if profiler.records:
+            _section(f, "TIEMPO POR PASADA")
+            for line in profiler.summary_lines():
+                f.write(f"{line}\n")
+            f.write(f"Detalle por pasada (NDJSON): {profile_path(report_file)}\n\n")
+
+        _section(f, "STRINGS DECODIFICADAS Y BLOQUES ELIMINADOS")
+        f.write("Una línea JSON por string (valor completo) y por bloque eliminado (NDJSON):\n")
+        f.write(f"{records_file}\n\n")
+
+        _section(f, "INSTRUCCIONES")
+        f.write("Para ejecutar en Termux:\n")
+        f.write("1. Instalar Lua: pkg install lua\n")
+        f.write(f"2. Ejecutar: lua {output_file}\n\n")
+        f.write("Para análisis adicional:\n")
+        f.write("- Revisar las funciones identificadas\n")
+        f.write("- Verificar la lógica de las strings decodificadas\n")
+        f.write("- Analizar la estructura del programa\n")
+    print(f"📊 Reporte avanzado generado: {report_file}")
+
+
+PRESETS: Dict[str, Preset] = {preset.name: preset for preset in (
+    Preset('basic', ('fold', 'strings', 'decode', 'parse', 'rename', 'comments', 'output', 'report'),
+           '_deobfuscated', 'deobfuscation_report.txt', BASIC_HEADER, basic_annotate, basic_report),
+    Preset('advanced', ('fold', 'strings', 'resolve', 'devirt', 'flow', 'prune', 'parse', 'comments', 'output',
+                        'report'),
+           '_fully_deobfuscated', 'advanced_deobfuscation_report.txt', ADVANCED_HEADER,
+           advanced_annotate, advanced_report),
+)}
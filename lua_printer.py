@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+Impresor de código Lua a partir del árbol sintáctico
+Recorre el árbol de lua_ast y escribe el código indentado directamente
+en un flujo de salida con búfer, sin construir listas de líneas. El
+resultado se vuelve a analizar en el mismo árbol.
+"""
+
+import io
+import sys
+import time
+from typing import Callable, List, Optional, TextIO
+
+from lua_lexer import tokenize
+from lua_ast import (
+    Node, Chunk, Block, Local, Assign, CompoundAssign, CallStatement, Do, While,
+    Repeat, If, NumericFor, GenericFor, FunctionStatement, LocalFunction, Return,
+    Break, Continue, Goto, Label, Nil, Boolean, Number, String, Vararg, Function,
+    Field, Table, BinaryOp, UnaryOp, Name, Member, Index, Call, Invoke, Paren,
+)
+from lua_parser import parse, _BINARY_PRIORITY, _UNARY_PRIORITY, _RECURSION_LIMIT
+
+# Tamaño del búfer de escritura de los archivos de salida
+BUFFER_SIZE = 1 << 16
+
+# Las tablas con más entradas que esto se escriben una entrada por línea
+INLINE_TABLE_ITEMS = 6
+
+# Expresiones que pueden ir delante de . : [ ( sin paréntesis
+_PREFIX_EXPRESSIONS = (Name, Paren, Call, Invoke, Member, Index)
+
+Annotate = Callable[[Node], Optional[str]]
+
+
+def open_output(path: str) -> TextIO:
+    """Abre un archivo de salida de texto con un búfer grande
+
+    surrogateescape vuelve a escribir tal cual los bytes no UTF-8 que el
+    lexer conservó dentro de las cadenas.
+    """
+    return open(path, 'w', encoding='utf-8', errors='surrogateescape', buffering=BUFFER_SIZE)
+
+
+def _starts_with_minus(node: Node) -> bool:
+    """Indica si la expresión impresa empieza por '-' (para no escribir '--')"""
+    while True:
+        if isinstance(node, UnaryOp):
+            return node.op == '-'
+        if isinstance(node, BinaryOp):
+            node = node.left
+        elif isinstance(node, Number):
+            return node.text.startswith('-')
+        else:
+            return False
+
+
+class LuaPrinter:
+    """Escribe un árbol de Lua indentado en un flujo de texto
+
+    annotate(node) puede devolver un comentario que se escribe en la
+    línea anterior a cada sentencia.
+    """
+
+    def __init__(self, out: TextIO, indent: str = '  ', annotate: Optional[Annotate] = None):
+        self.out = out
+        self.write = out.write
+        self.indent = indent
+        self.annotate = annotate
+        self.level = 0
+        self.lines = 0
+
+    def newline(self) -> None:
+        self.write('\n')
+        self.write(self.indent * self.level)
+        self.lines += 1
+
+    # Sentencias
+
+    def chunk(self, node: Chunk) -> None:
+        previous = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(previous, _RECURSION_LIMIT))
+        try:
+            first = True
+            for statement in node.body.body:
+                if not first:
+                    self.newline()
+                self.statement(statement)
+                first = False
+            self.write('\n')
+            self.lines += 1
+        finally:
+            sys.setrecursionlimit(previous)
+
+    def block(self, node: Block) -> None:
+        self.level += 1
+        for statement in node.body:
+            self.newline()
+            self.statement(statement)
+        self.level -= 1
+        self.newline()
+
+    def statement(self, node: Node) -> None:
+        if self.annotate is not None:
+            comment = self.annotate(node)
+            if comment:
+                self.write(f"-- {comment}")
+                self.newline()
+
+        write = self.write
+        if isinstance(node, Local):
+            write('local ')
+            write(', '.join(node.names))
+            if node.values:
+                write(' = ')
+                self.expression_list(node.values)
+        elif isinstance(node, Assign):
+            self.guard_paren(node.targets[0])
+            self.expression_list(node.targets)
+            write(' = ')
+            self.expression_list(node.values)
+        elif isinstance(node, CompoundAssign):
+            self.guard_paren(node.target)
+            self.expression(node.target)
+            write(f" {node.op}= ")
+            self.expression(node.value)
+        elif isinstance(node, CallStatement):
+            self.guard_paren(node.call)
+            self.expression(node.call)
+        elif isinstance(node, Do):
+            write('do')
+            self.block(node.body)
+            write('end')
+        elif isinstance(node, While):
+            write('while ')
+            self.expression(node.test)
+            write(' do')
+            self.block(node.body)
+            write('end')
+        elif isinstance(node, Repeat):
+            write('repeat')
+            self.block(node.body)
+            write('until ')
+            self.expression(node.test)
+        elif isinstance(node, If):
+            for i, (test, body) in enumerate(zip(node.tests, node.blocks)):
+                write('if ' if i == 0 else 'elseif ')
+                self.expression(test)
+                write(' then')
+                self.block(body)
+            if node.orelse is not None:
+                write('else')
+                self.block(node.orelse)
+            write('end')
+        elif isinstance(node, NumericFor):
+            write(f"for {node.var} = ")
+            self.expression(node.start)
+            write(', ')
+            self.expression(node.stop)
+            if node.step is not None:
+                write(', ')
+                self.expression(node.step)
+            write(' do')
+            self.block(node.body)
+            write('end')
+        elif isinstance(node, GenericFor):
+            write(f"for {', '.join(node.names)} in ")
+            self.expression_list(node.values)
+            write(' do')
+            self.block(node.body)
+            write('end')
+        elif isinstance(node, FunctionStatement):
+            write('function ')
+            write('.'.join(node.names))
+            if node.method is not None:
+                write(f":{node.method}")
+            self.function_body(node.func)
+        elif isinstance(node, LocalFunction):
+            write(f"local function {node.name}")
+            self.function_body(node.func)
+        elif isinstance(node, Return):
+            write('return')
+            if node.values:
+                write(' ')
+                self.expression_list(node.values)
+        elif isinstance(node, Break):
+            write('break')
+        elif isinstance(node, Continue):
+            write('continue')
+        elif isinstance(node, Goto):
+            write(f"goto {node.label}")
+        elif isinstance(node, Label):
+            write(f"::{node.name}::")
+        else:
+            raise TypeError(f"Sentencia desconocida: {type(node).__name__}")
+
+    def guard_paren(self, node: Node) -> None:
+        """Una sentencia que empieza por '(' se separa de la anterior con ';'"""
+        while isinstance(node, (Call, Invoke, Member, Index)):
+            node = node.func if isinstance(node, Call) else node.value
+        if isinstance(node, Paren) or not isinstance(node, _PREFIX_EXPRESSIONS):
+            self.write(';')
+
+    def function_body(self, node: Function) -> None:
+        params = list(node.params)
+        if node.is_vararg:
+            params.append('...')
+        self.write(f"({', '.join(params)})")
+        self.block(node.body)
+        self.write('end')
+
+    # Expresiones
+
+    def expression_list(self, nodes: List[Node]) -> None:
+        for i, node in enumerate(nodes):
+            if i:
+                self.write(', ')
+            self.expression(node)
+
+    def expression(self, node: Node) -> None:
+        write = self.write
+        if isinstance(node, Name):
+            write(node.id)
+        elif isinstance(node, Number):
+            write(node.text)
+        elif isinstance(node, String):
+            write(node.raw)
+        elif isinstance(node, Nil):
+            write('nil')
+        elif isinstance(node, Boolean):
+            write('true' if node.value else 'false')
+        elif isinstance(node, Vararg):
+            write('...')
+        elif isinstance(node, BinaryOp):
+            self.binary(node)
+        elif isinstance(node, UnaryOp):
+            write(node.op)
+            operand = node.operand
+            if node.op == 'not' or (node.op in ('-', '~') and _starts_with_minus(operand)) \
+                    or (node.op == '~' and isinstance(operand, UnaryOp) and operand.op == '~'):
+                write(' ')
+            if isinstance(operand, BinaryOp) and _BINARY_PRIORITY[operand.op][0] <= _UNARY_PRIORITY:
+                self.parenthesized(operand)
+            else:
+                self.expression(operand)
+        elif isinstance(node, Paren):
+            self.parenthesized(node.expr)
+        elif isinstance(node, Member):
+            self.prefix(node.value)
+            write(f".{node.name}")
+        elif isinstance(node, Index):
+            self.prefix(node.value)
+            write('[')
+            self.expression(node.key)
+            write(']')
+        elif isinstance(node, Call):
+            self.prefix(node.func)
+            self.arguments(node.args)
+        elif isinstance(node, Invoke):
+            self.prefix(node.value)
+            write(f":{node.method}")
+            self.arguments(node.args)
+        elif isinstance(node, Function):
+            write('function')
+            self.function_body(node)
+        elif isinstance(node, Table):
+            self.table(node)
+        else:
+            raise TypeError(f"Expresión desconocida: {type(node).__name__}")
+
+    def parenthesized(self, node: Node) -> None:
+        self.write('(')
+        self.expression(node)
+        self.write(')')
+
+    def prefix(self, node: Node) -> None:
+        if isinstance(node, _PREFIX_EXPRESSIONS):
+            self.expression(node)
+        else:
+            self.parenthesized(node)
+
+    def binary(self, node: BinaryOp) -> None:
+        left_priority, right_priority = _BINARY_PRIORITY[node.op]
+        left = node.left
+        # El operando izquierdo se agrupa distinto si el operador lo reclama con más fuerza
+        if (isinstance(left, BinaryOp) and left_priority > _BINARY_PRIORITY[left.op][1]) \
+                or (isinstance(left, UnaryOp) and left_priority > _UNARY_PRIORITY):
+            self.parenthesized(left)
+        else:
+            self.expression(left)
+        self.write(f" {node.op} ")
+        right = node.right
+        if isinstance(right, BinaryOp) and _BINARY_PRIORITY[right.op][0] <= right_priority:
+            self.parenthesized(right)
+        else:
+            self.expression(right)
+
+    def arguments(self, args: List[Node]) -> None:
+        self.write('(')
+        self.expression_list(args)
+        self.write(')')
+
+    def table(self, node: Table) -> None:
+        items = node.items
+        if not items:
+            self.write('{}')
+            return
+        multiline = len(items) > INLINE_TABLE_ITEMS or any(
+            isinstance(item.value, (Function, Table)) and not (isinstance(item.value, Table)
+                                                              and not item.value.items)
+            for item in items)
+        self.write('{')
+        if multiline:
+            self.level += 1
+        for i, item in enumerate(items):
+            if multiline:
+                self.newline()
+            elif i:
+                self.write(' ')
+            self.field(item)
+            if i < len(items) - 1 or multiline:
+                self.write(',')
+        if multiline:
+            self.level -= 1
+            self.newline()
+        self.write('}')
+
+    def field(self, node: Field) -> None:
+        if node.kind == 'name':
+            self.write(f"{node.key} = ")
+        elif node.kind == 'expr':
+            self.write('[')
+            self.expression(node.key)
+            self.write('] = ')
+        self.expression(node.value)
+
+
+def write_lua(chunk: Chunk, out: TextIO, indent: str = '  ',
+              annotate: Optional[Annotate] = None) -> int:
+    """Escribe el árbol en out y devuelve el número de líneas escritas"""
+    printer = LuaPrinter(out, indent, annotate)
+    printer.chunk(chunk)
+    return printer.lines
+
+
+def write_statements(statements: List[Node], out: TextIO, level: int, indent: str = '  ',
+                     annotate: Optional[Annotate] = None) -> int:
+    """Escribe sentencias seguidas como dentro de un bloque de ese nivel
+
+    Empieza tras la indentación de la primera sentencia, que ya escribió
+    quien la sitúa (lua_units cose así las unidades del archivo), y
+    devuelve el número de saltos de línea escritos.
+    """
+    printer = LuaPrinter(out, indent, annotate)
+    printer.level = level
+    previous = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(previous, _RECURSION_LIMIT))
+    try:
+        for i, statement in enumerate(statements):
+            if i:
+                printer.newline()
+            printer.statement(statement)
+    finally:
+        sys.setrecursionlimit(previous)
+    return printer.lines
+
+
+def format_lua(chunk: Chunk, indent: str = '  ') -> str:
+    """Devuelve el código del árbol como string (para árboles pequeños)"""
+    buffer = io.StringIO()
+    write_lua(chunk, buffer, indent)
+    return buffer.getvalue()
+
+
+def round_trips(chunk: Chunk) -> bool:
+    """Comprueba que el código impreso se vuelve a analizar en el mismo árbol"""
+    return parse(tokenize(format_lua(chunk))) == chunk
+
+
+def main():
+    """Imprime un archivo, comprueba la ida y vuelta y mide la velocidad"""
+    if len(sys.argv) < 2:
+        print("💡 Uso: python lua_printer.py <archivo.lua> [salida.lua]")
+        return
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        source = f.read()
+    chunk = parse(tokenize(source))
+
+    start = time.perf_counter()
+    buffer = io.StringIO()
+    lines = write_lua(chunk, buffer)
+    elapsed = time.perf_counter() - start
+    output = buffer.getvalue()
+    print(f"🖨️ {lines} líneas, {len(output)} bytes en {elapsed:.3f} s "
+          f"({len(output) / 1e6 / elapsed:.2f} MB/s)")
+    print("✅ Ida y vuelta correcta" if parse(tokenize(output)) == chunk
+          else "❌ El árbol impreso no coincide con el original")
+
+    if len(sys.argv) > 2:
+        with open_output(sys.argv[2]) as out:
+            write_lua(chunk, out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Perfil de rendimiento por pasada
+Cada pasada registra su tiempo, bytes y tokens de entrada y salida, el
+RSS máximo del proceso al terminar, la memoria máxima asignada durante
+la pasada (con tracemalloc, opcional porque multiplica el tiempo) y
+sus contadores propios. El perfil se escribe como NDJSON, una línea
+por pasada, junto al reporte legible.
+"""
+
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from lua_lexer import Token
+
+
+def token_bytes(tokens: List[Token]) -> int:
+    """Tamaño del código que representan los tokens (sin espacios)"""
+    return sum(len(token.value) for token in tokens)
+
+
+def peak_rss() -> Optional[int]:
+    """RSS máximo del proceso en bytes hasta ahora"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class PassRecord:
+    """Medidas de una ejecución de una pasada"""
+
+    def __init__(self, name: str, bytes_in: int = 0, tokens_in: int = 0):
+        self.name = name
+        self.seconds = 0.0
+        self.bytes_in = bytes_in
+        self.bytes_out = 0
+        self.tokens_in = tokens_in
+        self.tokens_out = 0
+        self.cached = False
+        self.peak_allocated: Optional[int] = None
+        self.peak_rss: Optional[int] = None
+        self.counters: Dict[str, int] = {}
+
+    def output(self, tokens: Optional[List[Token]] = None, size: Optional[int] = None) -> None:
+        """Registra la salida de la pasada: una lista de tokens o un tamaño en bytes"""
+        if tokens is not None:
+            self.tokens_out = len(tokens)
+            self.bytes_out = token_bytes(tokens)
+        if size is not None:
+            self.bytes_out = size
+
+    def as_dict(self) -> Dict:
+        return {
+            'pass': self.name,
+            'seconds': round(self.seconds, 6),
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'tokens_in': self.tokens_in,
+            'tokens_out': self.tokens_out,
+            'cached': self.cached,
+            'peak_allocated': self.peak_allocated,
+            'peak_rss': self.peak_rss,
+            'counters': self.counters,
+        }
+
+
+class PassProfiler:
+    """Recoge un PassRecord por cada pasada medida"""
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.records: List[PassRecord] = []
+        self.started = time.perf_counter()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def measure(self, name: str, bytes_in: int = 0, tokens_in: int = 0) -> Iterator[PassRecord]:
+        record = PassRecord(name, bytes_in, tokens_in)
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - start
+            if self.trace_memory:
+                record.peak_allocated = max(tracemalloc.get_traced_memory()[1] - before, 0)
+            record.peak_rss = peak_rss()
+            self.records.append(record)
+
+    def discard(self, record: PassRecord) -> None:
+        """Olvida una medida, p. ej. una consulta a la caché que no encontró nada"""
+        self.records.remove(record)
+
+    def total_seconds(self) -> float:
+        return time.perf_counter() - self.started
+
+    def write(self, path: str, **summary) -> None:
+        """Escribe el perfil en NDJSON: una línea por pasada y una línea final de totales"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in self.records:
+                f.write(json.dumps(record.as_dict(), ensure_ascii=False))
+                f.write('\n')
+            total = {
+                'pass': 'total',
+                'seconds': round(self.total_seconds(), 6),
+                'peak_rss': peak_rss(),
+            }
+            total.update(summary)
+            f.write(json.dumps(total, ensure_ascii=False))
+            f.write('\n')
+
+    def summary_lines(self) -> List[str]:
+        """Tabla legible de las pasadas para el reporte de texto"""
+        lines = []
+        for record in self.records:
+            origin = ' (caché)' if record.cached else ''
+            memory = '' if record.peak_allocated is None else f", {record.peak_allocated / 1e6:.1f} MB asignados"
+            counters = ', '.join(f"{key}={value}" for key, value in record.counters.items())
+            lines.append(f"{record.name:<10} {record.seconds * 1000:9.1f} ms{origin}{memory}"
+                         + (f" [{counters}]" if counters else ''))
+        return lines
+
+
+def profile_path(report_file: str) -> str:
+    """Ruta del perfil NDJSON junto al reporte"""
+    return os.path.splitext(report_file)[0] + '.profile.ndjson'
+
+
+@contextmanager
+def cprofile(path: Optional[str]) -> Iterator[None]:
+    """Ejecuta el bloque bajo cProfile y guarda las estadísticas en path (si se indica)"""
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"⏱️ Perfil de cProfile guardado en: {path} (python -m pstats {path})")
+
+
+def add_profile_arguments(parser) -> None:
+    """Opciones de perfilado comunes a las herramientas de línea de comandos"""
+    parser.add_argument('--profile', metavar='ARCHIVO', default=None,
+                        help="guarda un volcado de cProfile de la ejecución")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="mide la memoria asignada por cada pasada con tracemalloc (más lento)")
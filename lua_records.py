@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Registros del reporte en NDJSON e índice de strings en SQLite
+Junto al reporte de texto, cada ejecución escribe un archivo
+.records.ndjson con un objeto JSON por línea: un registro 'file' con
+los datos del archivo procesado y después uno por string decodificada
+('string', con su valor completo), por variable renombrada ('rename')
+y por bloque que quitó la eliminación de ramas muertas ('block'). Se
+escriben a medida que se generan, sin construir el reporte en memoria,
+y se leen igual: otras herramientas no tienen que interpretar el texto.
+
+Con --strings-db, las strings de cada archivo procesado se guardan
+además en un índice SQLite compartido por todas las ejecuciones, para
+consultar qué scripts comparten strings sin volver a procesarlos:
+
+    python lua_records.py strings.db --shared
+    python lua_records.py strings.db --find "HttpGet"
+    python lua_records.py strings.db salida/*.records.ndjson   # (re)indexa registros ya escritos
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from lua_passes import State, state_stats
+
+Record = Dict[str, Any]
+
+# Filas por executemany al indexar: acota la memoria con tablas de strings enormes
+INSERT_BATCH = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    preset TEXT,
+    processed TEXT,
+    strings INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS strings (
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    key TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS strings_value ON strings(value);
+CREATE INDEX IF NOT EXISTS strings_file ON strings(file_id);
+"""
+
+
+def records_path(report_file: str) -> str:
+    """Ruta de los registros NDJSON junto al reporte"""
+    return os.path.splitext(report_file)[0] + '.records.ndjson'
+
+
+# Escritura
+
+def iter_records(state: State) -> Iterator[Record]:
+    """Registros de una ejecución: el del archivo primero y después uno por elemento"""
+    string_table = state.get('string_table', {})
+    variable_names = state.get('variable_names', {})
+    removed = sorted(state.get('removed_blocks', []), key=lambda block: block.position)
+    yield {
+        'record': 'file',
+        'input_file': os.path.abspath(state['input_file']),
+        'output_file': os.path.abspath(state['output_file']),
+        'preset': state['preset'].name,
+        'processed': datetime.now().isoformat(timespec='seconds'),
+        'strings': len(string_table),
+        'renamed': len(variable_names),
+        'blocks': len(removed),
+        'fingerprint': state.get('fingerprint'),
+        'stats': state_stats(state),
+    }
+    for key, value in string_table.items():
+        yield {'record': 'string', 'key': key, 'value': value}
+    for new, old in variable_names.items():
+        yield {'record': 'rename', 'old': old, 'new': new}
+    # Las líneas se cuentan de un bloque al siguiente: una sola lectura del archivo
+    source = memoryview(state.get('source', b''))
+    line, counted = 1, 0
+    for block in removed:
+        position = min(block.position, len(source))
+        line += bytes(source[counted:position]).count(b'\n')
+        counted = position
+        yield {'record': 'block', 'reason': block.reason, 'line': line, 'position': block.position,
+               'blocks': block.blocks, 'bytes': block.size}
+
+
+def write_records(state: State) -> str:
+    """Escribe los registros NDJSON junto al reporte y devuelve su ruta"""
+    path = records_path(state['report_file'])
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in iter_records(state):
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write('\n')
+    return path
+
+
+def read_records(path: str) -> Iterator[Record]:
+    """Lee un archivo de registros línea a línea"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+# Índice de strings
+
+class StringIndex:
+    """Índice SQLite de las strings decodificadas de todos los archivos procesados
+
+    Cada archivo se identifica por su ruta absoluta: volver a indexarlo
+    sustituye sus strings. Un solo proceso escribe (el principal, no los
+    procesos del lote).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self) -> 'StringIndex':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def add(self, records_file: str) -> int:
+        """Indexa las strings de un archivo de registros y devuelve cuántas son"""
+        records = read_records(records_file)
+        header = next(records, None)
+        if header is None or header.get('record') != 'file':
+            raise ValueError(f"{records_file}: no empieza por un registro 'file'")
+        connection = self.connection
+        with connection:
+            connection.execute("INSERT INTO files (path, preset, processed) VALUES (?, ?, ?) "
+                               "ON CONFLICT(path) DO UPDATE SET preset = excluded.preset, "
+                               "processed = excluded.processed",
+                               (header['input_file'], header.get('preset'), header.get('processed')))
+            file_id = connection.execute("SELECT id FROM files WHERE path = ?",
+                                         (header['input_file'],)).fetchone()[0]
+            connection.execute("DELETE FROM strings WHERE file_id = ?", (file_id,))
+            count = 0
+            batch: List[Tuple[int, str, str]] = []
+            for record in records:
+                if record.get('record') != 'string':
+                    continue
+                batch.append((file_id, record['key'], record['value']))
+                if len(batch) >= INSERT_BATCH:
+                    connection.executemany("INSERT INTO strings VALUES (?, ?, ?)", batch)
+                    count += len(batch)
+                    batch = []
+            connection.executemany("INSERT INTO strings VALUES (?, ?, ?)", batch)
+            count += len(batch)
+            connection.execute("UPDATE files SET strings = ? WHERE id = ?", (count, file_id))
+        return count
+
+    def totals(self) -> Tuple[int, int]:
+        """(archivos, strings) del índice"""
+        files, = self.connection.execute("SELECT COUNT(*) FROM files").fetchone()
+        strings, = self.connection.execute("SELECT COUNT(*) FROM strings").fetchone()
+        return files, strings
+
+    def shared(self, min_files: int = 2, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Strings que aparecen en al menos min_files archivos, de la más compartida a la menos"""
+        return self.connection.execute(
+            "SELECT value, COUNT(DISTINCT file_id) AS files FROM strings GROUP BY value "
+            "HAVING files >= ? ORDER BY files DESC, value LIMIT ?",
+            (min_files, -1 if limit is None else limit)).fetchall()
+
+    def find(self, text: str) -> List[Tuple[str, str, str]]:
+        """(archivo, clave, valor) de las strings que contienen text"""
+        # instr distingue mayúsculas y no da significado a % ni _, a diferencia de LIKE
+        return self.connection.execute(
+            "SELECT files.path, strings.key, strings.value FROM strings JOIN files ON files.id = strings.file_id "
+            "WHERE instr(strings.value, ?) > 0 ORDER BY files.path, strings.rowid", (text,)).fetchall()
+
+
+def index_records(db_path: str, records_files: Iterable[str]) -> None:
+    """Añade al índice los registros que existan (un archivo sin reporte no tiene registros)"""
+    with StringIndex(db_path) as index:
+        indexed = added = 0
+        for path in records_files:
+            if not os.path.exists(path):
+                continue
+            try:
+                added += index.add(path)
+            except (ValueError, KeyError) as e:
+                print(f"⚠️ No se pudo indexar {path}: {e}")
+                continue
+            indexed += 1
+        files, strings = index.totals()
+    print(f"🗃️ Índice de strings: {indexed} registros ({added} strings) en {db_path}; "
+          f"en total {strings} strings de {files} archivos")
+
+
+def add_records_arguments(parser) -> None:
+    """Opción del índice de strings común a las herramientas de línea de comandos"""
+    parser.add_argument('--strings-db', metavar='RUTA', default=None,
+                        help="guarda las strings decodificadas de cada archivo en un índice SQLite "
+                             "(ver lua_records.py para consultarlo)")
+
+
+def main():
+    """Indexa registros ya escritos y consulta el índice de strings"""
+    parser = argparse.ArgumentParser(description="Índice SQLite de las strings decodificadas")
+    parser.add_argument('database', help="archivo SQLite del índice")
+    parser.add_argument('records', nargs='*', help="archivos .records.ndjson que añadir al índice")
+    parser.add_argument('--shared', action='store_true', help="strings que aparecen en varios archivos")
+    parser.add_argument('--min-files', type=int, default=2, help="archivos mínimos para --shared (por defecto 2)")
+    parser.add_argument('--limit', type=int, default=50, help="filas como mucho de --shared (0: todas)")
+    parser.add_argument('--find', metavar='TEXTO', help="strings que contienen TEXTO y los archivos que las usan")
+    args = parser.parse_args()
+
+    if args.records:
+        index_records(args.database, args.records)
+    elif not os.path.exists(args.database):
+        print(f"❌ Error: El índice '{args.database}' no existe")
+        sys.exit(1)
+    with StringIndex(args.database) as index:
+        if args.shared:
+            rows = index.shared(max(args.min_files, 1), args.limit or None)
+            print(f"🔗 Strings en {args.min_files} archivos o más: {len(rows)}")
+            for value, files in rows:
+                print(f"{files:5d}  {json.dumps(value, ensure_ascii=False)}")
+        if args.find is not None:
+            rows = index.find(args.find)
+            print(f"🔎 Strings que contienen {json.dumps(args.find, ensure_ascii=False)}: {len(rows)}")
+            for path, key, value in rows:
+                print(f"{path}  {key}  {json.dumps(value, ensure_ascii=False)}")
+        if not (args.records or args.shared or args.find is not None):
+            files, strings = index.totals()
+            print(f"🗃️ {args.database}: {strings} strings de {files} archivos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Resolución de ámbitos y renombrado de variables locales
+Recorre el árbol una sola vez asociando cada nombre a la declaración
+local que lo liga (o a una global) y da a cada declaración un nombre
+único según cómo se usa. Las variables con el mismo nombre en ámbitos
+distintos reciben nombres distintos.
+"""
+
+import sys
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from lua_ast import (
+    Node, Chunk, Block, Local, Assign, CompoundAssign, CallStatement, Do, While,
+    Repeat, If, NumericFor, GenericFor, FunctionStatement, LocalFunction, Return,
+    Boolean, Number, String, Function, Table, BinaryOp, UnaryOp,
+    Name, Member, Index, Call, Invoke, Paren,
+)
+from lua_parser import _RECURSION_LIMIT
+
+# Tipos de declaración
+LOCAL = 'local'
+PARAM = 'param'
+FUNCTION = 'function'
+FOR_INDEX = 'for_index'
+FOR_NAME = 'for_name'
+
+# Sitio donde aparece el nombre: (lista, posición) o (nodo, atributo)
+Site = Tuple[object, object]
+
+
+class Binding:
+    """Una declaración local con todos los sitios donde aparece su nombre"""
+
+    def __init__(self, name: str, kind: str, value: Optional[Node] = None, position: int = 0):
+        self.name = name
+        self.kind = kind
+        self.value = value          # expresión inicial, si la hay
+        self.position = position    # orden entre los nombres de la misma declaración
+        self.sites: List[Site] = []
+        self.calls = 0              # usos como x(...)
+        self.indexes = 0            # usos como x.a, x[k] o x:m()
+        self.lengths = 0            # usos como #x
+        self.writes = 0             # asignaciones posteriores a la declaración
+        self.new_name: Optional[str] = None
+
+    @property
+    def uses(self) -> int:
+        return len(self.sites) - 1
+
+
+class ScopeResolver:
+    """Asocia cada Name del árbol a su declaración en un único recorrido"""
+
+    def __init__(self):
+        self.scopes: List[Dict[str, Binding]] = []
+        self.bindings: List[Binding] = []
+        self.names: Set[str] = set()    # todos los identificadores del archivo
+
+    # Ámbitos
+
+    def declare(self, name: str, kind: str, site: Site, value: Optional[Node] = None,
+                position: int = 0) -> Binding:
+        binding = Binding(name, kind, value, position)
+        binding.sites.append(site)
+        self.scopes[-1][name] = binding
+        self.bindings.append(binding)
+        self.names.add(name)
+        return binding
+
+    def lookup(self, name: str) -> Optional[Binding]:
+        for scope in reversed(self.scopes):
+            binding = scope.get(name)
+            if binding is not None:
+                return binding
+        return None
+
+    def resolve(self, chunk: Chunk) -> List[Binding]:
+        previous = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(previous, _RECURSION_LIMIT))
+        try:
+            self.block(chunk.body)
+        finally:
+            sys.setrecursionlimit(previous)
+        return self.bindings
+
+    def block(self, node: Block, declare: Optional[Callable[[], None]] = None) -> None:
+        self.scopes.append({})
+        if declare is not None:
+            declare()
+        for statement in node.body:
+            self.statement(statement)
+        self.scopes.pop()
+
+    # Sentencias
+
+    def statement(self, node: Node) -> None:
+        if isinstance(node, Local):
+            # Los valores se evalúan antes de que existan los nombres: local x = x
+            for value in node.values:
+                self.expression(value)
+            for i, name in enumerate(node.names):
+                value = node.values[i] if i < len(node.values) else None
+                self.declare(name, LOCAL, (node.names, i), value, i)
+        elif isinstance(node, Assign):
+            for value in node.values:
+                self.expression(value)
+            for target in node.targets:
+                self.expression(target)
+                if isinstance(target, Name):
+                    binding = self.lookup(target.id)
+                    if binding is not None:
+                        binding.writes += 1
+        elif isinstance(node, CompoundAssign):
+            self.expression(node.target)
+            self.expression(node.value)
+        elif isinstance(node, CallStatement):
+            self.expression(node.call)
+        elif isinstance(node, Do):
+            self.block(node.body)
+        elif isinstance(node, While):
+            self.expression(node.test)
+            self.block(node.body)
+        elif isinstance(node, Repeat):
+            # La condición de until ve las locales del cuerpo
+            self.scopes.append({})
+            for statement in node.body.body:
+                self.statement(statement)
+            self.expression(node.test)
+            self.scopes.pop()
+        elif isinstance(node, If):
+            for test, body in zip(node.tests, node.blocks):
+                self.expression(test)
+                self.block(body)
+            if node.orelse is not None:
+                self.block(node.orelse)
+        elif isinstance(node, NumericFor):
+            self.expression(node.start)
+            self.expression(node.stop)
+            if node.step is not None:
+                self.expression(node.step)
+            self.block(node.body, lambda: self.declare(node.var, FOR_INDEX, (node, 'var')))
+        elif isinstance(node, GenericFor):
+            for value in node.values:
+                self.expression(value)
+
+            def declare_names():
+                for i, name in enumerate(node.names):
+                    self.declare(name, FOR_NAME, (node.names, i), position=i)
+            self.block(node.body, declare_names)
+        elif isinstance(node, FunctionStatement):
+            self.reference(node.names[0], (node.names, 0))
+            self.function(node.func, implicit_self=node.method is not None)
+        elif isinstance(node, LocalFunction):
+            # El nombre existe dentro del cuerpo: permite la recursión
+            self.declare(node.name, FUNCTION, (node, 'name'), node.func)
+            self.function(node.func)
+        elif isinstance(node, Return):
+            for value in node.values:
+                self.expression(value)
+
+    def function(self, node: Function, implicit_self: bool = False) -> None:
+        def declare_params():
+            if implicit_self:
+                # self no aparece en el código: se liga sin sitio y no se renombra
+                self.scopes[-1]['self'] = Binding('self', PARAM)
+            for i, name in enumerate(node.params):
+                self.declare(name, PARAM, (node.params, i), position=i)
+        self.block(node.body, declare_params)
+
+    # Expresiones
+
+    def reference(self, name: str, site: Site) -> Optional[Binding]:
+        self.names.add(name)
+        binding = self.lookup(name)
+        if binding is not None:
+            binding.sites.append(site)
+        return binding
+
+    def expression(self, node: Node) -> None:
+        if isinstance(node, Name):
+            self.reference(node.id, (node, 'id'))
+        elif isinstance(node, BinaryOp):
+            self.expression(node.left)
+            self.expression(node.right)
+        elif isinstance(node, UnaryOp):
+            self.expression(node.operand)
+            if node.op == '#' and isinstance(node.operand, Name):
+                self.count(node.operand, 'lengths')
+        elif isinstance(node, Paren):
+            self.expression(node.expr)
+        elif isinstance(node, (Member, Index)):
+            self.expression(node.value)
+            self.count(node.value, 'indexes')
+            if isinstance(node, Index):
+                self.expression(node.key)
+        elif isinstance(node, Call):
+            self.expression(node.func)
+            self.count(node.func, 'calls')
+            for arg in node.args:
+                self.expression(arg)
+        elif isinstance(node, Invoke):
+            self.expression(node.value)
+            self.count(node.value, 'indexes')
+            for arg in node.args:
+                self.expression(arg)
+        elif isinstance(node, Function):
+            self.function(node)
+        elif isinstance(node, Table):
+            for item in node.items:
+                if item.kind == 'expr':
+                    self.expression(item.key)
+                self.expression(item.value)
+
+    def count(self, node: Node, counter: str) -> None:
+        if isinstance(node, Name):
+            binding = self.lookup(node.id)
+            if binding is not None:
+                setattr(binding, counter, getattr(binding, counter) + 1)
+
+
+def usage_name(binding: Binding) -> str:
+    """Nombre base según la declaración y el uso de la variable"""
+    value = binding.value
+    if binding.kind == FUNCTION or isinstance(value, Function):
+        return 'func'
+    if binding.kind == FOR_INDEX:
+        return 'index'
+    if binding.kind == FOR_NAME:
+        return ('key', 'value')[binding.position] if binding.position < 2 else 'item'
+    if binding.calls and not binding.indexes:
+        return 'callback' if binding.kind == PARAM else 'fn'
+    if isinstance(value, Table) or binding.lengths:
+        return 'list' if binding.lengths else 'tbl'
+    if binding.indexes:
+        return 'obj'
+    if binding.kind == PARAM:
+        return 'arg'
+    if isinstance(value, String):
+        return 'str'
+    if isinstance(value, Number):
+        return 'counter' if binding.writes else 'num'
+    if isinstance(value, Boolean):
+        return 'flag'
+    if isinstance(value, (Call, Invoke)):
+        return 'result'
+    return 'var'
+
+
+def rename_locals(chunk: Chunk, select: Optional[Callable[[Binding], bool]] = None,
+                  hint: Optional[Callable[[Binding], Optional[str]]] = None) -> List[Binding]:
+    """Renombra en el árbol las declaraciones elegidas y devuelve las renombradas
+
+    select decide qué declaraciones se renombran (por defecto, todas) y
+    hint puede proponer un nombre base; si no, se usa usage_name. Cada
+    nombre nuevo es único en todo el archivo y no coincide con ningún
+    identificador existente, así que no puede capturar otra variable.
+    """
+    resolver = ScopeResolver()
+    bindings = resolver.resolve(chunk)
+    taken = set(resolver.names)
+    counters: Dict[str, int] = {}
+
+    renamed: List[Binding] = []
+    for binding in bindings:
+        if select is not None and not select(binding):
+            continue
+        base = (hint(binding) if hint is not None else None) or usage_name(binding)
+        while True:
+            counters[base] = counters.get(base, 0) + 1
+            candidate = f"{base}_{counters[base]}"
+            if candidate not in taken:
+                break
+        taken.add(candidate)
+        binding.new_name = candidate
+        for holder, key in binding.sites:
+            if isinstance(key, int):
+                holder[key] = candidate
+            else:
+                setattr(holder, key, candidate)
+        renamed.append(binding)
+    return renamed
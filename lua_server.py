@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Modo servicio del motor de desobfuscación (--serve)
+Un proceso de larga duración con procesos de trabajo ya calientes
+(módulos importados, expresiones regulares compiladas, caché abierta)
+que atiende trabajos en JSON, uno por línea, por la entrada estándar o
+por un socket Unix. Cada trabajo indica un archivo o el código fuente y
+las opciones; la respuesta trae las rutas de salida (o el código, si se
+envió el fuente) y las métricas por pasada. Los trabajos se ejecutan a
+la vez en un número limitado de procesos: con todos ocupados y la cola
+llena se deja de leer la entrada hasta que alguno termina.
+
+Trabajo:   {"id": 1, "input": "script.lua", "preset": "advanced", "passes": "-report"}
+           {"id": 2, "source": "local a = 1", "preset": "basic,advanced"}
+Respuesta: {"id": 1, "ok": true, "seconds": 0.41, "results": [{"preset": "advanced",
+            "output_file": "...", "report_file": "...", "records_file": "...", "stats": {...},
+            "passes": [...]}]}
+Control:   {"cmd": "ping"}, {"cmd": "stats"}, {"cmd": "shutdown"}
+"""
+
+import contextlib
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional
+
+from lua_engine import Engine, Target, explicit_passes, resolve_passes
+from lua_passes import State, state_stats
+from lua_presets import PRESETS
+from lua_cache import PassCache
+from lua_records import records_path
+
+# Trabajos en curso o en cola por proceso antes de dejar de leer la entrada
+QUEUE_PER_WORKER = 2
+
+Job = Dict[str, Any]
+Response = Dict[str, Any]
+
+
+class JobError(ValueError):
+    """Trabajo mal formado: se responde con el error sin ejecutarlo"""
+
+
+# Procesos de trabajo
+
+_CACHE: Optional[PassCache] = None
+
+
+def _start_worker(cache: Optional[PassCache]) -> None:
+    global _CACHE
+    _CACHE = cache
+
+
+def job_targets(job: Job, input_file: str, output_dir: Optional[str]) -> List[Target]:
+    """Perfiles del trabajo con sus archivos de salida (junto a la entrada o en output_dir)"""
+    names = [name.strip() for name in str(job.get('preset') or 'advanced').split(',') if name.strip()]
+    unknown = [name for name in names if name not in PRESETS]
+    if unknown or not names:
+        raise JobError(f"perfil desconocido: {', '.join(unknown)} (disponibles: {', '.join(PRESETS)})")
+    passes = job.get('passes')
+    base = os.path.splitext(input_file)[0]
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        base = os.path.join(output_dir, os.path.basename(base))
+    # Cada trabajo lleva su propio reporte: varios trabajos a la vez no comparten archivo
+    return [Target(PRESETS[name], resolve_passes(PRESETS[name], passes), f"{base}{PRESETS[name].suffix}.lua",
+                   f"{base}{PRESETS[name].suffix}_report.txt", not explicit_passes(passes))
+            for name in names]
+
+
+def target_result(target: Target, state: State, include_output: bool) -> Dict[str, Any]:
+    """Métricas de un perfil y, si se pide, el código desobfuscado"""
+    result: Dict[str, Any] = {
+        'preset': target.preset.name,
+        'stats': state_stats(state),
+        'fingerprint': state.get('fingerprint'),
+        'passes': [{'pass': record.name, 'seconds': round(record.seconds, 6), 'cached': record.cached}
+                   for record in state['profiler'].records],
+    }
+    if include_output:
+        if os.path.exists(target.output_file):
+            with open(target.output_file, 'r', encoding='utf-8', errors='surrogateescape') as f:
+                result['output'] = f.read()
+    else:
+        # Solo los archivos que escribe la cadena del perfil (output_file, report_file y sus registros)
+        for step in target.passes:
+            if step.writes:
+                result[step.writes] = getattr(target, step.writes)
+            if step.writes == 'report_file':
+                result['records_file'] = records_path(target.report_file)
+    return result
+
+
+def run_job(job: Job) -> Response:
+    """Ejecuta un trabajo en un proceso de trabajo y devuelve su respuesta"""
+    started = time.perf_counter()
+    response: Response = {'id': job.get('id')}
+    try:
+        with contextlib.ExitStack() as stack:
+            # Los mensajes del motor no deben mezclarse con las respuestas
+            stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+            if 'source' in job:
+                workdir = stack.enter_context(tempfile.TemporaryDirectory(prefix='lua_serve_'))
+                input_file = os.path.join(workdir, 'script.lua')
+                with open(input_file, 'w', encoding='utf-8', errors='surrogateescape') as f:
+                    f.write(str(job['source']))
+                output_dir = workdir
+            elif 'input' in job:
+                input_file = str(job['input'])
+                if not os.path.isfile(input_file):
+                    raise JobError(f"El archivo '{input_file}' no existe")
+                output_dir = job.get('output_dir')
+            else:
+                raise JobError("El trabajo necesita 'input' o 'source'")
+            include_output = bool(job.get('return_output', 'source' in job))
+            targets = job_targets(job, input_file, output_dir)
+            states = Engine(_CACHE, detect=job.get('fingerprint', True) is not False).run(input_file, targets)
+            response['results'] = [target_result(target, state, include_output)
+                                   for target, state in zip(targets, states)]
+        response['ok'] = True
+    except Exception as e:
+        response.update(ok=False, error=f"{type(e).__name__}: {e}")
+    response['seconds'] = round(time.perf_counter() - started, 6)
+    return response
+
+
+# Servicio
+
+class Channel:
+    """Destino de las respuestas de una conexión: una línea JSON por respuesta"""
+
+    def __init__(self, write: Callable[[str], None]):
+        self.write = write
+        self.condition = threading.Condition()
+        self.pending = 0
+
+    def expect(self) -> None:
+        with self.condition:
+            self.pending += 1
+
+    def send(self, response: Response, finished: bool = False) -> None:
+        with self.condition:
+            try:
+                self.write(json.dumps(response) + '\n')
+            except OSError:
+                pass  # el cliente se fue: el trabajo se pierde, el servicio sigue
+            if finished:
+                self.pending -= 1
+                self.condition.notify_all()
+
+    def drain(self) -> None:
+        """Espera a que se hayan enviado las respuestas de todos los trabajos de la conexión"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.pending == 0)
+
+
+class Server:
+    """Reparte los trabajos entre los procesos calientes y responde al terminar cada uno"""
+
+    def __init__(self, jobs: int, cache: Optional[PassCache] = None, defaults: Optional[Job] = None):
+        self.jobs = jobs
+        self.cache = cache
+        self.defaults = defaults or {}
+        self.pool = self.new_pool()
+        # Contrapresión: sin hueco, submit se bloquea y se deja de leer la entrada
+        self.slots = threading.BoundedSemaphore(jobs * QUEUE_PER_WORKER)
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.running = 0
+        self.served = 0
+        self.failed = 0
+        self.restarts = 0
+        self.started = time.perf_counter()
+
+    def new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(self.jobs, initializer=_start_worker, initargs=(self.cache,))
+
+    def replace_pool(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Procesos nuevos en lugar de un grupo roto (una sola vez, aunque fallen varios trabajos)"""
+        with self.lock:
+            if self.pool is broken:
+                self.pool = self.new_pool()
+                self.restarts += 1
+            pool = self.pool
+        broken.shutdown(wait=False)
+        return pool
+
+    def submit(self, line: str, channel: Channel) -> None:
+        """Atiende una línea de la entrada"""
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise JobError("cada línea debe ser un objeto JSON")
+        except ValueError as e:
+            channel.send({'id': None, 'ok': False, 'error': f"JSON inválido: {e}"})
+            return
+        if 'cmd' in job:
+            channel.send(self.command(job))
+            return
+
+        job = {**self.defaults, **job}
+        self.slots.acquire()
+        with self.lock:
+            self.running += 1
+        channel.expect()
+        pool = self.pool
+        try:
+            try:
+                future = pool.submit(run_job, job)
+            except BrokenProcessPool:
+                # Un proceso murió en un trabajo anterior: este aún no ha empezado, va a procesos nuevos
+                pool = self.replace_pool(pool)
+                future = pool.submit(run_job, job)
+        except Exception as e:
+            self.complete(channel, {'id': job.get('id'), 'ok': False, 'error': f"{type(e).__name__}: {e}"})
+            return
+        future.add_done_callback(lambda done: self.finish(done, pool, job, channel))
+
+    def finish(self, future: Future, pool: ProcessPoolExecutor, job: Job, channel: Channel) -> None:
+        try:
+            response = future.result()
+        except Exception as e:
+            # El proceso de trabajo murió (memoria, señal): el trabajo falla, el servicio sigue con procesos nuevos
+            if isinstance(e, BrokenProcessPool):
+                self.replace_pool(pool)
+            response = {'id': job.get('id'), 'ok': False, 'error': f"{type(e).__name__}: {e}"}
+        self.complete(channel, response)
+
+    def complete(self, channel: Channel, response: Response) -> None:
+        """Libera el hueco del trabajo y envía su respuesta"""
+        with self.lock:
+            self.running -= 1
+            self.served += 1
+            self.failed += not response.get('ok')
+        self.slots.release()
+        channel.send(response, finished=True)
+
+    def command(self, job: Job) -> Response:
+        """Órdenes de control: ping, stats y shutdown"""
+        command = job['cmd']
+        response: Response = {'id': job.get('id'), 'ok': True, 'cmd': command}
+        if command == 'ping':
+            response['pid'] = os.getpid()
+        elif command == 'stats':
+            with self.lock:
+                response.update(workers=self.jobs, running=self.running, served=self.served,
+                                failed=self.failed, restarts=self.restarts, uptime=round(time.perf_counter() - self.started, 3))
+        elif command == 'shutdown':
+            self.stopping.set()
+        else:
+            response.update(ok=False, error=f"orden desconocida: {command}")
+        return response
+
+    def close(self) -> None:
+        """Espera a los trabajos pendientes y cierra los procesos"""
+        self.pool.shutdown(wait=True)
+
+
+def serve_stdin(server: Server) -> None:
+    """Lee trabajos de la entrada estándar hasta EOF o shutdown; responde por la salida estándar"""
+    def write(text: str) -> None:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    channel = Channel(write)
+    for line in sys.stdin:
+        if line.strip():
+            server.submit(line, channel)
+        if server.stopping.is_set():
+            break
+    channel.drain()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        channel = Channel(lambda text: (self.wfile.write(text.encode('utf-8')), self.wfile.flush()))
+        server: Server = self.server.engine
+        for raw in self.rfile:
+            line = raw.decode('utf-8', 'surrogateescape')
+            if line.strip():
+                server.submit(line, channel)
+            if server.stopping.is_set():
+                # shutdown() espera a serve_forever: se pide desde otro hilo
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                break
+        channel.drain()
+
+
+def serve_socket(server: Server, path: str) -> None:
+    """Atiende conexiones en un socket Unix, cada una con sus líneas de trabajos"""
+    if not hasattr(socket, 'AF_UNIX'):
+        raise OSError("Este sistema no tiene sockets Unix: use --serve sin --socket (entrada estándar)")
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.unlink(path)  # socket de una ejecución anterior que ya no escucha
+        else:
+            raise OSError(f"Ya hay un servicio escuchando en {path}")
+        finally:
+            probe.close()
+
+    class UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+    with UnixServer(path, _Handler) as unix_server:
+        unix_server.engine = server
+        os.chmod(path, 0o600)
+        print(f"🔌 Escuchando en {path}", file=sys.stderr)
+        try:
+            unix_server.serve_forever()
+        finally:
+            os.unlink(path)
+
+
+def serve(jobs: int, cache: Optional[PassCache] = None, defaults: Optional[Job] = None,
+          socket_path: Optional[str] = None) -> None:
+    """Punto de entrada de --serve: los mensajes van a stderr, las respuestas a stdout o al socket"""
+    server = Server(jobs, cache, defaults)
+    print(f"🛰️ Servicio de desobfuscación con {jobs} procesos (cola de {jobs * QUEUE_PER_WORKER})",
+          file=sys.stderr)
+    try:
+        if socket_path:
+            serve_socket(server, socket_path)
+        else:
+            serve_stdin(server)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        print(f"🛰️ Servicio detenido: {server.served} trabajos, {server.failed} fallidos", file=sys.stderr)
+
+
+def request(path: str, jobs: List[Job]) -> List[Response]:
+    """Envía trabajos a un servicio por su socket y devuelve las respuestas en orden de llegada"""
+    with socket.socket(socket.AF_UNIX) as client:
+        client.connect(path)
+        client.sendall(''.join(json.dumps(job) + '\n' for job in jobs).encode('utf-8'))
+        client.shutdown(socket.SHUT_WR)
+        with client.makefile('r', encoding='utf-8') as replies:
+            return [json.loads(line) for line in replies if line.strip()]
+
+
+def main():
+    """Cliente mínimo: envía archivos a un servicio que escucha en un socket"""
+    if len(sys.argv) < 3:
+        print("💡 Uso: python lua_server.py <socket> <archivo.lua> [...]")
+        print("💡 Servicio: python lua_engine.py --serve --socket /tmp/lua.sock")
+        return
+    jobs = [{'id': k, 'input': os.path.abspath(path)} for k, path in enumerate(sys.argv[2:], 1)]
+    for response in request(sys.argv[1], jobs):
+        if not response.get('ok'):
+            print(f"❌ [{response.get('id')}] {response.get('error')}")
+            continue
+        for result in response['results']:
+            print(f"✅ [{response['id']}] {result['preset']}: {result.get('output_file', '(código en la respuesta)')} "
+                  f"en {response['seconds']:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""
+Reconstrucción de la tabla de strings del obfuscador
+Detecta la rotación por inversiones de rangos y la función de acceso
+l(n) = J[n - K], y resuelve las llamadas a sus strings finales
+"""
+
+import base64
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from lua_lexer import Token, string_value, NAME, NUMBER, STRING
+from lua_folding import evaluate
+from lua_ast import Node, Local, LocalFunction, Assign, CompoundAssign, Number, Name, Index
+from lua_parser import parse
+from lua_scope import Binding, ScopeResolver
+
+Range = Tuple[int, int]
+
+
+def constant_value(tokens: List[Token], start: int, end: int) -> Optional[int]:
+    """Evalúa tokens[start:end] si es una expresión entera constante
+
+    Acepta tanto literales ya plegados como la forma en que el obfuscador
+    escribe los índices: -757900+757901.
+    """
+    value = evaluate(tokens, start, end)
+    if value is None or not value.is_integer():
+        return None
+    return int(value)
+
+
+def _closing(tokens: List[Token], open_index: int) -> int:
+    """Índice del delimitador que cierra el abierto en open_index, o -1"""
+    opening = tokens[open_index].value
+    closing = {'(': ')', '[': ']', '{': '}'}[opening]
+    depth = 0
+    for i in range(open_index, len(tokens)):
+        value = tokens[i].value
+        if tokens[i].kind == STRING:
+            continue
+        if value == opening:
+            depth += 1
+        elif value == closing:
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+
+def find_string_table(tokens: List[Token]) -> Optional[Tuple[str, int, int]]:
+    """Localiza local VAR = {...} y devuelve (VAR, inicio, fin) en índices de token"""
+    for i in range(len(tokens) - 3):
+        if (tokens[i].value == 'local' and tokens[i + 1].kind == NAME
+                and tokens[i + 2].value == '=' and tokens[i + 3].value == '{'):
+            close = _closing(tokens, i + 3)
+            if close < 0:
+                return None
+            return tokens[i + 1].value, i + 4, close
+    return None
+
+
+def find_rotation(tokens: List[Token], table_name: str,
+                  search_from: int = 0) -> Optional[Tuple[List[Range], int, int]]:
+    """Detecta el bucle de rotación por inversiones que sigue a la tabla
+
+    Reconoce:
+        for _,R in ipairs({{a,b},{c,d},...}) do
+            while R[1] < R[2] do
+                T[R[1]], T[R[2]], R[1], R[2] = T[R[2]], T[R[1]], R[1]+1, R[2]-1
+            end
+        end
+    y devuelve (rangos, índice inicial, índice final) del bucle.
+    """
+    limit = min(len(tokens) - 8, search_from + 64)
+    for i in range(search_from, limit):
+        if tokens[i].value != 'for':
+            continue
+        if not (tokens[i + 1].kind == NAME and tokens[i + 2].value == ','
+                and tokens[i + 3].kind == NAME and tokens[i + 4].value == 'in'
+                and tokens[i + 5].value == 'ipairs' and tokens[i + 6].value == '('
+                and tokens[i + 7].value == '{'):
+            continue
+
+        pair_name = tokens[i + 3].value
+        list_end = _closing(tokens, i + 7)
+        if list_end < 0:
+            return None
+
+        # Rangos {a,b} separados por , o ;
+        ranges: List[Range] = []
+        j = i + 8
+        while j < list_end:
+            if tokens[j].value in (',', ';'):
+                j += 1
+                continue
+            if tokens[j].value != '{':
+                return None
+            close = _closing(tokens, j)
+            comma = next((k for k in range(j + 1, close)
+                          if tokens[k].value in (',', ';')), -1)
+            if comma < 0:
+                return None
+            low = constant_value(tokens, j + 1, comma)
+            high = constant_value(tokens, comma + 1, close)
+            if low is None or high is None:
+                return None
+            ranges.append((low, high))
+            j = close + 1
+
+        if tokens[list_end + 1].value != ')':
+            return None
+        loop_end = _match_swap_loop(tokens, list_end + 2, table_name, pair_name)
+        if loop_end < 0:
+            return None
+        return ranges, i, loop_end
+    return None
+
+
+# Forma normalizada del cuerpo del bucle tras evaluar las constantes
+_SWAP_TEMPLATE = (
+    "do while {R} [ 1 ] < {R} [ 2 ] do "
+    "{T} [ {R} [ 1 ] ] , {T} [ {R} [ 2 ] ] , {R} [ 1 ] , {R} [ 2 ] = "
+    "{T} [ {R} [ 2 ] ] , {T} [ {R} [ 1 ] ] , {R} [ 1 ] + 1 , {R} [ 2 ] - 1 end end"
+)
+
+_CONSTANT_PARTS = frozenset({'+', '-', '(', ')'})
+
+
+def _match_swap_loop(tokens: List[Token], start: int, table_name: str, pair_name: str) -> int:
+    """Comprueba que el cuerpo del bucle intercambia extremos; devuelve su último índice"""
+    expected = _SWAP_TEMPLATE.format(R=pair_name, T=table_name).split()
+    normalized: List[str] = []
+    i = start
+    count = len(tokens)
+    while len(normalized) < len(expected) and i < count:
+        token = tokens[i]
+        # + y - tras un operando son binarios: se copian tal cual
+        if token.value in ('+', '-') and normalized and normalized[-1] not in ('[', ',', '=', '<', 'do'):
+            normalized.append(token.value)
+            i += 1
+            continue
+        if token.kind == NUMBER or token.value in _CONSTANT_PARTS:
+            j = i
+            while j < count and (tokens[j].kind == NUMBER or tokens[j].value in _CONSTANT_PARTS):
+                j += 1
+            value = constant_value(tokens, i, j)
+            if value is not None:
+                normalized.append(str(value))
+                i = j
+                continue
+        normalized.append(token.value)
+        i += 1
+    return i - 1 if normalized == expected else -1
+
+
+def rotation_order(size: int, ranges: List[Range]) -> List[int]:
+    """Reproduce las inversiones sobre un arreglo de índices (base 0)
+
+    order[k] es la posición original de la string que queda en la posición k.
+    """
+    order = list(range(size))
+    for low, high in ranges:
+        low = max(low, 1)
+        high = min(high, size)
+        if low < high:
+            order[low - 1:high] = order[low - 1:high][::-1]
+    return order
+
+
+def find_accessor(tokens: List[Token], table_name: str,
+                  search_from: int = 0) -> Optional[Tuple[str, int]]:
+    """Detecta local function f(x) return T[x - K] end y devuelve (f, -K)"""
+    found = _locate_accessor(tokens, table_name, search_from)
+    return found[1:] if found is not None else None
+
+
+def _locate_accessor(tokens: List[Token], table_name: str,
+                     search_from: int = 0) -> Optional[Tuple[int, str, int]]:
+    """Como find_accessor, con el índice del token 'local' que declara la función delante"""
+    for i in range(search_from, len(tokens) - 12):
+        if not (tokens[i].value == 'local' and tokens[i + 1].value == 'function'
+                and tokens[i + 2].kind == NAME and tokens[i + 3].value == '('
+                and tokens[i + 4].kind == NAME and tokens[i + 5].value == ')'
+                and tokens[i + 6].value == 'return' and tokens[i + 7].value == table_name
+                and tokens[i + 8].value == '[' and tokens[i + 9].value == tokens[i + 4].value
+                and tokens[i + 10].value in ('+', '-')):
+            continue
+        close = _closing(tokens, i + 8)
+        if close < 0 or tokens[close + 1].value != 'end':
+            continue
+        offset = constant_value(tokens, i + 11, close)
+        if offset is None:
+            continue
+        if tokens[i + 10].value == '-':
+            offset = -offset
+        return i, tokens[i + 2].value, offset
+    return None
+
+
+def resolve_accessor_calls(tokens: List[Token], accessor: str, offset: int,
+                           literals: Dict[int, str], reads: Set[int]) -> Tuple[List[Token], int]:
+    """Sustituye cada f(<constante>) por el literal de la posición resuelta
+
+    literals usa índices base 1, como la tabla Lua. Solo se sustituyen
+    las f cuya posición está en reads (ver select_reads). Devuelve los
+    tokens nuevos y la cantidad de llamadas resueltas.
+    """
+    result: List[Token] = []
+    append = result.append
+    resolved = 0
+    i = 0
+    count = len(tokens)
+    while i < count:
+        token = tokens[i]
+        if (token.kind == NAME and token.value == accessor and i + 1 < count
+                and token.start in reads and tokens[i + 1].value == '('
+                and (i == 0 or tokens[i - 1].value not in ('.', ':', 'function'))):
+            close = _closing(tokens, i + 1)
+            if close > 0:
+                argument = constant_value(tokens, i + 2, close)
+                literal = None if argument is None else literals.get(argument + offset)
+                if literal is not None:
+                    append(Token(STRING, literal, token.start, tokens[close].end))
+                    resolved += 1
+                    i = close + 1
+                    continue
+        append(token)
+        i += 1
+    return result, resolved
+
+
+class ReadScan(NamedTuple):
+    """Cómo usan unos tokens los nombres de la tabla de strings y de su función de acceso"""
+    reads: Dict[str, Set[int]]                      # nombre -> posiciones de sus lecturas
+    writes: FrozenSet[Tuple[str, Optional[int]]]    # (nombre, None): se asigna; (nombre, n): nombre[n] = ...
+    visible: Dict[str, FrozenSet[str]]              # marca -> nombres ligados a su declaración donde se llama
+
+
+class TableReads(NamedTuple):
+    """Lo que se puede sustituir: posiciones de las lecturas por nombre y n de los T[n] que no son constantes"""
+    reads: Dict[str, Set[int]]
+    written: FrozenSet[int]
+
+
+class _ReadResolver(ScopeResolver):
+    """Resolución de ámbitos que anota qué lecturas y asignaciones usan una declaración dada
+
+    declarations da el índice del token 'local' que declara cada nombre
+    vigilado, si está en estos tokens; outer, los nombres que al empezar
+    ya se refieren a su declaración (los tokens son el cuerpo de una
+    función de dentro de su ámbito). Las asignaciones (x = ..., x[k] = ...)
+    no cuentan como lecturas.
+    """
+
+    def __init__(self, tokens: List[Token], names: Iterable[str], declarations: Dict[str, int],
+                 outer: FrozenSet[str], marks: Optional[str]):
+        super().__init__()
+        self.tokens = tokens
+        self.watched = frozenset(names)
+        self.declarations = declarations
+        self.outer = outer
+        self.marks = marks
+        self.declared: Dict[str, Binding] = {}
+        self.reads: Dict[str, Set[int]] = {name: set() for name in self.watched}
+        self.writes: Set[Tuple[str, Optional[int]]] = set()
+        self.visible: Dict[str, FrozenSet[str]] = {}
+        self.assigned: Set[int] = set()                 # id(Name) a la izquierda de '='
+        self.indexed: Set[int] = set()                  # id(Name) de x[k] a la izquierda de '='
+        self.keys: Dict[int, int] = {}                  # id(Name) de x[n] -> n
+
+    def bound(self, name: str, binding: Optional[Binding]) -> bool:
+        if binding is None:
+            return name in self.outer
+        return binding is self.declared.get(name)
+
+    def statement(self, node: Node) -> None:
+        if isinstance(node, (Assign, CompoundAssign)):
+            for target in node.targets if isinstance(node, Assign) else [node.target]:
+                if isinstance(target, Name):
+                    self.assigned.add(id(target))
+                elif isinstance(target, Index) and isinstance(target.value, Name):
+                    self.indexed.add(id(target.value))
+        super().statement(node)
+        if isinstance(node, (Local, LocalFunction)) and node.span is not None:
+            for name, start in self.declarations.items():
+                if start == node.span[0]:
+                    self.declared[name] = self.lookup(name)
+
+    def expression(self, node: Node) -> None:
+        if isinstance(node, Index) and isinstance(node.value, Name) and isinstance(node.key, Number) \
+                and node.key.text.isdigit():
+            self.keys[id(node.value)] = int(node.key.text)
+        super().expression(node)
+
+    def reference(self, name, site) -> Optional[Binding]:
+        binding = super().reference(name, site)
+        if site[1] != 'id':
+            return binding
+        if self.marks is not None and name.startswith(self.marks):
+            self.visible[name] = frozenset(other for other in self.watched
+                                           if self.bound(other, self.lookup(other)))
+        if name not in self.watched or not self.bound(name, binding):
+            return binding
+        node = site[0]
+        if id(node) in self.assigned:
+            self.writes.add((name, None))
+        elif id(node) in self.indexed:
+            if id(node) in self.keys:
+                self.writes.add((name, self.keys[id(node)]))
+        else:
+            self.reads[name].add(self.tokens[node.span[0]].start)
+        return binding
+
+
+def scan_reads(tokens: List[Token], names: Iterable[str], declarations: Dict[str, int],
+               outer: FrozenSet[str] = frozenset(), marks: Optional[str] = None) -> ReadScan:
+    """Lecturas y asignaciones de cada nombre ligadas a su declaración
+
+    Una local o un parámetro que se llame igual tapa la declaración y sus
+    usos no se incluyen. Con marks, anota además qué nombres ven su
+    declaración en cada llamada a un nombre que empiece por marks (las
+    unidades de lua_watch). Lanza LuaSyntaxError si los tokens no se
+    pueden analizar.
+    """
+    resolver = _ReadResolver(tokens, names, declarations, outer, marks)
+    resolver.resolve(parse(tokens))
+    return ReadScan(resolver.reads, frozenset(resolver.writes), resolver.visible)
+
+
+def select_reads(reads: Dict[str, Set[int]], writes: FrozenSet[Tuple[str, Optional[int]]],
+                 table_name: str) -> TableReads:
+    """Lecturas que siguen valiendo la constante
+
+    Si el script asigna una local, ninguna de sus lecturas es fiable, y si
+    asigna la tabla tampoco las de la función de acceso, que la lee. Si
+    asigna T[n] con n constante, ni T[n] ni la llamada que lee esa
+    posición se sustituyen (written).
+    """
+    if (table_name, None) in writes:
+        return TableReads({name: set() for name in reads}, frozenset())
+    return TableReads({name: found if (name, None) not in writes else set() for name, found in reads.items()},
+                      frozenset(key for name, key in writes if name == table_name and key is not None))
+
+
+def table_declarations(tokens: List[Token], table_name: str,
+                       search_from: int = 0) -> Dict[str, int]:
+    """Índice del token 'local' que declara la tabla y la función de acceso, si están en tokens"""
+    declarations: Dict[str, int] = {}
+    location = find_string_table(tokens)
+    if location is not None and location[0] == table_name:
+        declarations[table_name] = location[1] - 4
+    found = _locate_accessor(tokens, table_name, search_from)
+    if found is not None:
+        declarations[found[1]] = found[0]
+    return declarations
+
+
+def table_reads(tokens: List[Token], table_name: str, accessor: Optional[Tuple[str, int]],
+                search_from: int = 0) -> TableReads:
+    """Lecturas de la tabla de strings y de su función de acceso declaradas en tokens"""
+    names = [table_name] + ([accessor[0]] if accessor else [])
+    declarations = table_declarations(tokens, table_name, search_from)
+    if table_name not in declarations:
+        return TableReads({name: set() for name in names}, frozenset())
+    scan = scan_reads(tokens, names, {name: declarations[name] for name in names if name in declarations})
+    return select_reads(scan.reads, scan.writes, table_name)
+
+
+def substitute_table_references(tokens: List[Token], table_name: str,
+                                literals: Dict[int, str], reads: Set[int]) -> List[Token]:
+    """Reemplaza las referencias T[n] por su literal en una sola pasada
+
+    Recorrido lineal: NAME '[' NUMBER ']' con consulta por clave exacta,
+    de modo que T[1] nunca coincide dentro de T[10]. Solo se sustituyen
+    los T cuya posición está en reads (ver select_reads).
+    """
+    result: List[Token] = []
+    append = result.append
+    i = 0
+    count = len(tokens)
+    while i < count:
+        token = tokens[i]
+        if (token.kind == NAME and token.value == table_name and i + 3 < count
+                and token.start in reads
+                and tokens[i + 1].value == '[' and tokens[i + 2].kind == NUMBER
+                and tokens[i + 3].value == ']' and tokens[i + 2].value.isdigit()):
+            literal = literals.get(int(tokens[i + 2].value))
+            if literal is not None:
+                append(Token(STRING, literal, token.start, tokens[i + 3].end))
+                i += 4
+                continue
+        append(token)
+        i += 1
+    return result
+
+
+_STANDARD_ALPHABET = b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/'
+
+
+def find_alphabet(tokens: List[Token], search_from: int = 0,
+                  search_limit: int = 4096) -> Optional[Tuple[Dict[int, int], int]]:
+    """Busca la tabla local U={c=v,...} que asigna 64 símbolos a los valores 0..63
+
+    Devuelve (byte del símbolo -> valor, índice del token donde empieza la tabla).
+    """
+    limit = min(len(tokens) - 3, search_from + search_limit)
+    for i in range(search_from, limit):
+        if not (tokens[i].value == 'local' and tokens[i + 1].kind == NAME
+                and tokens[i + 2].value == '=' and tokens[i + 3].value == '{'):
+            continue
+        close = _closing(tokens, i + 3)
+        if close < 0:
+            continue
+        alphabet = _alphabet_entries(tokens, i + 4, close)
+        if alphabet is not None:
+            return alphabet, i
+    return None
+
+
+def _alphabet_entries(tokens: List[Token], start: int, end: int) -> Optional[Dict[int, int]]:
+    """Lee las entradas de un constructor si forman un alfabeto de 64 símbolos"""
+    alphabet: Dict[int, int] = {}
+    j = start
+    while j < end:
+        if tokens[j].value in (',', ';'):
+            j += 1
+            continue
+        # Clave: nombre de un carácter o ["x"]
+        if tokens[j].kind == NAME and tokens[j + 1].value == '=':
+            key = tokens[j].value.encode('ascii')
+            j += 2
+        elif tokens[j].value == '[' and tokens[j + 1].kind == STRING and tokens[j + 2].value == ']' \
+                and tokens[j + 3].value == '=':
+            key = string_value(tokens[j + 1].value)
+            j += 4
+        else:
+            return None
+        if len(key) != 1:
+            return None
+        # Valor: expresión constante hasta el siguiente separador
+        k = j
+        while k < end and tokens[k].value not in (',', ';'):
+            k += 1
+        value = constant_value(tokens, j, k)
+        if value is None or not 0 <= value < 64:
+            return None
+        alphabet[key[0]] = value
+        j = k
+    if len(alphabet) != 64 or len(set(alphabet.values())) != 64:
+        return None
+    return alphabet
+
+
+def decode_base64_batch(values: List[bytes], alphabet: Dict[int, int]) -> List[bytes]:
+    """Decodifica todas las strings con un alfabeto base64 propio en un solo lote
+
+    Cada símbolo se traduce al alfabeto estándar con bytes.translate y los
+    bytes ajenos al alfabeto se eliminan. Se imita el bucle Lua: solo un
+    grupo de 4 símbolos completo da bytes, y al primer '=' el grupo a
+    medias da uno (si le sigue otro '=') o dos, y se termina; sin '=' el
+    grupo incompleto del final se pierde. Todos los grupos se concatenan y
+    se decodifican con una sola llamada a base64.b64decode; después se
+    recorta cada resultado a su longitud real.
+    """
+    source = bytes(alphabet)
+    target = bytes(_STANDARD_ALPHABET[alphabet[symbol]] for symbol in source)
+    table = bytes.maketrans(source, target)
+    delete = bytes(b for b in range(256) if b not in alphabet)
+    padding = 0x3D not in alphabet
+
+    chunks: List[bytes] = []
+    lengths: List[int] = []
+    for value in values:
+        cut = value.find(b'=') if padding else -1
+        if cut < 0:
+            body = value.translate(table, delete)
+            body = body[:len(body) - len(body) % 4]
+            lengths.append(len(body) * 3 // 4)
+            chunks.append(body)
+            continue
+        # El '=' completa con ceros el grupo a medias (o uno vacío) y da sus primeros bytes
+        body = value[:cut].translate(table, delete)
+        complete = len(body) - len(body) % 4
+        lengths.append(complete * 3 // 4 + (1 if value[cut + 1:cut + 2] == b'=' else 2))
+        chunks.append(body + b'A' * (4 - len(body) % 4))
+
+    decoded = base64.b64decode(b''.join(chunks))
+
+    results: List[bytes] = []
+    offset = 0
+    for chunk, length in zip(chunks, lengths):
+        results.append(decoded[offset:offset + length])
+        offset += len(chunk) * 3 // 4
+    return results
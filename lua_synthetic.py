@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Generador de scripts obfuscados sintéticos
+Produce archivos con la misma forma que inkgame.lua y del tamaño pedido:
+una tabla de strings en base64 con alfabeto propio y escapes decimales,
+rotada por inversiones de rangos y leída a través de l(n) = J[n - K];
+constantes escritas como sumas y restas; y funciones aplanadas en un
+despachador 'while M do if M < K then ... end end' con secuencias,
+bifurcaciones y bucles. La salida es determinista para cada semilla.
+"""
+
+import base64
+import random
+import string
+import sys
+from typing import Dict, List, Tuple
+
+_STANDARD_ALPHABET = string.ascii_uppercase + string.ascii_lowercase + string.digits + '+/'
+
+# Globales que se guardan en la tabla de strings para leerlas del entorno
+_GLOBALS = ('tostring', 'type', 'tonumber', 'select', 'rawequal')
+
+_WORDS = ('player', 'score', 'level', 'enemy', 'health', 'damage', 'spawn', 'timer',
+          'weapon', 'inventory', 'quest', 'target', 'remote', 'event', 'character',
+          'position', 'velocity', 'render', 'update', 'connect', 'service', 'module')
+
+# Nombres cortos como los del obfuscador (sin palabras reservadas)
+_NAMES = [a for a in string.ascii_letters if a not in ('M', 'J', 'E', 'l')] + [
+    a + b for a in string.ascii_letters for b in string.ascii_letters + string.digits
+    if a + b not in ('do', 'if', 'in', 'or')]
+
+# Bloques por función (el tamaño del archivo crece con el número de funciones)
+MIN_STATES = 24
+MAX_STATES = 160
+
+# Contadores de bucle por función (Lua admite 200 locales)
+MAX_LOOPS = 48
+
+# Bytes de archivo por string de la tabla (inkgame: 1158 strings en 242 KB)
+BYTES_PER_STRING = 210
+
+
+class ScriptGenerator:
+    """Construye un script obfuscado pieza a pieza con un generador aleatorio propio"""
+
+    def __init__(self, seed: int = 0):
+        self.random = random.Random(seed)
+
+    # Piezas básicas
+
+    def number(self, value: int) -> str:
+        """Constante escrita como suma o resta de dos enteros grandes, p. ej. -757900+757901"""
+        rng = self.random
+        a = rng.randint(-1048576, 1048576)
+        b = value - a
+        form = rng.randrange(3)
+        if form == 0:
+            return f"{a}+{b}" if b >= 0 else f"{a}+-{-b}"
+        if form == 1:
+            return f"{a}-{-b}" if b <= 0 else f"{a}-(-{b})"
+        # a - c con c = a - value
+        c = a - value
+        return f"{a}-{c}" if c >= 0 else f"{a}-(-{-c})"
+
+    def operand(self, value: int) -> str:
+        """Constante entre paréntesis, para usarla como operando"""
+        return f"({self.number(value)})"
+
+    @staticmethod
+    def escape(text: str) -> str:
+        """Literal Lua con cada carácter como escape decimal de tres cifras"""
+        return '"' + ''.join(f"\\{ord(c):03d}" for c in text) + '"'
+
+    def plain_strings(self, count: int) -> List[str]:
+        rng = self.random
+        values = list(_GLOBALS)
+        while len(values) < count:
+            form = rng.randrange(3)
+            if form == 0:
+                values.append(f"{rng.choice(_WORDS)}_{rng.randrange(1000)}")
+            elif form == 1:
+                values.append(' '.join(rng.choice(_WORDS) for _ in range(rng.randint(2, 6))))
+            else:
+                values.append(''.join(rng.choice(string.ascii_letters) for _ in range(rng.randint(4, 20))))
+        return values[:count]
+
+    # Tabla de strings
+
+    def string_table(self, values: List[str]) -> Tuple[List[str], Dict[str, int], str]:
+        """Codifica las strings y devuelve (tabla, alfabeto símbolo -> valor, código de rotación)"""
+        rng = self.random
+        symbols = list(_STANDARD_ALPHABET)
+        rng.shuffle(symbols)
+        translate = str.maketrans(_STANDARD_ALPHABET, ''.join(symbols))
+        encoded = [base64.b64encode(value.encode('utf-8')).decode('ascii').translate(translate)
+                   for value in values]
+
+        # Tres inversiones equivalen a una rotación; se deshacen en orden inverso para guardar la tabla
+        size = len(encoded)
+        cut = rng.randint(1, size - 1)
+        ranges = [(1, size), (1, cut), (cut + 1, size)]
+        stored = list(encoded)
+        for low, high in reversed(ranges):
+            stored[low - 1:high] = stored[low - 1:high][::-1]
+
+        pairs = ';'.join(f"{{{self.number(low)},{self.number(high)}}}" for low, high in ranges)
+        one, two = (lambda: self.number(1)), (lambda: self.number(2))
+        rotation = (f"for l,M in ipairs({{{pairs}}})do while M[{one()}]<M[{two()}]do "
+                    f"J[M[{one()}]],J[M[{two()}]],M[{one()}],M[{two()}]="
+                    f"J[M[{two()}]],J[M[{one()}]],M[{one()}]+({self.number(1)}),"
+                    f"M[{two()}]-({self.number(1)})end end")
+        alphabet = {symbol: value for value, symbol in enumerate(symbols)}
+        return stored, alphabet, rotation
+
+    def decoder(self, alphabet: Dict[str, int]) -> str:
+        """Bucle que decodifica la tabla en su lugar, como el del obfuscador"""
+        entries = []
+        for symbol, value in sorted(alphabet.items(), key=lambda item: self.random.random()):
+            key = symbol if symbol.isalpha() else f"[{self.escape(symbol)}]"
+            entries.append(f"{key}={self.number(value)}")
+        n = self.number
+        return (
+            "do local l=table.insert local M=math.floor local v=string.sub local O=string.len "
+            "local z=table.concat local j=type local h=J local i=string.char "
+            f"local U={{{','.join(entries)}}}"
+            f"for J={n(1)},#h,{n(1)} do local a=h[J]if j(a)=={self.escape('string')}then "
+            f"local j=O(a)local e={{}}local V={n(1)} local s={n(0)} local E={n(0)} "
+            "while V<=j do local J=v(a,V,V)local O=U[J]if O then "
+            f"s=s+O*({n(64)})^(({n(3)})-E)E=E+({n(1)})if E=={n(4)} then E={n(0)} "
+            f"local J=M(s/({n(65536)}))local v=M((s%({n(65536)}))/({n(256)}))"
+            f"local O=s%({n(256)})l(e,i(J,v,O))s={n(0)} end "
+            f"elseif J=={self.escape('=')}then l(e,i(M(s/({n(65536)}))))"
+            f"if V>=j or v(a,V+({n(1)}),V+({n(1)}))~={self.escape('=')}then "
+            f"l(e,i(M((s%({n(65536)}))/({n(256)}))))end break end "
+            f"V=V+({n(1)})end h[J]=z(e)end end end"
+        )
+
+    # Funciones aplanadas
+
+    def function(self, strings: int, offset: int) -> str:
+        """Una función anónima cuyo cuerpo es un despachador de estados"""
+        rng = self.random
+        count = rng.randint(MIN_STATES, MAX_STATES)
+        states = rng.sample(range(1, 16777216), count + 1)
+        numbers = rng.sample(_NAMES, 6)
+        texts = rng.sample([n for n in _NAMES if n not in numbers], 4)
+        counters: List[str] = []
+
+        def string_ref() -> str:
+            return f"l({self.number(rng.randrange(1, strings + 1) + offset)})"
+
+        def global_ref(name: str) -> str:
+            return f"E[l({self.number(_GLOBALS.index(name) + 1 + offset)})]"
+
+        def statement() -> str:
+            form = rng.randrange(6)
+            target = rng.choice(numbers)
+            if form == 0:
+                return f"{target}={self.number(rng.randint(-9999, 9999))}"
+            if form == 1:
+                return f"{target}=({rng.choice(numbers)}+({self.number(rng.randint(1, 9999))}))%{self.operand(65536)}"
+            if form == 2:
+                return f"{rng.choice(texts)}={string_ref()}"
+            if form == 3:
+                return f"{rng.choice(texts)}={rng.choice(texts)}..{string_ref()}"
+            if form == 4:
+                return f"{rng.choice(texts)}={global_ref('tostring')}({rng.choice(numbers)})"
+            return f"{target}=#{rng.choice(texts)}"
+
+        def body() -> str:
+            return ' '.join(statement() for _ in range(rng.randint(1, 5)))
+
+        # Los bloques se generan en orden y cada uno salta a estados posteriores,
+        # salvo el último de un bucle, que vuelve a su cabecera
+        blocks: Dict[int, str] = {}
+        i = 0
+        while i < count:
+            kind = rng.randrange(10)
+            remaining = count - i
+            if kind < 2 and remaining >= 4:
+                # if/else: una rama salta a la otra o ambas llegan a la unión
+                test = f"{rng.choice(numbers)}<{self.number(rng.randint(-5000, 5000))}"
+                blocks[states[i]] = f"{body()} M={test} and {self.number(states[i + 1])} or {self.number(states[i + 2])}"
+                blocks[states[i + 1]] = f"{body()} M={self.number(states[i + 3])}"
+                blocks[states[i + 2]] = f"{body()} M={self.number(states[i + 3])}"
+                i += 3
+            elif kind < 3 and remaining >= 4 and len(counters) < MAX_LOOPS:
+                # Bucle de tres vueltas con un contador propio
+                counter = rng.choice([n for n in _NAMES if n not in numbers and n not in texts
+                                      and n not in counters])
+                counters.append(counter)
+                length = rng.randint(1, min(3, remaining - 2))
+                header = i + 1
+                blocks[states[i]] = f"{body()} {counter}={self.number(0)} M={self.number(states[header])}"
+                for k in range(header, header + length - 1):
+                    blocks[states[k]] = f"{body()} M={self.number(states[k + 1])}"
+                last = header + length - 1
+                blocks[states[last]] = (f"{body()} {counter}={counter}+({self.number(1)}) "
+                                        f"M={counter}<{self.operand(3)} and {self.number(states[header])} "
+                                        f"or {self.number(states[last + 1])}")
+                i = last + 1
+            else:
+                blocks[states[i]] = f"{body()} M={self.number(states[i + 1])}"
+                i += 1
+        # El último estado termina la función
+        blocks[states[count]] = f"{body()} M=nil"
+
+        ordered = sorted(blocks)
+
+        def tree(low: int, high: int) -> str:
+            if high - low == 1:
+                return blocks[ordered[low]]
+            middle = (low + high) // 2
+            cut = rng.randint(ordered[middle - 1] + 1, ordered[middle])
+            return f"if M<{self.number(cut)} then {tree(low, middle)} else {tree(middle, high)} end"
+
+        names = numbers + texts + counters
+        values = [self.number(0)] * len(numbers) + ['""'] * len(texts) + [self.number(0)] * len(counters)
+        return (f"function()local M={self.number(states[0])} "
+                f"local {','.join(names)}={','.join(values)} "
+                f"while M do {tree(0, len(ordered))} end "
+                f"return {numbers[0]},{texts[0]} end")
+
+    # Script completo
+
+    def generate(self, size: int) -> str:
+        """Script de aproximadamente size bytes"""
+        rng = self.random
+        strings = max(len(_GLOBALS) + 3, size // BYTES_PER_STRING)
+        offset = rng.randint(1000, 999999)
+        stored, alphabet, rotation = self.string_table(self.plain_strings(strings))
+
+        separators = (',', ';')
+        table = ''.join(self.escape(value) + rng.choice(separators) for value in stored)[:-1]
+        head = (f"return(function(...)local J={{{table}}}{rotation} "
+                f"local function l(l)return J[l-({self.number(offset)})]end {self.decoder(alphabet)} "
+                "return(function(E,...)local F={}")
+        tail = (f" for J={self.number(1)},#F do F[J]()end "
+                "end)(getfenv and getfenv()or _ENV,...)end)(...)\n")
+
+        # Las funciones van en una tabla: su número no está limitado por los locales de Lua
+        parts = [head]
+        total = len(head) + len(tail)
+        functions = 0
+        while total < size or not functions:
+            functions += 1
+            code = f"F[{self.number(functions)}]={self.function(strings, offset)} "
+            parts.append(code)
+            total += len(code)
+        parts.append(tail)
+        return ''.join(parts)
+
+
+def parse_size(text: str) -> int:
+    """'10k', '5m', '2.5MB' o un número de bytes"""
+    text = text.strip().lower().rstrip('b')
+    factor = {'k': 1024, 'm': 1024 * 1024}.get(text[-1:], 1)
+    if factor != 1:
+        text = text[:-1]
+    return int(float(text) * factor)
+
+
+def generate_script(size: int, seed: int = 0) -> str:
+    return ScriptGenerator(seed).generate(size)
+
+
+def main():
+    """Escribe un script sintético del tamaño pedido"""
+    if len(sys.argv) < 3:
+        print("💡 Uso: python lua_synthetic.py <tamaño> <salida.lua> [semilla]")
+        print("💡 Ejemplo: python lua_synthetic.py 5m sintetico.lua")
+        return
+    size = parse_size(sys.argv[1])
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    code = generate_script(size, seed)
+    with open(sys.argv[2], 'w', encoding='utf-8') as f:
+        f.write(code)
+    print(f"🧪 {sys.argv[2]}: {len(code) / 1024:.1f} KB (semilla {seed})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+Paralelismo dentro de un archivo
+Parte el flujo de tokens en unidades independientes y las reparte entre
+procesos: el plegado de constantes por tramos, y el análisis, los
+comentarios y el formato de cada grupo de sentencias seguidas de un
+mismo bloque (los cuerpos de las funciones del script y los bloques que
+deja la recuperación del flujo). El resto del archivo forma un esqueleto
+pequeño, con una llamada __unidad_k() en el lugar de cada unidad, que se
+analiza e imprime en el proceso principal; el texto de cada unidad se
+cose en su sitio y en orden, así que la salida es idéntica a la de un
+solo proceso.
+
+Los procesos heredan los tokens y los datos de solo lectura (la tabla
+de strings, el perfil) al crearse con fork, sin copiarlos por tarea;
+donde no hay fork se envían una vez a cada proceso. De vuelta solo
+viajan texto y sustituciones pequeñas.
+"""
+
+import contextlib
+import gc
+import io
+import multiprocessing
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, TextIO, Tuple
+
+from lua_lexer import Token, NAME, STRING, KEYWORD, OP, tokenize_buffer
+from lua_folding import fold_range, apply_folds, fold_constants
+from lua_parser import parse
+from lua_ast import Chunk, Function, walk
+from lua_printer import write_lua, write_statements
+
+# Con menos tokens el archivo se procesa en un solo proceso: crear los procesos cuesta más que el trabajo
+MIN_PARALLEL_TOKENS = 50_000
+
+# Tareas por proceso: varias por proceso reparten mejor la carga desigual
+TASKS_PER_JOB = 4
+
+# Tamaño mínimo de una unidad; los grupos más pequeños se quedan en el esqueleto
+MIN_UNIT_TOKENS = 64
+
+MARKER = '__unidad_'
+PLACEHOLDER = re.compile(rf'^( *){MARKER}(\d+)\(\)$', re.MULTILINE)
+
+# Datos de solo lectura de los procesos de un shared_pool
+_SHARED: Dict[str, Any] = {}
+
+
+class Unit(NamedTuple):
+    """Sentencias seguidas de un mismo bloque: tokens[start:end]"""
+    start: int
+    end: int
+
+
+# Procesos con datos compartidos
+
+def _share(shared: Dict[str, Any]) -> None:
+    _SHARED.update(shared)
+
+
+@contextlib.contextmanager
+def shared_pool(jobs: int, **shared) -> Iterator[ProcessPoolExecutor]:
+    """Procesos que leen 'shared' sin recibirlo con cada tarea
+
+    Con fork (Linux, Android) los procesos heredan los datos del proceso
+    principal sin serializarlos; en el resto de sistemas se envían una
+    vez a cada proceso al crearlo.
+    """
+    forked = 'fork' in multiprocessing.get_all_start_methods()
+    if forked:
+        _SHARED.update(shared)
+        # Fuera del recolector: si un proceso recorriera los objetos heredados, copiaría sus páginas
+        gc.freeze()
+        pool = ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context('fork'))
+    else:
+        pool = ProcessPoolExecutor(jobs, initializer=_share, initargs=(shared,))
+    try:
+        with pool:
+            yield pool
+    finally:
+        _SHARED.clear()
+        if forked:
+            gc.unfreeze()
+
+
+def parallel(tokens: List[Token], jobs: int) -> bool:
+    """Indica si compensa repartir el archivo entre procesos"""
+    return jobs > 1 and len(tokens) >= MIN_PARALLEL_TOKENS
+
+
+# Plegado por tramos
+
+def fold_cuts(tokens: List[Token], parts: int) -> List[int]:
+    """Cortes del flujo en unas 'parts' partes sin partir ningún tramo constante
+
+    Un tramo plegable solo contiene números, operadores y paréntesis: un
+    nombre, una palabra clave o una string lo cortan siempre.
+    """
+    count = len(tokens)
+    cuts = [0]
+    for k in range(1, parts):
+        i = max(count * k // parts, cuts[-1] + 1)
+        while i < count and tokens[i].kind not in (NAME, KEYWORD, STRING):
+            i += 1
+        if i >= count:
+            break
+        cuts.append(i)
+    cuts.append(count)
+    return cuts
+
+
+def _fold_part(start: int, end: int):
+    return fold_range(_SHARED['tokens'], start, end)
+
+
+def fold_units(tokens: List[Token], jobs: int) -> Tuple[List[Token], int, int]:
+    """Pliega las constantes repartiendo tramos del flujo entre procesos
+
+    Cada proceso lee los tokens compartidos y devuelve solo sus
+    sustituciones, que se aplican en orden sobre la lista completa.
+    """
+    if not parallel(tokens, jobs):
+        return fold_constants(tokens)
+    cuts = fold_cuts(tokens, jobs * TASKS_PER_JOB)
+    with shared_pool(jobs, tokens=tokens) as pool:
+        parts = list(pool.map(_fold_part, cuts[:-1], cuts[1:]))
+    folds = [fold for part in parts for fold in part[0]]
+    return apply_folds(tokens, folds), sum(part[1] for part in parts), sum(part[2] for part in parts)
+
+
+# Unidades del árbol
+
+class _Body:
+    """Cuerpo de un bloque: dónde empiezan su primera sentencia y las que llevan palabra clave, y dónde acaba"""
+    __slots__ = ('opened', 'starts', 'end', 'children')
+
+    def __init__(self, opened: int, begin: int):
+        self.opened = opened
+        self.starts: List[int] = [begin]
+        self.end = begin
+        self.children: List['_Body'] = []
+
+    def start(self, i: int) -> None:
+        if self.starts[-1] != i:
+            self.starts.append(i)
+
+
+def block_bodies(tokens: List[Token]) -> Optional[_Body]:
+    """Bloques anidados del archivo a partir de sus palabras clave, sin analizarlo
+
+    Se anotan la primera sentencia de cada cuerpo y las que empiezan por
+    una palabra clave que no puede aparecer dentro de una expresión; entre
+    dos de ellas hay siempre sentencias completas. Devuelve None si las
+    palabras clave no cuadran (el analizador dará el error).
+    """
+    root = _Body(0, 0)
+    # Cuerpos abiertos; None es una cabecera (if, while, for) que espera su then/do
+    stack: List[Optional[_Body]] = [root]
+
+    def enclosing() -> _Body:
+        return next(body for body in reversed(stack) if body is not None)
+
+    def open_body(i: int, begin: int) -> _Body:
+        body = _Body(i, begin)
+        enclosing().children.append(body)
+        return body
+
+    count = len(tokens)
+
+    for i, token in enumerate(tokens):
+        if token.kind != KEYWORD:
+            continue
+        value = token.value
+        top = stack[-1]
+        if value in ('local', 'return', 'break'):
+            if top is not None:
+                top.start(i)
+        elif value in ('if', 'while', 'for'):
+            if top is None:
+                return None
+            top.start(i)
+            stack.append(None)
+        elif value in ('then', 'do'):
+            if top is None:
+                stack[-1] = open_body(i, i + 1)
+            elif value == 'do':
+                top.start(i)
+                stack.append(open_body(i, i + 1))
+            else:
+                return None
+        elif value == 'repeat':
+            if top is not None:
+                top.start(i)
+            stack.append(open_body(i, i + 1))
+        elif value == 'function':
+            # El cuerpo empieza tras la lista de parámetros, que no lleva paréntesis dentro
+            begin = i + 1
+            while begin < count and tokens[begin].value != ')':
+                begin += 1
+            stack.append(open_body(i, begin + 1))
+        elif value in ('elseif', 'else', 'end', 'until'):
+            if top is None or len(stack) == 1:
+                return None
+            top.end = i
+            stack.pop()
+            if value == 'elseif':
+                stack.append(None)
+            elif value == 'else':
+                stack.append(open_body(i, i + 1))
+    if len(stack) != 1:
+        return None
+    root.end = count
+    return root
+
+
+def _cover(body: _Body, size: int, units: List[Unit]) -> None:
+    """Agrupa las sentencias del bloque en unidades de unos 'size' tokens
+
+    Una sentencia más grande que eso se abre y se reparten sus bloques
+    internos (el cuerpo de una función, las ramas de un if); si no tiene
+    bloques, forma unidad ella sola.
+    """
+    bounds = body.starts + [body.end]
+    children = body.children
+    child = 0
+    run_start: Optional[int] = None
+
+    def flush(end: int) -> None:
+        if run_start is not None and end - run_start >= MIN_UNIT_TOKENS:
+            units.append(Unit(run_start, end))
+
+    for k in range(len(body.starts)):
+        start, stop = bounds[k], bounds[k + 1]
+        inner = []
+        while child < len(children) and children[child].opened < stop:
+            inner.append(children[child])
+            child += 1
+        if stop - start > size and inner:
+            flush(start)
+            run_start = None
+            for nested in inner:
+                _cover(nested, size, units)
+            continue
+        if run_start is None:
+            run_start = start
+        if stop - run_start >= size:
+            flush(stop)
+            run_start = None
+    flush(body.end)
+
+
+def task_size(tokens: int, jobs: int) -> int:
+    """Tokens por tarea para repartir 'tokens' en unas TASKS_PER_JOB tareas por proceso"""
+    return max(tokens // (jobs * TASKS_PER_JOB), MIN_UNIT_TOKENS)
+
+
+def find_units(tokens: List[Token], jobs: int) -> List[Unit]:
+    """Unidades en orden, ninguna mayor que una tarea si se puede abrir"""
+    root = block_bodies(tokens)
+    if root is None:
+        return []
+    units: List[Unit] = []
+    _cover(root, task_size(len(tokens), jobs), units)
+    return units
+
+
+def batches(units: List[Unit], size: int) -> List[List[int]]:
+    """Índices de unidades seguidas agrupadas en tareas de unos 'size' tokens"""
+    groups: List[List[int]] = []
+    current: List[int] = []
+    tokens = 0
+    for k, unit in enumerate(units):
+        current.append(k)
+        tokens += unit.end - unit.start
+        if tokens >= size:
+            groups.append(current)
+            current, tokens = [], 0
+    if current:
+        groups.append(current)
+    return groups
+
+
+def skeleton(tokens: List[Token], units: List[Unit]) -> List[Token]:
+    """Tokens del archivo con cada unidad sustituida por la llamada __unidad_k()"""
+    result: List[Token] = []
+    position = 0
+    for k, unit in enumerate(units):
+        result.extend(tokens[position:unit.start])
+        at = tokens[unit.start].start
+        result += [Token(NAME, f"{MARKER}{k}", at, at), Token(OP, '(', at, at), Token(OP, ')', at, at)]
+        position = unit.end
+    result.extend(tokens[position:])
+    return result
+
+
+def split_tree(tokens: List[Token], jobs: int, source=b'') -> Tuple[List[Token], List[Unit]]:
+    """Esqueleto que analiza el proceso principal y unidades para los demás procesos"""
+    # find y no 'in': con un mmap, 'in' solo busca un byte
+    if not parallel(tokens, jobs) or source.find(MARKER.encode()) >= 0:
+        return tokens, []
+    units = find_units(tokens, jobs)
+    if not units:
+        return tokens, []
+    return skeleton(tokens, units), units
+
+
+def annotate_tree(chunk: Chunk, state: Dict[str, Any]) -> Tuple[Dict[int, str], int]:
+    """Comentario del perfil para cada nodo (por id) y número de funciones del árbol
+
+    Se cuentan todas las funciones, con nombre o anónimas: las declaradas
+    con nombre también tienen su nodo Function.
+    """
+    annotate = state['preset'].annotate
+    annotations: Dict[int, str] = {}
+    functions = 0
+    for node in walk(chunk):
+        if isinstance(node, Function):
+            functions += 1
+        comment = annotate(node, state)
+        if comment:
+            annotations[id(node)] = comment
+    return annotations, functions
+
+
+def _render_unit(start: int, end: int, level: int) -> Tuple[str, int, int, int]:
+    """Analiza, comenta y formatea una unidad: (texto, líneas, funciones, comentarios)"""
+    chunk = parse(_SHARED['tokens'][start:end])
+    state = _SHARED['state']
+    annotate = None
+    annotations: Dict[int, str] = {}
+    functions = 0
+    if state is not None:
+        annotations, functions = annotate_tree(chunk, state)
+        annotate = lambda node: annotations.get(id(node))
+    out = io.StringIO()
+    lines = write_statements(chunk.body.body, out, level, annotate=annotate)
+    return out.getvalue(), lines, functions, len(annotations)
+
+
+def _render_batch(batch: List[Tuple[int, int, int]]) -> List[Tuple[str, int, int, int]]:
+    return [_render_unit(start, end, level) for start, end, level in batch]
+
+
+def write_units(chunk: Chunk, tokens: List[Token], units: List[Unit], out: TextIO, jobs: int,
+                state: Dict[str, Any], annotations: Optional[Dict[int, str]]) -> Dict[str, int]:
+    """Escribe el esqueleto con el texto de cada unidad, formateada en otro proceso
+
+    Devuelve las líneas escritas y las funciones y comentarios de las
+    unidades.
+    """
+    indent = '  '
+    buffer = io.StringIO()
+    annotate = None if annotations is None else (lambda node: annotations.get(id(node)))
+    lines = write_lua(chunk, buffer, indent, annotate)
+    text = buffer.getvalue()
+    placeholders = list(PLACEHOLDER.finditer(text))
+    if [int(match.group(2)) for match in placeholders] != list(range(len(units))):
+        raise ValueError("El esqueleto no conserva las unidades en orden")
+
+    # Solo el estado de solo lectura que necesitan los comentarios; el resto no se envía
+    shared_state = None
+    if annotations is not None:
+        shared_state = {name: value for name, value in state.items()
+                        if name not in ('source', 'profiler', 'tokens', 'chunk', 'annotations', 'units')}
+    levels = [len(match.group(1)) // len(indent) for match in placeholders]
+    functions = comments = 0
+    position = 0
+    tasks = [[(units[k].start, units[k].end, levels[k]) for k in group]
+             for group in batches(units, task_size(sum(unit.end - unit.start for unit in units), jobs))]
+    with shared_pool(jobs, tokens=tokens, state=shared_state) as pool:
+        rendered = (result for batch in pool.map(_render_batch, tasks) for result in batch)
+        for match, (unit_text, unit_lines, unit_functions, unit_comments) in zip(placeholders, rendered):
+            out.write(text[position:match.end(1)])
+            out.write(unit_text)
+            position = match.end()
+            lines += unit_lines
+            functions += unit_functions
+            comments += unit_comments
+    out.write(text[position:])
+    return {'lines': lines, 'functions': functions, 'annotations': comments}
+
+
+def main():
+    """Muestra las unidades de un archivo y compara el plegado en paralelo con el secuencial"""
+    if len(sys.argv) < 2:
+        print("💡 Uso: python lua_units.py <archivo.lua> [procesos]")
+        return
+    jobs = int(sys.argv[2]) if len(sys.argv) > 2 else (multiprocessing.cpu_count() or 1)
+    with open(sys.argv[1], 'rb') as f:
+        tokens = tokenize_buffer(f.read())
+
+    start = time.perf_counter()
+    expected = fold_constants(tokens)
+    sequential = time.perf_counter() - start
+    start = time.perf_counter()
+    folded = fold_units(tokens, jobs)
+    split = time.perf_counter() - start
+    print(f"➗ Plegado: {sequential:.3f} s en un proceso, {split:.3f} s con {jobs} "
+          f"({'idéntico' if folded == expected else 'DISTINTO'})")
+
+    tokens = expected[0]
+    units = find_units(tokens, max(jobs, 2))
+    covered = sum(unit.end - unit.start for unit in units)
+    print(f"🧩 {len(units)} unidades con {covered} de {len(tokens)} tokens "
+          f"({covered / max(len(tokens), 1):.0%}); el esqueleto queda en {len(tokens) - covered} tokens")
+
+
+if __name__ == "__main__":
+    main()
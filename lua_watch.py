@@ -0,0 +1,751 @@
+#!/usr/bin/env python3
+"""
+Vigilancia de un archivo con reprocesado incremental (--watch)
+Mientras se edita un script (o una salida a medio desobfuscar), el
+proceso se queda abierto con los tokens y los resultados de cada función
+en memoria. Al guardar un cambio solo se vuelve a analizar el trozo de
+bytes editado, y solo la función que lo contiene pasa otra vez por las
+pasadas; la salida del resto se reutiliza.
+
+Las unidades son los cuerpos de las funciones que no están dentro de un
+despachador (los muy grandes se abren en las funciones que contienen); el
+resto del archivo forma un esqueleto con una llamada __unidad_k() en el
+lugar de cada cuerpo, como en lua_units. Las pasadas sobre tokens
+transforman cada cuerpo sin mirar los demás, salvo por dos datos del
+archivo entero: la tabla de strings con su función de acceso, que se
+vuelven a buscar en el flujo completo (la decodificación se reutiliza
+si la tabla no cambió; qué nombres siguen siendo la tabla al entrar en
+cada cuerpo se sabe por el esqueleto), y las constantes que pueden entrar en los
+despachadores de estados, con las que solo se repiten los despachadores
+cuyas raíces cambian. La eliminación de ramas muertas mira además qué
+nombres de fuera usa cada cuerpo, para no seguir en el esqueleto las
+locales que ve una función. Un cambio fuera de las unidades reprocesa el
+archivo entero, igual que una cadena con pasadas que necesitan el árbol
+completo (rename, o devirt en un archivo con intérprete embebido). La
+salida es la misma que la de una ejecución normal.
+"""
+
+import bisect
+import contextlib
+import io
+import math
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from lua_lexer import Token, KEYWORD, NAME, OP, LuaLexError, tokenize_buffer, render_tokens
+from lua_units import Unit, MARKER, PLACEHOLDER, block_bodies, skeleton, annotate_tree
+from lua_passes import (Pass, State, fold_tokens, locate_strings, decode_strings, decode_pass,
+                        table_literals, resolve_references, report_pass, state_stats)
+from lua_string_table import (ReadScan, TableReads, find_accessor, table_declarations, scan_reads,
+                              select_reads)
+from lua_control_flow import ControlFlowRecovery
+from lua_dead_code import DeadCodeElimination, RemovedBlock
+from lua_devirtualize import may_have_interpreter
+from lua_parser import LuaSyntaxError, parse
+from lua_printer import write_lua, write_statements, open_output
+from lua_profile import PassProfiler, PassRecord, token_bytes, profile_path
+from lua_cache import source_key
+from lua_engine import Engine, Target
+
+# Un cuerpo más pequeño se queda en el esqueleto: no compensa vigilarlo aparte
+MIN_UNIT_TOKENS = 64
+
+# Un cuerpo mayor se abre y se vigilan por separado las funciones que contiene
+UNIT_TOKENS = 4096
+
+# Intervalo entre comprobaciones del archivo (stat; sin dependencias externas)
+POLL_SECONDS = 0.3
+
+# Pasadas que se saben ejecutar por unidades; con cualquier otra se reprocesa el archivo entero
+INCREMENTAL = frozenset({'fold', 'strings', 'decode', 'resolve', 'flow', 'prune', 'parse', 'comments',
+                         'output', 'report'})
+
+_MISSING = object()
+
+
+class WatchUnit:
+    """Un cuerpo de función (o el esqueleto) con sus tokens tras cada pasada y su código formateado"""
+    __slots__ = ('begin', 'end', 'epoch', 'stages', 'counters', 'dirty', 'states', 'dispatchers',
+                 'removed', 'text', 'level', 'lines', 'functions', 'annotations')
+
+    def __init__(self, tokens: List[Token], begin: int = 0, end: int = 0):
+        self.begin = begin              # el cuerpo ocupa data[begin:end]
+        self.end = end
+        self.epoch = 0                  # ediciones anteriores a sus tokens (las posteriores no los mueven)
+        self.stages: Dict[str, List[Token]] = {'raw': tokens}
+        self.counters: Dict[str, Dict[str, int]] = {}
+        self.dirty: Optional[int] = 0   # primera pasada por repetir (None: al día)
+        self.states: List[float] = []   # constantes que pueden entrar en los despachadores
+        self.dispatchers: List[List[float]] = []  # inicio de cada intervalo de estados, por despachador
+        self.removed: List[RemovedBlock] = []  # ramas muertas quitadas, en posiciones de sus tokens
+        self.text: Optional[str] = None  # None: hay que volver a formatearlo
+        self.level = 0
+        self.lines = 0
+        self.functions = 0
+        self.annotations = 0
+
+    def redo(self, index: int) -> None:
+        """Marca la unidad para repetir desde la pasada index"""
+        self.dirty = index if self.dirty is None else min(self.dirty, index)
+        self.text = None
+
+
+# Unidades y cambios
+
+def function_units(tokens: List[Token]) -> List[Unit]:
+    """Cuerpos de función fuera de despachadores, de unos UNIT_TOKENS tokens como mucho si se pueden abrir
+
+    Las funciones dentro de un bucle 'while M do' se quedan con él: si es
+    un despachador, la recuperación del flujo mira también dentro de
+    ellas.
+    """
+    root = block_bodies(tokens)
+    if root is None:
+        return []
+    units: List[Unit] = []
+
+    def visit(body, out: List[Unit]) -> None:
+        for child in body.children:
+            opened = child.opened
+            keyword = tokens[opened].value
+            if keyword == 'do' and opened >= 2 and tokens[opened - 1].kind == NAME \
+                    and tokens[opened - 2].value == 'while':
+                continue
+            begin = child.starts[0]
+            if keyword == 'function' and child.end - begin >= MIN_UNIT_TOKENS:
+                inner: List[Unit] = []
+                if child.end - begin > UNIT_TOKENS:
+                    visit(child, inner)
+                out.extend(inner or [Unit(begin, child.end)])
+            else:
+                visit(child, out)
+
+    visit(root, units)
+    return units
+
+
+def changed_range(old: bytes, new: bytes) -> Optional[Tuple[int, int, int]]:
+    """Parte distinta entre dos versiones: (inicio, fin en old, fin en new), o None si son iguales"""
+    if old == new:
+        return None
+    limit = min(len(old), len(new))
+    a, b = memoryview(old), memoryview(new)
+    step = 1 << 16
+    start = 0
+    while start < limit and a[start:start + step] == b[start:start + step]:
+        start += step
+    start = min(start, limit)
+    while start < limit and old[start] == new[start]:
+        start += 1
+    # El final común no puede solaparse con el principio común
+    tail = 0
+    room = limit - start
+    while tail < room:
+        size = min(step, room - tail)
+        if a[len(old) - tail - size:len(old) - tail] != b[len(new) - tail - size:len(new) - tail]:
+            break
+        tail += size
+    while tail < room and old[len(old) - tail - 1] == new[len(new) - tail - 1]:
+        tail += 1
+    return start, len(old) - tail, len(new) - tail
+
+
+def body_tokens(data: bytes, begin: int, end: int) -> Optional[List[Token]]:
+    """Tokens de data[begin:end] si siguen formando un cuerpo completo cerrado por el 'end' de end
+
+    Devuelve None si la edición cambia los límites del cuerpo (una string
+    o un comentario que no cierra, un 'end' de más, un nombre pegado al
+    'end'): entonces hay que reprocesar el archivo.
+    """
+    if MARKER.encode() in data[begin:end]:
+        return None
+    try:
+        tokens = tokenize_buffer(data, start=begin, end=end + 3)
+    except LuaLexError:
+        return None
+    if not tokens or tokens[-1].kind != KEYWORD or tokens[-1].value != 'end' or tokens[-1].start != end:
+        return None
+    tokens.pop()
+    if not tokens or block_bodies(tokens) is None:
+        return None
+    return tokens
+
+
+def _count(values: List[float], low: float, high: float) -> int:
+    return bisect.bisect_left(values, high) - bisect.bisect_left(values, low)
+
+
+def roots_move(starts: List[float], states: List[float], added: List[float], removed: List[float]) -> bool:
+    """Indica si las constantes añadidas o quitadas cambian qué bloques del despachador son raíces
+
+    Un bloque es raíz por las constantes del archivo si alguna cae en su
+    intervalo de estados; solo pueden cambiar los intervalos de las
+    constantes que cambiaron. states ya incluye el cambio.
+    """
+    for value in added + removed:
+        k = bisect.bisect_right(starts, value) - 1
+        low = starts[k]
+        high = starts[k + 1] if k + 1 < len(starts) else math.inf
+        now = _count(states, low, high)
+        before = now - _count(added, low, high) + _count(removed, low, high)
+        if (now > 0) != (before > 0):
+            return True
+    return False
+
+
+class WatchSession:
+    """Resultados vivos de un perfil sobre el archivo vigilado"""
+
+    def __init__(self, engine: Engine, input_file: str, target: Target):
+        self.engine = engine
+        self.input_file = input_file
+        self.target = target
+        self.passes: List[Pass] = []
+        self.inputs: List[str] = []
+        self.skeleton: Optional[WatchUnit] = None
+        self.units: List[WatchUnit] = []
+        self.warnings: List[str] = []
+        self.reset()
+
+    def reset(self) -> None:
+        """Olvida todo: el siguiente cambio reprocesa el archivo entero"""
+        self.skeleton = None
+        self.units = []
+        self.edits: List[Tuple[int, int]] = []  # (fin del tramo sustituido, bytes de más) desde split
+        self.located: Any = _MISSING
+        self.strings: Optional[Tuple[Dict[str, Any], Dict[str, int]]] = None
+        self.literals: Dict[int, str] = {}
+        self.accessor: Any = _MISSING
+        self.external: Counter = Counter()
+        self.states: List[float] = []
+        self.flow_failed = False
+        self.free: Dict[WatchUnit, FrozenSet[str]] = {}
+        self.prune_failed = False
+        self.chunks: Optional[Dict[WatchUnit, Any]] = None
+        self.notes: Dict[WatchUnit, Dict[int, str]] = {}
+        self.read_key: Any = None
+        self.read_scans: Dict[WatchUnit, ReadScan] = {}
+        self.outer_names: Dict[WatchUnit, FrozenSet[str]] = {}
+        self.table_writes: Optional[FrozenSet[Tuple[str, Optional[int]]]] = None
+
+    def all_units(self) -> List[WatchUnit]:
+        return [self.skeleton] + self.units
+
+    # Cambios
+
+    def split(self, data: bytes) -> None:
+        """Analiza el archivo entero y lo reparte en esqueleto y unidades"""
+        self.reset()
+        raw = tokenize_buffer(data)
+        found = [] if MARKER.encode() in data else function_units(raw)
+        self.skeleton = WatchUnit(skeleton(raw, found) if found else raw, 0, len(data))
+        self.units = [WatchUnit(raw[unit.start:unit.end], raw[unit.start - 1].end, raw[unit.end].start)
+                      for unit in found]
+
+    def patch(self, data: bytes, edit: Tuple[int, int, int]) -> Optional[WatchUnit]:
+        """Vuelve a analizar solo el cuerpo que contiene la edición, si la contiene entera"""
+        start, old_end, new_end = edit
+        k = bisect.bisect_right([unit.begin for unit in self.units], start) - 1
+        if k < 0 or old_end > self.units[k].end:
+            return None
+        unit = self.units[k]
+        delta = new_end - old_end
+        tokens = body_tokens(data, unit.begin, unit.end + delta)
+        if tokens is None:
+            return None
+        unit.stages = {'raw': tokens}
+        unit.counters = {}
+        unit.removed = []
+        unit.redo(0)
+        unit.end += delta
+        for other in self.units[k + 1:]:
+            other.begin += delta
+            other.end += delta
+        self.skeleton.end += delta
+        self.edits.append((old_end, delta))
+        unit.epoch = len(self.edits)
+        return unit
+
+    def apply(self, data: bytes, previous: Optional[bytes]) -> str:
+        """Procesa una versión del archivo y devuelve qué se reprocesó"""
+        self.warnings = []
+        target = self.target
+        profiler = PassProfiler(self.engine.trace_memory)
+        state: State = {
+            'source': data, 'input_file': self.input_file, 'output_file': target.output_file,
+            'report_file': target.report_file, 'preset': target.preset, 'profiler': profiler,
+            'counters': {}, 'jobs': 1, 'tree_units': False,
+        }
+        passes = target.passes
+        if self.engine.detect and target.tailor:
+            passes = self.engine.tailor(state, passes)
+        # devirt no tiene nada que hacer sin fábricas; si las hay, igual que con rename (pasadas
+        # de árbol entero), cada cambio reprocesa el archivo
+        passes = [step for step in passes if step.name != 'devirt' or may_have_interpreter(data)]
+        if not all(step.name in INCREMENTAL for step in passes):
+            self.reset()
+            self.engine.run_target(data, source_key(data), self.input_file, target)
+            return "archivo completo (la cadena necesita el árbol entero)"
+
+        edit = changed_range(previous, data) if previous is not None and self.skeleton is not None else None
+        if passes != self.passes or edit is None or self.patch(data, edit) is None:
+            self.passes = passes
+            self.split(data)
+            summary = f"archivo completo ({len(self.units)} unidades)"
+        else:
+            summary = None
+        produced = 'raw'
+        self.inputs = []
+        for step in passes:
+            self.inputs.append(produced)
+            if 'tokens' in step.produces:
+                produced = step.name
+
+        handlers = {'fold': self.fold, 'strings': self.find_strings, 'decode': self.decode,
+                    'resolve': self.resolve, 'flow': self.flow, 'prune': self.prune, 'parse': self.parse,
+                    'comments': self.comments, 'output': self.output, 'report': self.report}
+        self.streams: Dict[str, List[Token]] = {}
+        for index, step in enumerate(passes):
+            with profiler.measure(step.name) as record:
+                counters = handlers[step.name](index, step, state, record)
+            state['counters'] = {**state['counters'], step.name: counters}
+            record.counters = counters
+            if step.writes:
+                record.output(size=os.path.getsize(state[step.writes]))
+
+        redone = sum(1 for unit in self.units if unit.dirty is not None)
+        for unit in self.all_units():
+            unit.dirty = None
+        output_file = target.output_file
+        profiler.write(profile_path(target.report_file), input_file=self.input_file, input_bytes=len(data),
+                       output_bytes=os.path.getsize(output_file) if os.path.exists(output_file) else 0,
+                       **state_stats(state))
+        return summary or f"{redone} de {len(self.units)} unidades"
+
+    # Pasadas sobre tokens
+
+    def pending(self, index: int) -> List[WatchUnit]:
+        return [unit for unit in self.all_units() if unit.dirty is not None and unit.dirty <= index]
+
+    def total(self, name: str) -> Dict[str, int]:
+        """Contadores de una pasada sumados en todas las unidades"""
+        totals: Dict[str, int] = {}
+        for unit in self.all_units():
+            for key, value in unit.counters.get(name, {}).items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def stream(self, stage: str) -> List[Token]:
+        """Tokens del archivo entero tras una pasada: el esqueleto con cada unidad en su sitio"""
+        if stage in self.streams:
+            return self.streams[stage]
+        frame = self.skeleton.stages[stage]
+        tokens: List[Token] = []
+        position = 0
+        for i, token in enumerate(frame):
+            if token.kind == NAME and token.value.startswith(MARKER):
+                tokens.extend(frame[position:i])
+                tokens.extend(self.units[int(token.value[len(MARKER):])].stages[stage])
+                position = i + 3
+        tokens.extend(frame[position:])
+        self.streams[stage] = tokens
+        return tokens
+
+    def transform(self, index: int, step: Pass, record: PassRecord, function) -> Dict[str, int]:
+        """Aplica una pasada sobre tokens a cada unidad pendiente y suma los contadores"""
+        source = self.inputs[index]
+        for unit in self.pending(index):
+            tokens = unit.stages[source]
+            record.tokens_in += len(tokens)
+            record.bytes_in += token_bytes(tokens)
+            unit.stages[step.name], unit.counters[step.name] = function(unit, tokens)
+            unit.text = None
+            record.tokens_out += len(unit.stages[step.name])
+            record.bytes_out += token_bytes(unit.stages[step.name])
+        return self.total(step.name)
+
+    def fold(self, index: int, step: Pass, state: State, record: PassRecord) -> Dict[str, int]:
+        def fold_unit(unit: WatchUnit, tokens: List[Token]):
+            if unit is self.skeleton:
+                updates, counters = fold_tokens(tokens)
+                return updates['tokens'], counters
+            # Entre el ')' de los parámetros y su 'end', como dentro del archivo: (1+2):f() no pierde el paréntesis
+            padded = [Token(OP, ')', unit.begin, unit.begin)] + tokens + [Token(KEYWORD, 'end', unit.end, unit.end)]
+            updates, counters = fold_tokens(padded)
+            return updates['tokens'][1:-1], counters
+        return self.transform(index, step, record, fold_unit)
+
+    def decode(self, index: int, step: Pass, state: State, record: PassRecord) -> Dict[str, int]:
+        def decode_unit(unit: WatchUnit, tokens: List[Token]):
+            updates, counters = decode_pass({'tokens': tokens})
+            return updates['tokens'], counters
+        return self.transform(index, step, record, decode_unit)
+
+    def find_strings(self, index: int, step: Pass, state: State, record: PassRecord) -> Dict[str, int]:
+        """La tabla se busca en el flujo completo; solo se decodifica otra vez si cambió"""
+        table = locate_strings(self.stream(self.inputs[index]))
+        if self.strings is None or table != self.located:
+            self.strings = decode_strings(table)
+            self.literals = table_literals(self.strings[0]['table_values'])
+            if self.located is not _MISSING:
+                # Las pasadas que usan la tabla se repiten en todo el archivo
+                users = [k for k, other in enumerate(self.passes) if k > index and 'table_name' in other.requires]
+                for unit in self.all_units():
+                    unit.redo(users[0] if users else len(self.passes))
+            self.located = table
+        facts, counters = self.strings
+        state.update(facts)
+        return counters
+
+    def resolve(self, index: int, step: Pass, state: State, record: PassRecord) -> Dict[str, int]:
+        name = state['table_name']
+        stream = self.stream(self.inputs[index])
+        accessor = find_accessor(stream, name, state['table_end']) if name else None
+        if accessor != self.accessor:
+            if self.accessor is not _MISSING:
+                for unit in self.all_units():
+                    unit.redo(index)
+            self.accessor = accessor
+        state['accessor'] = accessor
+
+        reads = self.table_reads(index, stream, name, accessor, state['table_end']) if name else {}
+        nothing = TableReads({}, frozenset())
+
+        def resolve_unit(unit: WatchUnit, tokens: List[Token]):
+            if not name:
+                return tokens, {'accessor_calls': 0}
+            tokens, calls = resolve_references(tokens, name, self.literals, accessor, reads.get(unit, nothing))
+            return tokens, {'accessor_calls': calls}
+        return self.transform(index, step, record, resolve_unit)
+
+    def table_reads(self, index: int, stream: List[Token], name: str, accessor: Optional[Tuple[str, int]],
+                    table_end: int) -> Dict[WatchUnit, TableReads]:
+        """Lecturas de la tabla y de su función de acceso en cada unidad (ver lua_string_table.scan_reads)
+
+        Cada cuerpo se analiza solo, como en prune; qué nombres siguen
+        siendo la tabla donde empieza se sabe por el esqueleto. Si cambia
+        lo que el archivo asigna a la tabla, se repiten todas las unidades.
+        """
+        source = self.inputs[index]
+        names = (name,) + ((accessor[0],) if accessor else ())
+        # Unidad e índice de cada declaración en sus tokens (los del flujo son los mismos objetos)
+        declared = {id(stream[i]): watched for watched, i in table_declarations(stream, name, table_end).items()
+                    if watched in names}
+        fragments: Dict[WatchUnit, Dict[str, int]] = {}
+        for unit in self.all_units() if declared else []:
+            for i, token in enumerate(unit.stages[source]):
+                if id(token) in declared:
+                    fragments.setdefault(unit, {})[declared[id(token)]] = i
+        key = (names, tuple((self.all_units().index(unit), tuple(sorted(found.items())))
+                            for unit, found in fragments.items()))
+        if key != self.read_key:
+            self.read_key = key
+            self.read_scans = {}
+            for unit in self.all_units():
+                unit.redo(index)
+
+        def declarations(unit: WatchUnit, shift: int = 0) -> Dict[str, int]:
+            return {watched: i + shift for watched, i in fragments.get(unit, {}).items()}
+
+        frame = self.skeleton.stages[source]
+        try:
+            if self.skeleton not in self.read_scans or self.skeleton.dirty is not None \
+                    and self.skeleton.dirty <= index:
+                scan = scan_reads(frame, names, declarations(self.skeleton), marks=MARKER)
+                self.read_scans[self.skeleton] = scan
+                for k, unit in enumerate(self.units):
+                    outer = scan.visible.get(f"{MARKER}{k}", frozenset())
+                    if self.outer_names.get(unit) != outer:
+                        self.outer_names[unit] = outer
+                        self.read_scans.pop(unit, None)
+                        unit.redo(index)
+            calls = {token.value: i for i, token in enumerate(frame)
+                     if token.kind == NAME and token.value.startswith(MARKER)}
+            for k, unit in enumerate(self.units):
+                if unit in self.read_scans and (unit.dirty is None or unit.dirty > index):
+                    continue
+                header = self.header(frame, calls, k)
+                tokens = header + unit.stages[source] + [Token(KEYWORD, 'end', header[0].start, header[0].start)]
+                self.read_scans[unit] = scan_reads(tokens, names, declarations(unit, len(header)),
+                                                   self.outer_names[unit])
+        except LuaSyntaxError as e:
+            # Como en la pasada normal: sin ámbitos no se sustituye ninguna referencia a la tabla
+            self.warnings.append(f"No se pudo analizar el código para resolver las referencias a {name}: {e}")
+            self.read_key = None
+            self.table_writes = None
+            for unit in self.all_units():
+                unit.redo(index)
+            return {}
+        writes = frozenset().union(*(scan.writes for scan in self.read_scans.values()))
+        if writes != self.table_writes:
+            self.table_writes = writes
+            for unit in self.all_units():
+                unit.redo(index)
+        return {unit: select_reads(scan.reads, writes, name) for unit, scan in self.read_scans.items()}
+
+    def header(self, frame: List[Token], calls: Dict[str, int], k: int) -> List[Token]:
+        """return function(<parámetros>) con que se analiza el cuerpo k, sin el 'end'
+
+        Los parámetros están en el esqueleto, entre '(' y el ')' que precede a __unidad_k().
+        """
+        close = calls[f"{MARKER}{k}"] - 1
+        first = close
+        while frame[first].value != '(':
+            first -= 1
+        at = frame[close].end
+        return [Token(KEYWORD, 'return', at, at), Token(KEYWORD, 'function', at, at)] + frame[first:close + 1]
+
+    def flow(self, index: int, step: Pass, state: State, record: PassRecord) -> Dict[str, int]:
+        """Recupera el flujo de las unidades pendientes y de las que dependen de sus constantes"""
+        source = self.inputs[index]
+        if self.flow_failed:
+            self.external = Counter()
+            for unit in self.all_units():
+                unit.states = []
+                unit.redo(index)
+        recoveries: Dict[WatchUnit, ControlFlowRecovery] = {}
+        found: Dict[WatchUnit, List[float]] = {}
+        try:
+            for unit in self.pending(index):
+                recoveries[unit] = ControlFlowRecovery(unit.stages[source])
+                found[unit] = recoveries[unit].analyze()
+        except LuaSyntaxError as e:
+            # Como en la pasada normal: si una parte no se analiza, el archivo se queda como está
+            self.warnings.append(f"No se pudo analizar el código para recuperar el flujo: {e}")
+            self.flow_failed = True
+            for unit in self.all_units():
+                unit.stages[step.name] = unit.stages[source]
+                unit.counters[step.name] = {}
+                unit.redo(index)
+            return {}
+        self.flow_failed = False
+
+        # Constantes del archivo que aparecen o desaparecen con este cambio
+        touched = set()
+        for unit, states in found.items():
+            touched.update(unit.states)
+            touched.update(states)
+        present = {value for value in touched if self.external[value] > 0}
+        for unit, states in found.items():
+            self.external.subtract(unit.states)
+            self.external.update(states)
+            unit.states = states
+            unit.dispatchers = [dispatcher.starts for _, dispatcher in recoveries[unit].found]
+        now = {value for value in touched if self.external[value] > 0}
+        added, removed = sorted(now - present), sorted(present - now)
+        for value in removed:
+            del self.external[value]
+        if len(added) + len(removed) > len(self.states) // 8:
+            self.states = sorted(value for value, count in self.external.items() if count > 0)
+        else:
+            for value in removed:
+                del self.states[bisect.bisect_left(self.states, value)]
+            for value in added:
+                bisect.insort(self.states, value)
+
+        if added or removed:
+            for unit in self.all_units():
+                if unit not in recoveries and any(roots_move(starts, self.states, added, removed)
+                                                  for starts in unit.dispatchers):
+                    recoveries[unit] = ControlFlowRecovery(unit.stages[source])
+                    recoveries[unit].analyze()
+        for unit, recovery in recoveries.items():
+            tokens = unit.stages[source]
+            record.tokens_in += len(tokens)
+            unit.stages[step.name] = recovery.recover(self.states)
+            unit.counters[step.name] = dict(recovery.stats)
+            unit.redo(index)
+            record.tokens_out += len(unit.stages[step.name])
+        return self.total(step.name)
+
+    def prune(self, index: int, step: Pass, state: State, record: PassRecord) -> Dict[str, int]:
+        """Quita las ramas muertas de las unidades pendientes
+
+        Cada cuerpo se analiza como function(<parámetros>) <cuerpo> end, para
+        que sus parámetros sean locales igual que en el archivo entero. El
+        esqueleto se repite si cambian los nombres de fuera que usa alguna
+        unidad: las locales del esqueleto que ve una unidad no se siguen.
+        """
+        source = self.inputs[index]
+        if self.prune_failed:
+            for unit in self.all_units():
+                unit.redo(index)
+        frame = self.skeleton.stages[source]
+        calls = {token.value: i for i, token in enumerate(frame)
+                 if token.kind == NAME and token.value.startswith(MARKER)}
+        results: Dict[WatchUnit, Tuple[List[Token], Dict[str, int]]] = {}
+        try:
+            for k, unit in enumerate(self.units):
+                if unit.dirty is None or unit.dirty > index:
+                    continue
+                header = self.header(frame, calls, k)
+                at = header[0].start
+                elimination = DeadCodeElimination(header + unit.stages[source] + [Token(KEYWORD, 'end', at, at)])
+                tokens = elimination.run()
+                results[unit] = tokens[len(header):-1], elimination.removed, dict(elimination.stats)
+                free = frozenset(elimination.free)
+                if self.free.get(unit) != free:
+                    self.free[unit] = free
+                    self.skeleton.redo(index)
+            if self.skeleton.dirty is not None and self.skeleton.dirty <= index:
+                outer = {f"{MARKER}{k}": self.free[unit] for k, unit in enumerate(self.units)}
+                elimination = DeadCodeElimination(frame, outer)
+                results[self.skeleton] = elimination.run(), elimination.removed, dict(elimination.stats)
+        except LuaSyntaxError as e:
+            # Como en la pasada normal: si una parte no se analiza, el archivo se queda como está
+            self.warnings.append(f"No se pudo analizar el código para eliminar ramas muertas: {e}")
+            self.prune_failed = True
+            for unit in self.all_units():
+                unit.stages[step.name] = unit.stages[source]
+                unit.counters[step.name] = {}
+                unit.removed = []
+                unit.redo(index)
+            state['removed_blocks'] = []
+            return {}
+        self.prune_failed = False
+        for unit, (tokens, removed, counters) in results.items():
+            record.tokens_in += len(unit.stages[source])
+            record.bytes_in += token_bytes(unit.stages[source])
+            unit.stages[step.name], unit.removed, unit.counters[step.name] = tokens, removed, counters
+            unit.text = None
+            record.tokens_out += len(tokens)
+            record.bytes_out += token_bytes(tokens)
+        state['removed_blocks'] = sorted((block._replace(position=self.moved(block.position, unit.epoch))
+                                          for unit in self.all_units() for block in unit.removed),
+                                         key=lambda block: block.position)
+        return self.total(step.name)
+
+    def moved(self, position: int, epoch: int) -> int:
+        """Posición actual de un token analizado tras las primeras epoch ediciones"""
+        for end, delta in self.edits[epoch:]:
+            if position >= end:
+                position += delta
+        return position
+
+    # Pasadas sobre el árbol
+
+    def parse(self, index: int, step: Pass, state: State, record: PassRecord) -> Dict[str, int]:
+        """Analiza las unidades que hay que volver a formatear"""
+        final = self.inputs[index]
+        self.chunks = {}
+        for unit in self.all_units():
+            if unit.text is None:
+                try:
+                    self.chunks[unit] = parse(unit.stages[final])
+                except LuaSyntaxError as e:
+                    # Sin árbol no hay formato: la salida será el código tal cual
+                    self.warnings.append(f"No se pudo analizar el código: {e}")
+                    self.chunks = None
+                    return {'units': 0}
+        return {'units': len(self.units)}
+
+    def comments(self, index: int, step: Pass, state: State, record: PassRecord) -> Dict[str, int]:
+        self.notes = {}
+        if self.chunks is None:
+            return {'annotations': 0, 'functions': 0}
+        for unit, chunk in self.chunks.items():
+            self.notes[unit], unit.functions = annotate_tree(chunk, state)
+            unit.annotations = len(self.notes[unit])
+        units = self.all_units()
+        return {'annotations': sum(unit.annotations for unit in units),
+                'functions': sum(unit.functions for unit in units)}
+
+    def output(self, index: int, step: Pass, state: State, record: PassRecord) -> Dict[str, int]:
+        """Escribe el esqueleto con el texto de cada unidad, formateando solo las que cambiaron"""
+        commented = any(other.name == 'comments' for other in self.passes)
+        final = self.inputs[index]
+        with open_output(state['output_file']) as f:
+            if commented:
+                f.write(state['preset'].header)
+            if self.chunks is None or not any(other.name == 'parse' for other in self.passes):
+                code = render_tokens(self.stream(final), spaced=True)
+                f.write(code)
+                return {'lines': code.count('\n') + 1}
+
+            skeleton = self.skeleton
+            if skeleton.text is None:
+                buffer = io.StringIO()
+                skeleton.lines = write_lua(self.chunks[skeleton], buffer, annotate=self.annotate(skeleton, commented))
+                skeleton.text = buffer.getvalue()
+            text = skeleton.text
+            placeholders = list(PLACEHOLDER.finditer(text))
+            if [int(match.group(2)) for match in placeholders] != list(range(len(self.units))):
+                raise ValueError("El esqueleto no conserva las unidades en orden")
+            lines = skeleton.lines
+            position = 0
+            for unit, match in zip(self.units, placeholders):
+                level = len(match.group(1)) // 2
+                if unit.text is None or unit.level != level:
+                    # Una unidad al día solo cambia de nivel si cambió el esqueleto
+                    chunk = self.chunks.get(unit)
+                    if chunk is None:
+                        chunk = parse(unit.stages[final])
+                        if commented:
+                            self.notes[unit] = annotate_tree(chunk, state)[0]
+                    buffer = io.StringIO()
+                    unit.lines = write_statements(chunk.body.body, buffer, level,
+                                                  annotate=self.annotate(unit, commented))
+                    unit.text = buffer.getvalue()
+                    unit.level = level
+                f.write(text[position:match.end(1)])
+                f.write(unit.text)
+                position = match.end()
+                lines += unit.lines
+            f.write(text[position:])
+        self.chunks = None
+        return {'lines': lines}
+
+    def annotate(self, unit: WatchUnit, commented: bool):
+        if not commented:
+            return None
+        notes = self.notes.get(unit, {})
+        return lambda node: notes.get(id(node))
+
+    def report(self, index: int, step: Pass, state: State, record: PassRecord) -> Dict[str, int]:
+        return report_pass(state)[1]
+
+
+def watch(input_file: str, targets: List[Target], engine: Engine, interval: float = POLL_SECONDS) -> None:
+    """Vigila el archivo y lo vuelve a procesar con cada perfil cada vez que cambia"""
+    sessions = [WatchSession(engine, input_file, target) for target in targets]
+    print(f"👀 Vigilando {input_file} (Ctrl+C para terminar)")
+    signature = None
+    data: Optional[bytes] = None
+    try:
+        while True:
+            try:
+                stat = os.stat(input_file)
+            except OSError:
+                time.sleep(interval)
+                continue
+            if (stat.st_mtime_ns, stat.st_size) != signature:
+                signature = (stat.st_mtime_ns, stat.st_size)
+                with open(input_file, 'rb') as f:
+                    current = f.read()
+                if current != data:
+                    for session in sessions:
+                        run_session(session, current, data)
+                    data = current
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\n👋 Vigilancia terminada")
+
+
+def run_session(session: WatchSession, data: bytes, previous: Optional[bytes]) -> None:
+    """Aplica un cambio a un perfil e informa del tiempo y de lo que se reprocesó"""
+    name = session.target.preset.name
+    started = time.perf_counter()
+    try:
+        # Los mensajes de cada pasada se repetirían por cada unidad
+        with contextlib.redirect_stdout(io.StringIO()):
+            summary = session.apply(data, previous)
+    except Exception as e:
+        session.reset()
+        print(f"❌ {name}: {type(e).__name__}: {e}")
+        return
+    for warning in session.warnings:
+        print(f"⚠️ {name}: {warning}")
+    elapsed = time.perf_counter() - started
+    print(f"🔁 {name}: {summary} en {elapsed * 1000:.0f} ms → {session.target.output_file}")
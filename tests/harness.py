@@ -0,0 +1,68 @@
+"""
+Utilidades de las pruebas de equivalencia
+Cada prueba pasa un script por pasadas del motor y ejecuta el original
+y el resultado en Lua 5.1 (lupa): lo que imprimen tiene que coincidir.
+Un script que falla cuenta como una línea 'error' (los mensajes llevan
+números de línea, que cambian al reescribir el código) y uno que no
+termina se corta tras STEP_LIMIT instrucciones.
+"""
+
+from typing import List, Union
+
+import pytest
+
+lua51 = pytest.importorskip('lupa.lua51')
+
+from lua_engine import Engine, Target, resolve_passes
+from lua_presets import PRESETS
+
+STEP_LIMIT = 10_000_000
+
+_RUNNER = b"""
+function(code, limit)
+  local out = {}
+  local function print(...)
+    local parts = {}
+    for i = 1, select('#', ...) do parts[i] = tostring((select(i, ...))) end
+    out[#out + 1] = table.concat(parts, '\\t')
+  end
+  local chunk, err = loadstring(code)
+  if not chunk then return false, err end
+  setfenv(chunk, setmetatable({print = print}, {__index = _G}))
+  debug.sethook(function() error('instrucciones agotadas') end, '', limit)
+  local ok = pcall(chunk)
+  debug.sethook()
+  if not ok then out[#out + 1] = 'error' end
+  return true, table.concat(out, '\\n')
+end
+"""
+
+
+def run_lua(code: Union[str, bytes]) -> List[str]:
+    """Líneas que imprime el código en Lua 5.1 (falla la prueba si no compila)"""
+    if isinstance(code, str):
+        code = code.encode('utf-8', 'surrogateescape')
+    runtime = lua51.LuaRuntime(encoding=None, unpack_returned_tuples=True)
+    compiled, output = runtime.eval(_RUNNER)(code, STEP_LIMIT)
+    if not compiled:
+        pytest.fail(f"El código no compila: {output.decode('utf-8', 'replace')}\n{code.decode('utf-8', 'replace')}")
+    return output.decode('utf-8', 'backslashreplace').split('\n')
+
+
+def deobfuscate(tmp_path, source: str, passes: str, preset: str = 'advanced') -> str:
+    """Código que escribe el motor tras las pasadas indicadas (sin caché ni reconocer la familia)"""
+    input_file = tmp_path / 'entrada.lua'
+    input_file.write_bytes(source.encode('utf-8', 'surrogateescape'))
+    chosen = PRESETS[preset]
+    target = Target(chosen, resolve_passes(chosen, passes), str(tmp_path / 'salida.lua'),
+                    str(tmp_path / 'reporte.txt'), tailor=False)
+    Engine(detect=False).run(str(input_file), [target])
+    return (tmp_path / 'salida.lua').read_bytes().decode('utf-8', 'surrogateescape')
+
+
+def assert_equivalent(tmp_path, source: str, passes: str, preset: str = 'advanced') -> str:
+    """Comprueba que el resultado imprime lo mismo que el original y lo devuelve"""
+    expected = run_lua(source)
+    output = deobfuscate(tmp_path, source, passes, preset)
+    assert run_lua(output) == expected, output
+    return output
@@ -0,0 +1,40 @@
+"""Caché de pasadas: editar un módulo que usa la salida invalida el resultado guardado"""
+
+import importlib
+
+import pytest
+
+import lua_cache
+from lua_cache import PassCache
+from lua_engine import Engine, Target, resolve_passes
+from lua_presets import PRESETS
+
+SOURCE = """
+local a = {1, 2, 3}
+local function f(b) return b * 2 end
+print(f(a[2]))
+"""
+
+HIT = "⚡ Resultado recuperado de la caché"
+
+
+def run(tmp_path, cache: PassCache) -> None:
+    chosen = PRESETS['basic']
+    target = Target(chosen, resolve_passes(chosen, None), str(tmp_path / 'salida.lua'),
+                    str(tmp_path / 'reporte.txt'), tailor=False)
+    Engine(cache, detect=False).run(str(tmp_path / 'entrada.lua'), [target])
+
+
+@pytest.mark.parametrize('name', ['lua_parser', 'lua_ast', 'lua_scope', 'lua_units', 'lua_printer',
+                                  'lua_presets'])
+def test_editing_a_module_misses_the_output(tmp_path, capsys, monkeypatch, name):
+    (tmp_path / 'entrada.lua').write_text(SOURCE, encoding='utf-8')
+    cache = PassCache(str(tmp_path / 'cache'))
+    run(tmp_path, cache)
+    run(tmp_path, cache)
+    assert HIT in capsys.readouterr().out
+    # Lo que module_hash leería del archivo editado
+    module = importlib.import_module(name)
+    monkeypatch.setitem(lua_cache._module_hashes, module.__file__, '0' * 64)
+    run(tmp_path, cache)
+    assert HIT not in capsys.readouterr().out
@@ -0,0 +1,222 @@
+"""Recuperación del flujo aplanado: el código estructurado se comporta como el despachador"""
+
+from harness import assert_equivalent
+
+PASSES = 'fold,flow,parse,output'
+
+LOOP = """
+local function f(n)
+  local M = 1
+  local acc = ''
+  while M do
+    if M < 3 then
+      if M < 2 then
+        acc = acc .. 'a' M = n > 0 and 2 or 4
+      else
+        acc = acc .. 'b' n = n - 1 M = 1
+      end
+    else
+      if M < 4 then
+        acc = acc .. 'c' M = nil
+      else
+        acc = acc .. 'd' M = 3
+      end
+    end
+  end
+  return acc
+end
+print(f(0), f(2), f(5))
+"""
+
+DIAMOND = """
+local function f(c)
+  local M = 100
+  local x = ''
+  while M do
+    if M < 300 then
+      if M < 200 then
+        x = x .. 'N' M = c and 200 or 300
+      else
+        x = x .. 'A' M = 400
+      end
+    else
+      if M < 400 then
+        x = x .. 'B' M = 400
+      else
+        x = x .. 'J' M = nil
+      end
+    end
+  end
+  return x
+end
+print(f(true), f(false))
+"""
+
+# Los estados se escriben como en el obfuscador: sumas que pliega 'fold'
+FOLDED_STATES = """
+local function f(t)
+  local M, s = 10-(-5), 0
+  while M do
+    if M < 20 then
+      if M < 16 then
+        s = s + 1 M = #t > 0 and 16 or 25
+      else
+        s = s + t[#t] table.remove(t) M = 3+12
+      end
+    else
+      s = -s M = nil
+    end
+  end
+  return s
+end
+print(f({}), f({4, 5, 6}))
+"""
+
+# N -> (c ? A : B), A -> (d ? X : J), B -> X, X -> J: X lo comparten las dos
+# ramas de N sin ser su unión (la unión es J)
+SHARED_ARM = """
+local function g(c, d)
+  local M = 10
+  local x = ''
+  while M do
+    if M < 30 then
+      if M < 20 then
+        x = x .. 'N' M = c and 20 or 30
+      else
+        x = x .. 'A' M = d and 40 or 50
+      end
+    else
+      if M < 40 then
+        x = x .. 'B' M = 40
+      else
+        if M < 50 then
+          x = x .. 'X' M = 50
+        else
+          x = x .. 'J' M = nil
+        end
+      end
+    end
+  end
+  return x
+end
+print(g(true, true), g(true, false), g(false, true), g(false, false))
+"""
+
+# Una local de un bloque no puede verse en los bloques que se escriben tras él
+BLOCK_LOCAL = """
+local function f()
+  local M = 1
+  local out = ''
+  while M do
+    if M < 3 then
+      if M < 2 then
+        local x = 'b' out = out .. 'a' .. x M = 2
+      else
+        out = out .. tostring(x) M = 3
+      end
+    else
+      if M < 4 then out = out .. 'd' M = nil else M = nil end
+    end
+  end
+  return out
+end
+print(f())
+"""
+
+# Bloques que leen M antes de su transición
+READS_STATE = """
+local function f()
+  local M = 1
+  local out = ''
+  while M do
+    if M < 3 then
+      if M < 2 then out = out .. M M = 2 else out = out .. M M = 3 end
+    else
+      if M < 4 then out = out .. M M = 4 else out = out .. M M = nil end
+    end
+  end
+  return out
+end
+print(f())
+"""
+
+# La condición de la transición lee M
+STATE_CONDITION = """
+local function f()
+  local M = 1
+  local out = ''
+  while M do
+    if M < 3 then
+      if M < 2 then out = out .. 'a' M = 2 else out = out .. 'b' M = (M == 2) and 3 or 4 end
+    else
+      if M < 4 then out = out .. 'c' M = nil else out = out .. 'd' M = nil end
+    end
+  end
+  return out
+end
+print(f())
+"""
+
+# Un cierre lee M cuando se le llama, desde cualquier bloque
+CAPTURED_STATE = """
+local function f()
+  local M = 1
+  local out = ''
+  local function state() return M end
+  while M do
+    if M < 3 then
+      if M < 2 then out = out .. 'a' M = 2 else out = out .. state() M = 3 end
+    else
+      if M < 4 then out = out .. 'c' M = 4 else out = out .. 'd' M = nil end
+    end
+  end
+  return out
+end
+local function g()
+  local M = 1
+  local out, state = ''
+  while M do
+    if M < 3 then
+      if M < 2 then out = out .. 'a' state = function() return M end M = 2 else out = out .. 'b' M = 3 end
+    else
+      if M < 4 then out = out .. 'c' M = 4 else out = out .. state() M = nil end
+    end
+  end
+  return out
+end
+print(f(), g())
+"""
+
+
+def test_loop_back_edges(tmp_path):
+    assert_equivalent(tmp_path, LOOP, PASSES)
+
+
+def test_diamond_is_structured(tmp_path):
+    output = assert_equivalent(tmp_path, DIAMOND, PASSES)
+    # Una sola región: el bucle queda solo como envoltorio, sin comparaciones de estado
+    assert 'M <' not in output
+
+
+def test_folded_states(tmp_path):
+    assert_equivalent(tmp_path, FOLDED_STATES, PASSES)
+
+
+def test_block_shared_by_both_arms(tmp_path):
+    assert_equivalent(tmp_path, SHARED_ARM, PASSES)
+
+
+def test_block_locals_stay_in_their_block(tmp_path):
+    assert_equivalent(tmp_path, BLOCK_LOCAL, PASSES)
+
+
+def test_state_read_before_transition(tmp_path):
+    assert_equivalent(tmp_path, READS_STATE, PASSES)
+
+
+def test_state_read_in_transition_condition(tmp_path):
+    assert_equivalent(tmp_path, STATE_CONDITION, PASSES)
+
+
+def test_state_captured_by_closure(tmp_path):
+    assert_equivalent(tmp_path, CAPTURED_STATE, PASSES)
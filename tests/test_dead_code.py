@@ -0,0 +1,36 @@
+"""Eliminación de ramas muertas: solo se quita lo que no se puede ejecutar"""
+
+import pytest
+
+from harness import assert_equivalent
+
+PASSES = 'fold,prune,parse,output'
+
+CASES = [
+    # Predicados que deciden las constantes
+    "local M = true if M then print('sí') else print('no') end",
+    "local a, b = 1, nil if b then print('b') elseif a == 1 then print('a') else print('c') end",
+    "local s = 'x' if s .. 'y' == 'xy' then print(1) end if #s > 3 then print(2) end",
+    # Selecciones and/or
+    "local M = false local v = M and 'a' or 'b' print(v, nil or 3, false and f())",
+    # while que no entra y código tras return
+    "local n = 0 while n > 1 do print('nunca') end print(n)",
+    "local function f(a) do return a end print('nunca') end print(f(4))",
+    # Lo que cambia en un bucle o en otra función no se conoce
+    "local M = true for i = 1, 3 do if M then print(i) M = false else print(-i) M = true end end",
+    "local M = 1 local function g() M = 2 end g() if M == 1 then print('uno') else print('otro') end",
+    "local M = 1 while M < 4 do if M == 2 then print('dos') end M = M + 1 end",
+    # Etiquetas de Luau/5.2 no: un return anterior no deja muerto lo que sigue a un bloque
+    "local x = 1 if x == 1 then print('a') end print('b')",
+]
+
+
+@pytest.mark.parametrize('source', CASES)
+def test_prune_keeps_behaviour(tmp_path, source):
+    assert_equivalent(tmp_path, source, PASSES)
+
+
+def test_prune_removes_decided_branches(tmp_path):
+    output = assert_equivalent(tmp_path, "local M = true if M then print('vivo') else print('muerto') end",
+                               PASSES)
+    assert 'muerto' not in output
@@ -0,0 +1,104 @@
+"""Devirtualización: las funciones creadas por la VM hacen lo mismo que las originales"""
+
+from harness import assert_equivalent
+
+PASSES = 'fold,devirt,parse,output'
+
+# Envoltorios que crean las funciones y una VM con estados de entrada 50 y 1050
+VM = """
+local R, A, B
+A, B, R = function(J, l)
+  local O = function(O, z) return R(J, {O, z}, l) end
+  return O
+end, function(J, l)
+  local O = function(...) return R(J, {...}, l) end
+  return O
+end, function(M, O, z)
+  local a, b, c, i, u, q
+  while M do
+    if M < 500 then
+      if M < 200 then
+        if M < 100 then
+          a = O[1] b = O[2] i = 0 M = 300
+        else
+          print('loop', i) i = i + 1 c = i < a M = c and 150 or 450
+        end
+      else
+        if M < 400 then
+          M = 150
+        else
+          u = 700 q = i >= b M = q and u i = 900 M = M or i
+        end
+      end
+    else
+      if M < 800 then
+        if M < 750 then
+          print('seven', i) i = {i} M = nil
+        else
+          M = 1000
+        end
+      else
+        if M < 950 then
+          print('nine', i) i = {i * 2} M = nil
+        else
+          if M < 1100 then
+            a = O[1] print('other', a, select('#', unpack(O))) i = {a + 1} M = nil
+          else
+            M = 1200 print('dead')
+          end
+        end
+      end
+    end
+  end
+  return unpack(i)
+end
+local f = A(50, {})
+local g = B(1050, {})
+print('r', f(3, 2))
+print('r', f(2, 5))
+print('r', g(7, 8, 9))
+"""
+
+
+def test_vm_functions_keep_behaviour(tmp_path):
+    output = assert_equivalent(tmp_path, VM, PASSES)
+    assert 'R[J]' in output
+
+# La función del estado 10 tiene un bloque (X, estado 40) al que llegan las
+# dos ramas de la primera bifurcación sin ser su unión
+SHARED_ARM = """
+local R, A
+A, R = function(J, l)
+  local O = function(O, z) return R(J, {O, z}, l) end
+  return O
+end, function(M, O, z)
+  local x
+  while M do
+    if M < 30 then
+      if M < 20 then
+        x = 'N' M = O[1] and 20 or 30
+      else
+        x = x .. 'A' M = O[2] and 40 or 50
+      end
+    else
+      if M < 40 then
+        x = x .. 'B' M = 40
+      else
+        if M < 50 then
+          x = x .. 'X' M = 50
+        else
+          x = x .. 'J' M = nil
+        end
+      end
+    end
+  end
+  return x
+end
+local g = A(10, {})
+print(g(true, true), g(true, false), g(false, true), g(false, false))
+"""
+
+
+def test_block_shared_by_both_arms(tmp_path):
+    output = assert_equivalent(tmp_path, SHARED_ARM, PASSES)
+    assert 'R[J]' in output
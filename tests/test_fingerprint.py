@@ -0,0 +1,46 @@
+"""Familia del obfuscador: solo se omiten las pasadas sin nada que hacer en el archivo entero"""
+
+from lua_engine import Engine, Target, resolve_passes
+from lua_fingerprint import PASS_SIGNALS, SAMPLE_BYTES, fingerprint, skippable
+from lua_presets import PRESETS
+
+FILLER = 'y = y * 2\n' * (2 * SAMPLE_BYTES // 10)
+
+# Tabla, escapes, función con nombre, comentario y despachador lejos de las muestras
+MIDDLE = """
+local names = {"a\\65b", "c"}
+-- duplica n
+local function double(n)
+  return n * 2
+end
+local M = 1
+while M do if M < 2 then print(double(3), names[1]) M = 2 else M = nil end end
+"""
+
+PASS_NAMES = [step.name for step in resolve_passes(PRESETS['advanced'], None)] + ['decode']
+
+
+def deobfuscate(tmp_path, source: str, detect: bool) -> str:
+    input_file = tmp_path / 'entrada.lua'
+    input_file.write_text(source, encoding='utf-8')
+    chosen = PRESETS['advanced']
+    target = Target(chosen, resolve_passes(chosen, None), str(tmp_path / 'salida.lua'),
+                    str(tmp_path / 'reporte.txt'))
+    Engine(detect=detect).run(str(input_file), [target])
+    return (tmp_path / 'salida.lua').read_text(encoding='utf-8')
+
+
+def test_signals_in_the_middle_keep_every_pass(tmp_path):
+    source = 'y = 1\n' + FILLER + MIDDLE + FILLER
+    found = fingerprint(source.encode())
+    assert found.family == 'plain' and found.recognized
+    assert skippable(PASS_NAMES, found) == []
+    output = deobfuscate(tmp_path, source, True)
+    assert output == deobfuscate(tmp_path, source, False)
+    assert 'CÓDIGO LUA DESOBFUSCADO' in output and 'Definición de función' in output
+
+
+def test_plain_file_skips_only_passes_without_work():
+    found = fingerprint(('y = 1\n' + FILLER).encode())
+    assert found.recognized
+    assert sorted(skippable(PASS_NAMES, found)) == sorted(PASS_SIGNALS)
@@ -0,0 +1,40 @@
+"""Plegado de constantes: el código plegado imprime lo mismo que el original"""
+
+import math
+
+import pytest
+
+from harness import assert_equivalent
+from lua_folding import format_number
+
+CASES = [
+    "print(1 + 2 * 3, (1 + 2) * 3, 10 - 2 - 3, 2 ^ 3 ^ 2, -2 ^ 2)",
+    "print(7 % -3, -7 % 3, 7 / 2, 7.5 % 2, 2 ^ -1)",
+    "print(-757900+757901, 393027-(-393030), 831-(-(-830)))",
+    "local x = 5 print(x * 2 + 3, 2 + 3 * x, x - 1 - 1, 1 - 2 + x, x ^ 2 ^ 1)",
+    "local t = {} t[-757900+757901] = 'uno' print(t[1], #t)",
+    "print(- -3, 2 - -3, 1 - -(-2), - (2 + 3))",
+    "print(0x10 + 1, 0xff * 2, 1e3 + 1, .5 + .25)",
+    "print(0.1 + 0.2, 1 / 3, 100000000000000 + 1, 2 ^ 53 + 1)",
+    "print(1 / 0, -1 / 0, 1e308 * 10, 0 / 0 ~= 0 / 0)",
+    # Literales que no caben en un doble: inf no tiene literal con que plegarlos
+    "print(-1e309, 2 - 1, (1e309), -(1e309) + 1, - -1e308 * 10)",
+    "local function f() return -1e309 end print(f() < 0)",
+    "print(#'abc' + 1, 'a' .. 1 + 2, 2 .. '')",
+]
+
+
+@pytest.mark.parametrize('source', CASES)
+def test_fold_keeps_results(tmp_path, source):
+    assert_equivalent(tmp_path, source, 'fold,output')
+
+
+def test_fold_removes_arithmetic(tmp_path):
+    output = assert_equivalent(tmp_path, "local t = {'a', 'b'} print(t[-757900+757902])", 'fold,output')
+    assert '757900' not in output
+
+
+def test_format_number_refuses_infinity():
+    for value in (math.inf, -math.inf, math.nan):
+        with pytest.raises(ValueError):
+            format_number(value)
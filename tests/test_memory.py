@@ -0,0 +1,20 @@
+"""Memoria máxima de las dos herramientas acotada por un múltiplo de la entrada"""
+
+import pytest
+
+from lua_input import PEAK_RSS_RATIO, measure_peak_memory
+from lua_synthetic import generate_script
+
+INPUT_BYTES = 1_000_000
+
+
+def test_peak_rss_within_documented_ratio(tmp_path):
+    source = tmp_path / 'sintetico.lua'
+    source.write_text(generate_script(INPUT_BYTES), encoding='utf-8')
+    results = measure_peak_memory(str(source))
+    if results['baseline'] is None:
+        pytest.skip("la medición de memoria requiere os.wait4 (Unix)")
+    size = source.stat().st_size
+    for name in ('basic', 'advanced'):
+        extra = results[name] - results['baseline']
+        assert extra <= PEAK_RSS_RATIO * size, f"{name}: {extra / size:.1f} × la entrada"
@@ -0,0 +1,30 @@
+"""Perfiles completos sobre scripts sintéticos que imprimen lo que devuelve cada función"""
+
+import pytest
+
+from harness import assert_equivalent
+from lua_synthetic import generate_script
+
+
+@pytest.mark.parametrize('preset', ['basic', 'advanced'])
+@pytest.mark.parametrize('seed', range(4))
+def test_synthetic_script(tmp_path, preset, seed):
+    source = generate_script(20000, seed).replace('do F[J]()end', 'do print(F[J]())end')
+    assert 'print(F[J]())' in source
+    assert_equivalent(tmp_path, source, None, preset)
+
+
+CLOSURES = """
+local handlers = {}
+for i = 1, 3 do
+  handlers[i] = function(x) return function() return x * i end end
+end
+local function apply(f, ...) return f(...) end
+print(apply(handlers[2], 5)(), (function() return 'anónima' end)())
+"""
+
+
+def test_report_counts_every_function(tmp_path):
+    assert_equivalent(tmp_path, CLOSURES, 'fold,parse,comments,output,report')
+    report = (tmp_path / 'reporte.txt').read_text(encoding='utf-8')
+    assert '✓ Funciones identificadas: 4\n' in report
@@ -0,0 +1,66 @@
+"""Renombrado de locales: cada declaración conserva su ámbito"""
+
+from harness import assert_equivalent
+
+SHADOWING = """
+local a = 1
+local function f(a)
+  local b = a + 1
+  do
+    local a = b * 2
+    print(a)
+  end
+  return a
+end
+print(f(a), a)
+x = 5
+local c = x
+print(c, x)
+for i = 1, 2 do
+  local i = i * 10
+  print(i)
+end
+local t = {a = 1, b = 2}
+print(t.a, t['b'])
+"""
+
+UPVALUES = """
+local function counter()
+  local n = 0
+  return function(d)
+    n = n + (d or 1)
+    return n
+  end
+end
+local c, d = counter(), counter()
+c() c(5)
+print(c(), d())
+local function r(n) if n > 0 then return n + r(n - 1) end return 0 end
+print(r(4))
+local s = 'texto'
+local function m(...) local s = select('#', ...) return s end
+print(s, m(1, 2, 3))
+"""
+
+# goto no es palabra clave en Lua 5.1 ni en Luau
+GOTO_NAME = """
+local goto = 3
+local function jump(goto) return goto * 2 end
+local t = {goto = goto}
+goto = jump(goto) + t.goto
+print(goto, t.goto)
+"""
+
+
+def test_shadowed_locals(tmp_path):
+    output = assert_equivalent(tmp_path, SHADOWING, 'fold,parse,rename,output', 'basic')
+    assert 'local a ' not in output
+
+
+def test_upvalues_and_recursion(tmp_path):
+    assert_equivalent(tmp_path, UPVALUES, 'fold,parse,rename,output', 'basic')
+
+
+def test_goto_as_name(tmp_path):
+    output = assert_equivalent(tmp_path, GOTO_NAME, 'fold,parse,rename,output', 'basic')
+    assert 'local t ' not in output
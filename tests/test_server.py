@@ -0,0 +1,41 @@
+"""Modo servicio: un proceso de trabajo que muere no deja el servicio sin procesos"""
+
+import json
+import os
+import signal
+import threading
+
+import pytest
+
+from lua_server import Channel, Server
+
+JOB = {'source': 'local a = 1 + 2 print(a)', 'preset': 'basic', 'fingerprint': False}
+
+
+def send(server: Server, channel: Channel, job) -> None:
+    server.submit(json.dumps(job), channel)
+    drained = threading.Thread(target=channel.drain, daemon=True)
+    drained.start()
+    drained.join(60)
+    assert not drained.is_alive(), "la respuesta no llegó"
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGKILL'), reason="necesita SIGKILL")
+def test_killed_worker_is_replaced():
+    responses = []
+    channel = Channel(lambda text: responses.append(json.loads(text)))
+    server = Server(1)
+    try:
+        send(server, channel, {'id': 1, **JOB})
+        assert responses[-1]['ok']
+        os.kill(server.pool.submit(os.getpid).result(), signal.SIGKILL)
+        # El trabajo que llega tras la muerte puede fallar, pero tiene respuesta y libera su hueco
+        send(server, channel, {'id': 2, **JOB})
+        send(server, channel, {'id': 3, **JOB})
+        assert [response['id'] for response in responses] == [1, 2, 3]
+        assert responses[-1]['ok'], responses[-1]
+        server.submit(json.dumps({'cmd': 'stats'}), channel)
+        assert responses[-1]['running'] == 0
+        assert responses[-1]['restarts'] == 1
+    finally:
+        server.close()
@@ -0,0 +1,90 @@
+"""Tabla de strings: solo se sustituyen las lecturas de la tabla, no de lo que la tapa"""
+
+import base64
+import random
+
+from harness import assert_equivalent, run_lua
+from lua_lexer import quote_string
+from lua_string_table import _STANDARD_ALPHABET, decode_base64_batch
+from lua_synthetic import ScriptGenerator
+
+PASSES = 'fold,strings,resolve,output'
+
+SHADOWED_TABLE = """
+local J = {"uno", "dos", "tres"}
+local function f(J)
+  local l, M = 1, J[1]
+  return M
+end
+print(J[1], f({'propia'}), J[3])
+for J = 1, 2 do print(J) end
+local t = {J[2]}
+do
+  local J = {'otra'}
+  print(J[1], t[1])
+end
+J[2] = 'cambiada'
+print(J[2])
+"""
+
+
+def test_shadowed_table_names(tmp_path):
+    output = assert_equivalent(tmp_path, SHADOWED_TABLE, PASSES).replace(' ', '')
+    # Se resuelven las lecturas de la tabla; el parámetro J no es la tabla
+    assert 'print("uno",f(' in output and 'J[3]' not in output
+    assert 'M=1,J[1]' in output
+    # J[2] se asigna en el script: ninguna lectura de J[2] es ya la constante
+    assert '"dos"' not in output.split('localfunction', 1)[1]
+
+SHADOWED_ACCESSOR = """
+local J = {"uno", "dos", "tres", "cuatro"}
+local function l(x) return J[x - 2] end
+local function f(l) return l(3) end
+print(l(3), f(function(n) return n * 10 end), l(6))
+do
+  local l = string.rep
+  print(l('a', 3))
+end
+for _, l in ipairs({tostring}) do print(l(5)) end
+"""
+
+# J[2] se asigna: l(4), que la lee, ya no es constante
+WRITTEN_KEY = """
+local J = {"uno", "dos", "tres"}
+local function l(x) return J[x - 2] end
+print(l(3), l(4))
+J[2] = 'cambiada'
+print(l(3), l(4), l(5))
+"""
+
+
+def test_shadowed_accessor_names(tmp_path):
+    output = assert_equivalent(tmp_path, SHADOWED_ACCESSOR, PASSES).replace(' ', '')
+    assert 'print("uno",f(' in output and '"cuatro")' in output
+    assert 'returnl(3)' in output and "l('a',3)" in output and 'l(5)' in output
+
+
+def test_written_key_is_not_constant(tmp_path):
+    output = assert_equivalent(tmp_path, WRITTEN_KEY, PASSES).replace(' ', '')
+    assert 'print("uno",l(4))' in output and '"dos"' not in output.split('localfunction', 1)[1]
+
+
+def test_base64_matches_runtime_decoder():
+    symbols = list(_STANDARD_ALPHABET.decode())
+    random.Random(4).shuffle(symbols)
+    translate = bytes.maketrans(_STANDARD_ALPHABET, ''.join(symbols).encode())
+    values = []
+    for size in range(9):
+        encoded = base64.b64encode(bytes(range(200, 200 + size))).translate(translate)
+        bare = encoded.rstrip(b'=')
+        # Longitudes ≡ 2 y 3 (mod 4) con y sin '=', un '=' de menos o de más y bytes ajenos al alfabeto
+        values += [encoded, bare, bare + b'=', bare + b'==', bare[:-1], b'\n'.join([bare[:3], bare[3:]]) + b' =']
+    values += [b'', b'=', b'==', b'A', b'AB', b'ABC', b'ABCD=', b'AB=C']
+
+    generator = ScriptGenerator(0)
+    alphabet = {symbol: value for value, symbol in enumerate(symbols)}
+    source = (f"local J = {{{', '.join(quote_string(value) for value in values)}}} "
+              f"{generator.decoder(alphabet)} "
+              "for i = 1, #J do print((J[i]:gsub('.', function(c) return ('%02x'):format(c:byte()) end))) end")
+    expected = [value.hex() for value in decode_base64_batch(values, {ord(k): v for k, v in alphabet.items()})]
+    assert run_lua(source) == expected
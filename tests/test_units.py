@@ -0,0 +1,19 @@
+"""Unidades repartidas entre procesos sobre un archivo que ya usa el nombre de las marcas"""
+
+from lua_engine import Engine, Target, resolve_passes
+from lua_presets import PRESETS
+from lua_synthetic import generate_script
+from lua_units import MARKER
+
+
+def test_source_with_marker_is_not_split(tmp_path):
+    # Con más tokens de los que hacen falta para repartir y una llamada que parece una marca
+    source = f"local function {MARKER}0() end\n{MARKER}0()\n" + generate_script(500_000)
+    input_file = tmp_path / 'entrada.lua'
+    input_file.write_text(source, encoding='utf-8')
+    chosen = PRESETS['advanced']
+    target = Target(chosen, resolve_passes(chosen, 'fold,parse,output'), str(tmp_path / 'salida.lua'),
+                    str(tmp_path / 'reporte.txt'), tailor=False)
+    state, = Engine(detect=False, jobs=2).run(str(input_file), [target])
+    assert state['counters']['parse']['units'] == 0
+    assert f"{MARKER}0()" in (tmp_path / 'salida.lua').read_text(encoding='utf-8')